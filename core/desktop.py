@@ -1,64 +1,165 @@
-import os
-import importlib.util
-from pathlib import Path
-from core import utils
-import sys
-
-def get_modules_path():
-    """Return correct modules directory depending on freeze status."""
-    if getattr(sys, 'frozen', False):
-        # Running as PyInstaller bundle
-        base_path = Path(sys._MEIPASS)
-        return base_path / 'modules'
-    else:
-        # Running as regular script
-        script_path = Path(__file__).resolve()
-        return script_path.parent.parent / 'modules'
-
-MOD_PATH = get_modules_path()
-
-def discover_apps(modules_path=MOD_PATH):
-    apps = []
-    for fname in os.listdir(modules_path):
-        if fname.endswith(".py") and not fname.startswith("_"):
-            fpath = os.path.join(modules_path, fname)
-            spec = importlib.util.spec_from_file_location(fname[:-3], fpath)
-            app_mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(app_mod)
-            # Only register valid app modules
-            if hasattr(app_mod, "APP_INFO") and hasattr(app_mod, "launch"):
-                apps.append((app_mod.APP_INFO, app_mod.launch))
-    return apps
-
-def show_desktop():
-    utils.clear_console()
-    apps = discover_apps()
-    while True:
-        print("\n<< Cyber_CLI Desktop >>")
-        for idx, (info, _) in enumerate(apps, 1):
-            print(f"[{idx}] {info.get('icon', '🟦')} {info.get('name', 'Unnamed App')}")
-        print(f"[q] Quit Desktop")
-        choice = input("Choose app > ").strip()
-        if choice.lower() in ("q", "quit", "exit"):
-            utils.clear_console()
-            utils.logo_loader()
-            break
-        try:
-            idx = int(choice) - 1
-            _, launch_func = apps[idx]
-            utils.clear_console()
-            launch_func()
-        except (ValueError, IndexError):
-            utils.clear_console()
-            print("Invalid selection.")
-
-if __name__ == "__main__":
-    show_desktop()
-
-
-
-
-''' 
-requires pip install pyinstaller and others import this cli expects from your env
-to create an exe copy this into terminal - "pyinstaller --onefile --add-data "modules;modules" --add-data "settings;settings" cyber_cli_launch.py --hidden-import=platform --hidden-import=socket --hidden-import=requests --hidden-import=subprocess --hidden-import=bs4"
+import os
+import ast
+import json
+import importlib.util
+from pathlib import Path
+from core import profiling, utils
+import sys
+
+def get_modules_path():
+    """Return correct modules directory depending on freeze status."""
+    if getattr(sys, 'frozen', False):
+        # Running as PyInstaller bundle
+        base_path = Path(sys._MEIPASS)
+        return base_path / 'modules'
+    else:
+        # Running as regular script
+        script_path = Path(__file__).resolve()
+        return script_path.parent.parent / 'modules'
+
+MOD_PATH = get_modules_path()
+MANIFEST_FILE = Path(__file__).resolve().parent.parent / 'settings' / 'app_manifest.json'
+MANIFEST_VERSION = 1
+
+# --- APP DISCOVERY ---
+# Apps are found without running them: APP_INFO is read from each file's
+# syntax tree, and the file is only imported once its app is launched. What
+# was read is kept in MANIFEST_FILE, keyed by file name and checked against
+# the file's mtime and size, so unchanged files are not even parsed again.
+
+def read_app_info(path):
+    """APP_INFO of the app in `path`, read with ast and never executed.
+    Raises ValueError if the file is not an app: no literal APP_INFO dict,
+    one the manifest cannot store as JSON, or no top-level launch()."""
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), filename=str(path))
+    info, has_launch = None, False
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "launch":
+            has_launch = True
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "launch" for t in node.targets):
+            has_launch = True
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(t, ast.Name) and t.id == "APP_INFO" for t in targets) and node.value is not None:
+                info = ast.literal_eval(node.value)  # ValueError unless it is a plain literal
+    if not isinstance(info, dict):
+        raise ValueError("no APP_INFO dict")
+    try:
+        json.dumps(info)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"APP_INFO cannot be stored as JSON ({e})") from None
+    if not has_launch:
+        raise ValueError("no launch()")
+    return info
+
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest.get("apps", {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+def save_manifest(entries):
+    try:
+        utils.write_json_atomic(MANIFEST_FILE, {"version": MANIFEST_VERSION, "apps": entries}, indent=4, ensure_ascii=False)
+    except (OSError, TypeError, ValueError):
+        pass  # Read-only install (e.g. a frozen bundle) or bad data: discovery just parses again next time
+
+class App:
+    """A discovered app. The module behind it is imported on first launch."""
+
+    def __init__(self, info, path):
+        self.info = info
+        self.path = path
+        self.module = None
+
+    def launch(self):
+        if self.module is None:
+            name = os.path.basename(self.path)[:-3]
+            spec = importlib.util.spec_from_file_location(name, self.path)
+            module = importlib.util.module_from_spec(spec)
+            try:
+                spec.loader.exec_module(module)
+            except Exception as e:
+                print(utils.Colors.col_text(f"Could not start {self.info.get('name', name)}: {e}", utils.Colors.RED))
+                return
+            self.module = module
+        self.module.launch()
+
+def discover_apps(modules_path=MOD_PATH, skipped=None):
+    """[(APP_INFO, launch)] for every app in `modules_path`, without importing
+    any of them. Files that are not valid apps are left out; if `skipped` is a
+    list, (file name, reason) is appended to it for each."""
+    with profiling.span("load app manifest", "settings"):
+        cached = load_manifest()
+    entries = {}
+    apps = []
+    for fname in sorted(os.listdir(modules_path)):
+        if not fname.endswith(".py") or fname.startswith("_"):
+            continue
+        fpath = os.path.join(modules_path, fname)
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            continue
+        entry = cached.get(fname)
+        if not entry or entry.get("mtime_ns") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
+            entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "info": None, "error": None}
+            try:
+                with profiling.span(f"parse {fname}", "discovery", size=stat.st_size):
+                    entry["info"] = read_app_info(fpath)
+            except (SyntaxError, ValueError, TypeError, OSError) as e:
+                # TypeError: literal_eval on e.g. an unhashable dict key
+                entry["error"] = f"{type(e).__name__}: {e}"
+        entries[fname] = entry
+        if entry["info"] is not None:
+            apps.append((entry["info"], App(entry["info"], fpath).launch))
+        elif skipped is not None:
+            skipped.append((fname, entry["error"]))
+    if entries != cached:
+        with profiling.span("save app manifest", "settings"):
+            save_manifest(entries)
+    return apps
+
+def show_desktop():
+    utils.clear_console()
+    skipped = []
+    with profiling.span("discover apps", "discovery"):
+        apps = discover_apps(skipped=skipped)
+    while True:
+        with utils.Screen(clear=False) as screen:
+            screen.line("\n<< Cyber_CLI Desktop >>")
+            for idx, (info, _) in enumerate(apps, 1):
+                screen.line(f"[{idx}] {info.get('icon', '🟦')} {info.get('name', 'Unnamed App')}")
+            screen.line(f"[q] Quit Desktop")
+            for fname, reason in skipped:
+                screen.line(utils.Colors.col_text(f"(skipped {fname}: {reason})", utils.Colors.BRIGHT_YELLOW))
+        profiling.ready()  # --profile-startup ends at the first prompt
+        choice = input("Choose app > ").strip()
+        if choice.lower() in ("q", "quit", "exit"):
+            utils.clear_console()
+            utils.logo_loader()
+            break
+        try:
+            idx = int(choice) - 1
+            _, launch_func = apps[idx]
+            utils.clear_console()
+            launch_func()
+        except (ValueError, IndexError):
+            utils.clear_console()
+            print("Invalid selection.")
+
+if __name__ == "__main__":
+    show_desktop()
+
+
+
+
+''' 
+requires pip install pyinstaller and others import this cli expects from your env
+to create an exe copy this into terminal - "pyinstaller --onefile --add-data "modules;modules" --add-data "settings;settings" cyber_cli_launch.py --hidden-import=platform --hidden-import=socket --hidden-import=requests --hidden-import=subprocess --hidden-import=bs4"
 '''
\ No newline at end of file
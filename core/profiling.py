@@ -0,0 +1,217 @@
+# profiling.py
+# Startup timeline for `cyber_cli_launch.py --profile-startup`.
+#
+# Records spans from process start until the first desktop prompt:
+#
+#   import     every module imported, timed around its execution (nested
+#              imports nest, and each shows its own "self" time too)
+#   discovery  reading each app's APP_INFO in core/desktop.py
+#   settings   config file reads and writes
+#   sleep      splash delay and typing animation
+#   console    clearing the screen
+#
+# Code marks a span with `with profiling.span(name, category):`, which costs
+# nothing when no profile is being taken. At the first prompt, ready() prints
+# a table and writes the spans as a Chrome trace (open it in chrome://tracing
+# or https://ui.perfetto.dev).
+#
+# Only the standard library is used, and only modules the interpreter has
+# already loaded, so importing this file adds nothing to what it measures.
+import json
+import os
+import sys
+import threading
+import time
+
+TOP_IMPORTS = 15  # Slowest imports listed in the table
+
+_profiler = None
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(name, category, **args):
+    """Context manager timing `name`; a no-op unless a profile is running."""
+    if _profiler is None:
+        return _NO_SPAN
+    return _Span(_profiler, name, category, args)
+
+def active():
+    return _profiler is not None
+
+def seconds_since_process_start():
+    """How long this process has existed, from /proc on Linux (10 ms
+    resolution), or None where that is not available."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class _Span:
+    __slots__ = ("profiler", "name", "category", "args", "started", "children")
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.children = 0.0  # Time spent in spans nested inside this one
+
+    def __enter__(self):
+        self.profiler.stack().append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ended = time.perf_counter()
+        stack = self.profiler.stack()
+        stack.pop()
+        duration = ended - self.started
+        if stack:
+            stack[-1].children += duration
+        self.profiler.record(self.name, self.category, self.started, duration, duration - self.children,
+                             len(stack), self.args)
+        return False
+
+class _TimedLoader:
+    """Wraps a module's loader so its execution is recorded as an import span."""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        with _Span(self._profiler, module.__name__, "import", {}):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+class _ImportTimer:
+    """sys.meta_path entry that asks the real finders, then wraps the loader."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.profiler)
+                return spec
+        return None
+
+class Profiler:
+    def __init__(self, trace_path, launched):
+        self.trace_path = trace_path
+        since_start = seconds_since_process_start()
+        now = time.perf_counter()
+        # perf_counter() value of the moment the process started
+        self.origin = now - since_start if since_start is not None else launched
+        self.events = []
+        self.pid = os.getpid()
+        self.local = threading.local()
+        self.importer = _ImportTimer(self)
+        # Everything before the launcher could start the profile
+        self.record("interpreter and launcher start", "startup", self.origin, now - self.origin,
+                    now - self.origin, 0, {})
+
+    def stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def record(self, name, category, started, duration, self_time, depth, args):
+        self.events.append({
+            "name": name,
+            "category": category,
+            "start": started - self.origin,
+            "duration": duration,
+            "self": self_time,
+            "depth": depth,
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+    def trace(self):
+        """The events in Chrome's trace-event format (times in microseconds)."""
+        events = [{
+            "name": event["name"],
+            "cat": event["category"],
+            "ph": "X",
+            "ts": round(event["start"] * 1e6, 1),
+            "dur": round(event["duration"] * 1e6, 1),
+            "pid": self.pid,
+            "tid": event["tid"],
+            "args": dict(event["args"], self_ms=round(event["self"] * 1000, 3)),
+        } for event in self.events]
+        events.append({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "cyber_cli_launch"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def table(self, total):
+        lines = [f"\nStartup profile: {total * 1000:.1f} ms from process start to the desktop prompt\n"]
+
+        lines.append(f"{'by category':<44}{'total ms':>10}{'spans':>8}")
+        lines.append("-" * 62)
+        totals = {}
+        for event in self.events:
+            spent, count = totals.get(event["category"], (0.0, 0))
+            totals[event["category"]] = (spent + event["self"], count + 1)
+        for category, (spent, count) in sorted(totals.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{category:<44}{spent * 1000:>10.1f}{count:>8}")
+
+        lines.append(f"\n{'timeline (outermost spans)':<44}{'at ms':>10}{'ms':>8}")
+        lines.append("-" * 62)
+        for event in self.events:
+            if event["depth"] == 0 and event["duration"] >= 0.0005:
+                lines.append(f"{(event['category'] + ': ' + event['name'])[:43]:<44}"
+                             f"{event['start'] * 1000:>10.1f}{event['duration'] * 1000:>8.1f}")
+
+        imports = [event for event in self.events if event["category"] == "import"]
+        lines.append(f"\n{'slowest imports':<44}{'self ms':>10}{'ms':>8}")
+        lines.append("-" * 62)
+        for event in sorted(imports, key=lambda event: -event["self"])[:TOP_IMPORTS]:
+            lines.append(f"{event['name'][:43]:<44}{event['self'] * 1000:>10.1f}{event['duration'] * 1000:>8.1f}")
+        return "\n".join(lines)
+
+def start(trace_path, launched):
+    """Starts recording. `launched` is a perf_counter() value taken as early
+    as possible, used as the start when the process start time is unknown."""
+    global _profiler
+    _profiler = Profiler(trace_path, launched)
+    sys.meta_path.insert(0, _profiler.importer)
+
+def ready():
+    """Called at the first prompt: stops recording, prints the table and
+    writes the trace. Does nothing unless a profile is running."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    total = time.perf_counter() - profiler.origin
+    if profiler.importer in sys.meta_path:
+        sys.meta_path.remove(profiler.importer)
+    print(profiler.table(total))
+    try:
+        with open(profiler.trace_path, "w", encoding="utf-8") as f:
+            json.dump(profiler.trace(), f)
+        print(f"\nChrome trace written to {profiler.trace_path}")
+    except OSError as e:
+        print(f"\nERROR writing trace: {e}")
@@ -0,0 +1,111 @@
+# protocol.py
+# Wire format shared by messenger_server.py and the Messenger client.
+#
+# Every message travels as one frame:
+#
+#   +---------+--------+----------------+-----------------+
+#   | version | type   | payload length | payload (UTF-8) |
+#   | 1 byte  | 1 byte | 4 bytes (BE)   | length bytes    |
+#   +---------+--------+----------------+-----------------+
+#
+# TCP is a byte stream, so a single recv() can hold half a frame or several
+# frames at once. FrameReader buffers the bytes and hands back whole frames.
+import struct
+
+VERSION = 1
+
+# --- FRAME TYPES ---
+USERNAME = 1  # client -> server, first frame on a connection
+CHAT = 2      # chat text (client sends raw text, server sends "<user>: text")
+JOIN = 3      # server -> client, "<user> joined the chat."
+LEAVE = 4     # server -> client, "<user> left the chat."
+QUIT = 5      # client -> server, graceful disconnect
+SYSTEM = 6    # server -> client, notices and errors
+DIRECT = 7    # server -> client, a /msg addressed only to this user
+HISTORY = 8   # server -> client, "#<seq> <chat line>" replayed from the log
+
+TYPE_NAMES = {
+    USERNAME: "USERNAME",
+    CHAT: "CHAT",
+    JOIN: "JOIN",
+    LEAVE: "LEAVE",
+    QUIT: "QUIT",
+    SYSTEM: "SYSTEM",
+    DIRECT: "DIRECT",
+    HISTORY: "HISTORY",
+}
+
+HEADER = struct.Struct("!BBI")
+HEADER_SIZE = HEADER.size
+MAX_PAYLOAD = 64 * 1024  # Refuse absurd lengths instead of buffering them
+MAX_CHAT_BYTES = 60 * 1024  # Longest line a client may send; the rest is room for what the server adds
+MAX_LINE_BYTES = MAX_PAYLOAD - 32  # Longest relayed line ("[room] <user>: text"), leaving room for "#<seq> "
+RECV_SIZE = 64 * 1024
+
+class ProtocolError(Exception):
+    """Raised when the peer sends bytes that are not a valid frame."""
+
+def encode_frame(msg_type, payload=b"", max_payload=MAX_PAYLOAD):
+    """Builds one frame. `payload` may be str (encoded as UTF-8) or bytes."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if len(payload) > max_payload:
+        raise ProtocolError(f"payload of {len(payload)} bytes exceeds {max_payload}")
+    return HEADER.pack(VERSION, msg_type, len(payload)) + payload
+
+def encode_frames(frames):
+    """Joins several (type, payload) pairs into one buffer for a single sendall()."""
+    return b"".join(encode_frame(msg_type, payload) for msg_type, payload in frames)
+
+def count_frames(data):
+    """Number of complete frames in an encoded buffer (headers only, no copy)."""
+    count = offset = 0
+    while len(data) - offset >= HEADER_SIZE:
+        _, _, length = HEADER.unpack_from(data, offset)
+        offset += HEADER_SIZE + length
+        count += 1
+    return count
+
+class FrameReader:
+    """Incremental decoder: feed() raw bytes, get back every complete frame."""
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.buffer = bytearray()
+        self.max_payload = max_payload
+
+    def feed(self, data):
+        """Appends `data` and returns a list of (type, payload_bytes) frames."""
+        self.buffer += data
+        frames = []
+        offset = 0
+        buf = self.buffer
+        while len(buf) - offset >= HEADER_SIZE:
+            version, msg_type, length = HEADER.unpack_from(buf, offset)
+            if version != VERSION:
+                raise ProtocolError(f"unsupported protocol version {version}")
+            if length > self.max_payload:
+                raise ProtocolError(f"frame of {length} bytes exceeds {self.max_payload}")
+            end = offset + HEADER_SIZE + length
+            if end > len(buf):
+                break  # Rest of this frame has not arrived yet
+            frames.append((msg_type, bytes(buf[offset + HEADER_SIZE:end])))
+            offset = end
+        # Drop consumed bytes once per feed() rather than once per frame
+        if offset:
+            del buf[:offset]
+        return frames
+
+def recv_frames(sock, reader):
+    """Blocking helper: reads once from `sock` and returns the decoded frames.
+    Returns None when the peer closed the connection."""
+    data = sock.recv(RECV_SIZE)
+    if not data:
+        return None
+    return reader.feed(data)
+
+async def read_frames(stream, reader):
+    """asyncio counterpart of recv_frames() for a StreamReader."""
+    data = await stream.read(RECV_SIZE)
+    if not data:
+        return None
+    return reader.feed(data)
@@ -1,112 +1,318 @@
-import shutil
-from pathlib import Path
-import os
-import time
-import json
-
-DEFAULT_SETTINGS = {
-    "logo_color": "BRIGHT_GREEN",
-    "typing_delay": 0.01,
-    "prompt_char": ">",
-}
-
-script_path = Path(__file__).resolve()
-SETTINGS_FILE = script_path.parent.parent / 'settings' / 'config.json'
-
-def load_settings():
-    try:
-        with open(SETTINGS_FILE, 'r') as f:
-            settings = json.load(f)
-            return {**DEFAULT_SETTINGS, **settings}
-    except FileNotFoundError:
-        print("\nCreating default configuration file...")
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
-    except json.JSONDecodeError:
-        print("\nERROR: Configuration file corrupted. Resetting to defaults.")
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
-
-def save_settings(data):
-    SETTINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    try:
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        print(f"\nERROR saving settings: {e}")
-            
-def clear_console():
-    if os.name == "nt":
-        os.system("cls")
-    else:
-        os.system("clear")
-
-class Colors():
-    RESET = '\033[0m'
-    BRIGHT_CYAN = '\033[96m'
-    BRIGHT_GREEN = '\033[92m'
-    BRIGHT_YELLOW = '\033[93m'
-    BRIGHT_MAGENTA = '\033[95m'
-    BRIGHT_BLUE = '\033[94m'
-    RED = '\033[31m'
-    def col_text(text, color_code):
-        return f"{color_code}{text}{Colors.RESET}"
-
-def logo_loader(delay=1.5):
-    clear_console()
-    script_path = Path(__file__).resolve()
-    logo_path = script_path.parent.parent / 'settings' / 'logo.txt'
-
-    settings = load_settings()
-    color_name = settings.get("logo_color", "BRIGHT_CYAN")
-
-    try:
-        color_code = getattr(Colors, color_name)
-    except AttributeError:
-        color_code = Colors.BRIGHT_CYAN
-
-    try:
-        try:
-            terminal_width = shutil.get_terminal_size().columns
-        except OSError:
-            terminal_width = 80
-            
-        print()
-
-        with open(logo_path, 'r') as file:
-            for line in file:
-                 clean_line = line.strip()
-                 centered_line = clean_line.center(terminal_width)
-                 colored_line = Colors.col_text(centered_line, color_code=color_code)
-                 print(colored_line)
-            
-    except FileNotFoundError:
-        print(f"\nERROR: Logo file not found. Checked path: {logo_path}\n") 
-    except Exception as e:
-        print(f"\nAn error occurred: {e}\n")
-    time.sleep(delay)
-    clear_console()
-
-
-def Print_Typing(text, delay=0.05, center=False, fast=True):
-    if center:
-        try:
-            terminal_width = shutil.get_terminal_size().columns
-            padding = terminal_width - (len(text))/2
-            print(padding * " ", end="")
-        except OSError:
-            center = False
-
-    for char in text:
-        print(char, end="", flush=True)
-        if fast:
-            time.sleep(delay)
-
-
-
-
-
-if __name__ == "__main__":
-    logo_loader()
-    a = input()
+import shutil
+from pathlib import Path
+import os
+import sys
+import threading
+import time
+import json
+from core import profiling
+
+DEFAULT_SETTINGS = {
+    "logo_color": "BRIGHT_GREEN",
+    "typing_delay": 0.01,
+    "prompt_char": ">",
+}
+
+script_path = Path(__file__).resolve()
+SETTINGS_FILE = script_path.parent.parent / 'settings' / 'config.json'
+
+FAST_MODE = False  # Set by set_fast_mode(): no splash delay or typing animation
+
+def set_fast_mode(enabled=True):
+    global FAST_MODE
+    FAST_MODE = enabled
+
+# --- SETTINGS ---
+# config.json is parsed once and kept in memory. Every read is a stat():
+# the file is parsed again only when its inode, mtime or size changed, so
+# edits from another process or by hand are still picked up. Writes go to a
+# temporary file that is renamed over config.json, so a crash leaves the old
+# file or the new one, never half of one. Callers that keep a setting around
+# subscribe() to hear about changes instead of reading it again and again;
+# an edit made on disk is noticed at the next get(), or within a second while
+# a watch() is running.
+
+def write_json_atomic(path, data, **dump_options):
+    """Writes `data` as JSON to a temporary file next to `path`, flushes it to
+    disk and renames it over `path`. Raises OSError/TypeError on failure."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_options)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+class SettingsStore:
+    """Cached view of one JSON settings file, merged over `defaults`."""
+
+    def __init__(self, path, defaults):
+        self.path = Path(path)
+        self.defaults = defaults
+        self._settings = None
+        self._stamp = None      # (inode, mtime_ns, size) the cache was read at
+        self._subscribers = []
+        self._lock = threading.RLock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        """The current settings, as a copy the caller may change."""
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._settings is not None and stamp == self._stamp:
+                return dict(self._settings)
+            old = self._settings
+            with profiling.span("load settings", "settings"):
+                settings = self._read(stamp)
+            changed = old is not None and settings != old
+        if changed:
+            self._notify(settings)
+        return dict(settings)
+
+    def _read(self, stamp):
+        try:
+            with open(self.path, 'r') as f:
+                settings = {**self.defaults, **json.load(f)}
+            self._settings, self._stamp = settings, stamp
+            return settings
+        except FileNotFoundError:
+            print("\nCreating default configuration file...")
+        except (json.JSONDecodeError, TypeError):
+            print("\nERROR: Configuration file corrupted. Resetting to defaults.")
+        self._write(dict(self.defaults))
+        return self._settings
+
+    def save(self, data):
+        """Writes `data` to the file and tells subscribers if anything changed."""
+        with self._lock:
+            old = self._settings
+            self._write(data)
+            settings = self._settings
+        if settings != old:
+            self._notify(settings)
+
+    def _write(self, data):
+        try:
+            with profiling.span("save settings", "settings"):
+                write_json_atomic(self.path, data, indent=4)
+        except (OSError, TypeError) as e:
+            print(f"\nERROR saving settings: {e}")
+        # Kept even if the write failed, so the app runs on with what it was given
+        self._settings = {**self.defaults, **data}
+        self._stamp = self._file_stamp()
+
+    def subscribe(self, callback):
+        """Calls `callback(settings)` whenever the settings change: saved here
+        at once, edited on disk at the next get() (see watch()). Returns a
+        function that unsubscribes."""
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+        return unsubscribe
+
+    def watch(self, interval=1.0):
+        """Checks the file every `interval` seconds on a background thread, so
+        subscribers hear about edits on disk with nothing calling get().
+        Returns a function that stops watching."""
+        stopped = threading.Event()
+
+        def poll():
+            while not stopped.wait(interval):
+                self.get()
+
+        threading.Thread(target=poll, name="settings-watch", daemon=True).start()
+        return stopped.set
+
+    def _notify(self, settings):
+        for callback in list(self._subscribers):
+            try:
+                callback(dict(settings))
+            except Exception as e:
+                print(f"\nERROR in settings subscriber: {e}")
+
+SETTINGS = SettingsStore(SETTINGS_FILE, DEFAULT_SETTINGS)
+
+def load_settings():
+    return SETTINGS.get()
+
+def save_settings(data):
+    SETTINGS.save(data)
+
+# --- RENDERING ---
+# Output goes straight to stdout as ANSI escapes: clearing the screen is a
+# write, not a `clear`/`cls` process. A Screen collects a whole redraw and
+# writes it at once, so a menu costs one write and one flush:
+#
+#   with utils.Screen() as screen:       # clears first; Screen(clear=False) does not
+#       screen.line("<< Menu >>")
+#       screen.line("[1] Something")
+
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"  # Cursor home, clear screen, clear scrollback
+
+def _enable_ansi():
+    """True if the console understands ANSI escapes. Windows 10+ consoles do
+    once virtual terminal processing is switched on."""
+    if os.name != "nt":
+        return True
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (AttributeError, OSError):
+        return False
+
+ANSI = _enable_ansi()
+
+def is_tty():
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+def write(text):
+    """Writes `text` to stdout with one write and one flush."""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+class Screen:
+    """Buffers one screen of output; flush() (or leaving the `with` block)
+    writes it all at once."""
+
+    def __init__(self, clear=True):
+        self.clear = clear
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def line(self, text=""):
+        self.parts.append(f"{text}\n")
+
+    def move_to(self, row, column=1):
+        self.parts.append(f"\033[{row};{column}H")
+
+    def flush(self):
+        text, self.parts = "".join(self.parts), []
+        if self.clear:
+            self.clear = False
+            if ANSI and is_tty():
+                text = CLEAR_SCREEN + text  # Same write as the screen itself
+            else:
+                clear_console()
+        if text:
+            write(text)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+def clear_console():
+    """Clears the terminal. Nothing is written when stdout is not a terminal,
+    so piped output stays clean."""
+    with profiling.span("clear screen", "console"):
+        if not is_tty():
+            return
+        if ANSI:
+            write(CLEAR_SCREEN)
+        else:
+            os.system("cls" if os.name == "nt" else "clear")
+
+class Colors():
+    RESET = '\033[0m'
+    BRIGHT_CYAN = '\033[96m'
+    BRIGHT_GREEN = '\033[92m'
+    BRIGHT_YELLOW = '\033[93m'
+    BRIGHT_MAGENTA = '\033[95m'
+    BRIGHT_BLUE = '\033[94m'
+    RED = '\033[31m'
+    def col_text(text, color_code):
+        return f"{color_code}{text}{Colors.RESET}"
+
+def logo_loader(delay=1.5):
+    script_path = Path(__file__).resolve()
+    logo_path = script_path.parent.parent / 'settings' / 'logo.txt'
+
+    settings = load_settings()
+    color_name = settings.get("logo_color", "BRIGHT_CYAN")
+
+    try:
+        color_code = getattr(Colors, color_name)
+    except AttributeError:
+        color_code = Colors.BRIGHT_CYAN
+
+    with Screen() as screen:
+        try:
+            try:
+                terminal_width = shutil.get_terminal_size().columns
+            except OSError:
+                terminal_width = 80
+
+            screen.line()
+
+            with open(logo_path, 'r') as file:
+                for line in file:
+                     clean_line = line.strip()
+                     centered_line = clean_line.center(terminal_width)
+                     colored_line = Colors.col_text(centered_line, color_code=color_code)
+                     screen.line(colored_line)
+
+        except FileNotFoundError:
+            screen.line(f"\nERROR: Logo file not found. Checked path: {logo_path}\n")
+        except Exception as e:
+            screen.line(f"\nAn error occurred: {e}\n")
+    if FAST_MODE:
+        return  # No pause to clear away; the next screen clears it
+    with profiling.span("splash delay", "sleep"):
+        time.sleep(delay)
+    clear_console()
+
+
+def Print_Typing(text, delay=0.05, center=False, fast=True):
+    if center:
+        try:
+            terminal_width = shutil.get_terminal_size().columns
+            padding = terminal_width - (len(text))/2
+            print(padding * " ", end="")
+        except OSError:
+            center = False
+
+    # Animated only for a person watching a terminal; otherwise one write
+    if FAST_MODE or not fast or not is_tty():
+        write(text)
+        return
+    with profiling.span("typing animation", "sleep"):
+        for char in text:
+            write(char)
+            time.sleep(delay)
+
+
+
+
+
+if __name__ == "__main__":
+    logo_loader()
+    a = input()
     Print_Typing(Colors.col_text(a, color_code=Colors.RED))
\ No newline at end of file
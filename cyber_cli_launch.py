@@ -1,4 +1,27 @@
-from core import utils
-from core import desktop
-utils.logo_loader()
-desktop.show_desktop()
+import time
+LAUNCHED = time.perf_counter()  # For --profile-startup, as early as possible
+import argparse
+from core import profiling
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cyber_CLI desktop")
+    parser.add_argument("--fast", action="store_true",
+                        help="skip the splash delay and typing animations")
+    parser.add_argument("--profile-startup", nargs="?", const="startup_trace.json", metavar="TRACE",
+                        help="time everything up to the first desktop prompt, print a table and "
+                             "write a Chrome trace (default startup_trace.json)")
+    return parser.parse_args(argv)
+
+# Guarded so worker processes started with "spawn" (the network scanner's
+# --processes) can import this file without opening a second desktop
+if __name__ == "__main__":
+    args = parse_args()
+    if args.profile_startup:
+        profiling.start(args.profile_startup, LAUNCHED)
+    # Imported only now, so --profile-startup sees them load
+    from core import utils
+    from core import desktop
+    if args.fast:
+        utils.set_fast_mode()
+    utils.logo_loader()
+    desktop.show_desktop()
@@ -0,0 +1,215 @@
+# extract_bench.py
+# Offline benchmark for Cyb_browser's reader-view extraction (modules/_extract).
+#
+# Runs the extractor over the saved pages in extract_corpus/ and reports:
+#
+#   speed      pages and megabytes per second, over --repeat passes
+#   memory     peak Python allocation while extracting one page (measured in
+#              a separate tracemalloc pass, so it does not slow the timing)
+#   accuracy   per manifest.json: phrases of the main content that must come
+#              out, boilerplate phrases that must not, and the page title
+#
+# No network is used, so runs are comparable between machines and versions.
+# Only the summary is printed; --output writes the full JSON report, which
+# keeps the same shape between versions, and --compare compares against one.
+#
+#   python extract_bench.py --backend html.parser --output before.json
+#   python extract_bench.py --backend html.parser --compare before.json
+#
+# To add a page, save it into the corpus directory and give it an entry in
+# manifest.json: {"title": ..., "expect": [...], "reject": [...]}.
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from modules import _extract
+
+REPORT_VERSION = 1
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extract_corpus")
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+ENDC = '\033[0m'
+
+# --- CORPUS ---
+
+def load_corpus(directory):
+    """[(name, html bytes, manifest entry)] for every page in the manifest."""
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    pages = []
+    for name, spec in sorted(manifest.items()):
+        with open(os.path.join(directory, name), "rb") as f:
+            pages.append((name, f.read(), spec))
+    return pages
+
+# --- MEASUREMENTS ---
+
+def time_pages(pages, backend, repeat):
+    """Extracts every page `repeat` times; returns (elapsed seconds, slowest page)."""
+    slowest = (0.0, None)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for name, html, _ in pages:
+            page_started = time.perf_counter()
+            _extract.extract(html, backend)
+            took = time.perf_counter() - page_started
+            if took > slowest[0]:
+                slowest = (took, name)
+    return time.perf_counter() - started, slowest
+
+def peak_memory(pages, backend):
+    """Largest tracemalloc peak seen extracting any one page, in bytes."""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _, html, _ in pages:
+            tracemalloc.reset_peak()
+            _extract.extract(html, backend)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def check_pages(pages, backend):
+    """Per-page accuracy against the manifest."""
+    results = {}
+    for name, html, spec in pages:
+        found = _extract.extract(html, backend)
+        text = found.text
+        results[name] = {
+            "where": found.where,
+            "score": found.score,
+            "blocks": len(found.blocks),
+            "chars": len(text),
+            "title_ok": found.title == spec.get("title"),
+            "missed": [phrase for phrase in spec.get("expect", []) if phrase not in text],
+            "leaked": [phrase for phrase in spec.get("reject", []) if phrase in text],
+        }
+    return results
+
+# --- REPORT ---
+
+def build_report(args, backend, pages, elapsed, slowest, peak, checks):
+    total_bytes = sum(len(html) for _, html, _ in pages)
+    extracted = len(pages) * args.repeat
+    elapsed = elapsed or 1e-9
+    expected = sum(len(spec.get("expect", [])) for _, _, spec in pages)
+    rejected = sum(len(spec.get("reject", [])) for _, _, spec in pages)
+    missed = sum(len(check["missed"]) for check in checks.values())
+    leaked = sum(len(check["leaked"]) for check in checks.values())
+    return {
+        "report_version": REPORT_VERSION,
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "backend": backend,
+            "corpus": args.corpus,
+            "pages": len(pages),
+            "corpus_bytes": total_bytes,
+            "repeat": args.repeat,
+        },
+        "speed": {
+            "pages": extracted,
+            "elapsed_s": round(elapsed, 3),
+            "pages_per_s": round(extracted / elapsed, 1),
+            "mb_per_s": round(total_bytes * args.repeat / elapsed / 1e6, 2),
+            "slowest_page": slowest[1],
+            "slowest_page_ms": round(slowest[0] * 1000, 2),
+        },
+        "memory": {
+            "peak_kb": round(peak / 1024, 1),
+        },
+        "accuracy": {
+            "expected_found": round((expected - missed) / expected, 3) if expected else None,
+            "boilerplate_leaked": round(leaked / rejected, 3) if rejected else None,
+            "titles_ok": sum(check["title_ok"] for check in checks.values()),
+            "pages_exact": sum(not check["missed"] and not check["leaked"] for check in checks.values()),
+        },
+        "pages": checks,
+    }
+
+# Metrics compared by --compare: (section, key, True if higher is better)
+COMPARED = [
+    ("speed", "pages_per_s", True),
+    ("speed", "mb_per_s", True),
+    ("speed", "slowest_page_ms", False),
+    ("memory", "peak_kb", False),
+    ("accuracy", "expected_found", True),
+    ("accuracy", "boilerplate_leaked", False),
+    ("accuracy", "titles_ok", True),
+    ("accuracy", "pages_exact", True),
+]
+
+def print_pages(checks):
+    for name, check in checks.items():
+        ok = not check["missed"] and not check["leaked"]
+        color = GREEN if ok else RED
+        print(f"{color}{name:<24}{ENDC} {str(check['where']):<28} {check['blocks']:>4} blocks {check['chars']:>7} chars")
+        for phrase in check["missed"]:
+            print(f"    {YELLOW}missed:{ENDC} {phrase}")
+        for phrase in check["leaked"]:
+            print(f"    {YELLOW}leaked:{ENDC} {phrase}")
+
+def print_report(report, baseline=None):
+    print("\n" + "=" * 60)
+    print(f"{'metric':<32}{'value':>12}{'baseline':>16}")
+    print("-" * 60)
+    for section, key, higher_is_better in COMPARED:
+        value = (report.get(section) or {}).get(key)
+        if value is None:
+            continue
+        line = f"{section + '.' + key:<32}{value:>12}"
+        old = ((baseline or {}).get(section) or {}).get(key)
+        if old is not None:
+            better = value >= old if higher_is_better else value <= old
+            color = GREEN if better else RED
+            line += f"{color}{old:>16}{ENDC}"
+        print(line)
+    print("=" * 60)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reader-view extractor on a saved page corpus")
+    parser.add_argument("--corpus", default=CORPUS, help="directory with the pages and manifest.json")
+    parser.add_argument("--backend", choices=("auto", "lxml", "html.parser"), default="auto",
+                        help="parser driving the extractor (default: lxml when installed)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed passes over the corpus (default 50)")
+    parser.add_argument("--label", default="", help="free-form label stored in the report")
+    parser.add_argument("--output", help="write the full JSON report, page by page, to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = _extract.backends()[0] if args.backend == "auto" else args.backend
+    if backend not in _extract.backends():
+        print(f"{RED}{backend} is not installed{ENDC}")
+        return 1
+    pages = load_corpus(args.corpus)
+    if not pages:
+        print(f"{RED}No pages in {args.corpus}{ENDC}")
+        return 1
+
+    checks = check_pages(pages, backend)  # Also warms up imports and caches
+    elapsed, slowest = time_pages(pages, backend, max(1, args.repeat))
+    peak = peak_memory(pages, backend)
+
+    report = build_report(args, backend, pages, elapsed, slowest, peak, checks)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_pages(checks)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
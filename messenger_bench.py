@@ -0,0 +1,416 @@
+# messenger_bench.py
+# Load generator for messenger_server.py.
+#
+# Starts N simulated chat users, has each of them talk at a fixed rate, and
+# measures how long every line takes to reach the other users in its room.
+# The JSON report is stable between runs so two server versions can be
+# compared with --compare.
+#
+#   python messenger_bench.py --spawn-server --clients 200 --rate 2 --duration 20
+#   python messenger_bench.py --port 55555 --server-pid 1234 --output new.json --compare old.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from core import protocol
+
+try:
+    import psutil  # Optional, used for server CPU/RSS when available
+except ImportError:
+    psutil = None
+
+# Errors that just mean a process went away between listing and reading it
+PROC_ERRORS = (OSError, ValueError) + ((psutil.Error,) if psutil else ())
+
+REPORT_VERSION = 1
+MARKER = "B|"  # Prefix of every benchmark chat line: B|<client>|<n>|<sent ns>|padding
+MAX_SAMPLES = 500_000  # Latency samples kept (reservoir) so long runs stay bounded
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+ENDC = '\033[0m'
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize_ms(values_ns):
+    values = sorted(v / 1e6 for v in values_ns)
+    if not values:
+        return {"samples": 0}
+    return {
+        "samples": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3),
+    }
+
+class ProcessSampler:
+    """Samples CPU time and RSS of the server process, plus any worker
+    processes it started (--workers), while the run lasts.
+    Uses psutil if installed, otherwise /proc (Linux only)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_rss = 0
+        self.cpu_start = None
+        self.cpu_end = None
+        self.proc = psutil.Process(pid) if (psutil and pid) else None
+
+    def _pids(self):
+        if self.proc is not None:
+            return [self.proc] + self.proc.children(recursive=True)
+        pids = [self.pid]
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/task/{pid}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+        return pids
+
+    def _cpu_seconds(self):
+        total = 0.0
+        for proc in self._pids():
+            try:
+                if self.proc is not None:
+                    times = proc.cpu_times()
+                    total += times.user + times.system
+                    continue
+                with open(f"/proc/{proc}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                total += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            except PROC_ERRORS:
+                pass
+        return total
+
+    def _rss_bytes(self):
+        total = 0
+        for proc in self._pids():
+            try:
+                if self.proc is not None:
+                    total += proc.memory_info().rss
+                    continue
+                with open(f"/proc/{proc}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+            except PROC_ERRORS:
+                pass
+        return total
+
+    def available(self):
+        return self.pid is not None and (self.proc is not None or os.path.exists(f"/proc/{self.pid}"))
+
+    def start(self):
+        if self.available():
+            self.cpu_start = self._cpu_seconds()
+
+    def sample(self):
+        if self.available():
+            try:
+                self.peak_rss = max(self.peak_rss, self._rss_bytes())
+            except (OSError, ValueError):
+                pass
+
+    def stop(self):
+        if self.available():
+            self.cpu_end = self._cpu_seconds()
+            self.sample()
+
+    def report(self, elapsed):
+        if self.cpu_start is None or self.cpu_end is None:
+            return {"pid": self.pid, "sampled": False}
+        return {
+            "pid": self.pid,
+            "sampled": True,
+            "cpu_percent": round(100 * (self.cpu_end - self.cpu_start) / elapsed, 1),
+            "peak_rss_mb": round(self.peak_rss / (1024 * 1024), 1),
+        }
+
+class Stats:
+    def __init__(self):
+        self.connect_ns = []
+        self.connect_failed = 0
+        self.sent = 0
+        self.delivered = 0
+        self.latency_ns = []
+        self.seen = 0  # Latency samples offered, for reservoir sampling
+        self.errors = 0
+
+    def add_latency(self, value):
+        self.seen += 1
+        if len(self.latency_ns) < MAX_SAMPLES:
+            self.latency_ns.append(value)
+        else:
+            slot = random.randrange(self.seen)
+            if slot < MAX_SAMPLES:
+                self.latency_ns[slot] = value
+
+class BenchClient:
+    def __init__(self, index, args, stats):
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.name = f"bench{index}"
+        self.room = f"bench-{index % args.rooms}" if args.rooms > 1 else None
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        start = time.perf_counter_ns()
+        self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
+        self.stats.connect_ns.append(time.perf_counter_ns() - start)
+        frames = [(protocol.USERNAME, self.name)]
+        if self.room:
+            frames.append((protocol.CHAT, f"/join {self.room}"))
+            frames.append((protocol.CHAT, "/leave lobby"))
+        self.writer.write(protocol.encode_frames(frames))
+        await self.writer.drain()
+
+    async def receive(self):
+        frame_reader = protocol.FrameReader()
+        try:
+            while True:
+                frames = await protocol.read_frames(self.reader, frame_reader)
+                if frames is None:
+                    return
+                now = time.perf_counter_ns()
+                for msg_type, payload in frames:
+                    if msg_type != protocol.CHAT:
+                        continue
+                    text = payload.decode("utf-8", "replace")
+                    pos = text.find(MARKER)
+                    if pos < 0:
+                        continue
+                    try:
+                        sent_ns = int(text[pos:].split("|", 4)[3])
+                    except (IndexError, ValueError):
+                        continue
+                    self.stats.delivered += 1
+                    self.stats.add_latency(now - sent_ns)
+        except (ConnectionError, OSError, protocol.ProtocolError):
+            self.stats.errors += 1
+
+    async def send_loop(self, stop_at):
+        interval = 1.0 / self.args.rate
+        # Spread the first sends so all clients do not fire in lockstep
+        await asyncio.sleep(random.random() * interval)
+        n = 0
+        next_at = time.perf_counter()
+        while time.perf_counter() < stop_at:
+            head = f"{MARKER}{self.index}|{n}|{time.perf_counter_ns()}|"
+            text = head + "x" * max(self.args.size - len(head), 0)
+            self.writer.write(protocol.encode_frame(protocol.CHAT, text))
+            self.stats.sent += 1
+            n += 1
+            await self.writer.drain()
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def close(self):
+        if self.writer is not None:
+            try:
+                self.writer.write(protocol.encode_frame(protocol.QUIT))
+            except (ConnectionError, OSError):
+                pass
+            self.writer.close()
+
+async def run_load(args, sampler):
+    stats = Stats()
+    clients = [BenchClient(i, args, stats) for i in range(args.clients)]
+    gate = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(client):
+        async with gate:
+            try:
+                await client.connect()
+                return True
+            except OSError:
+                stats.connect_failed += 1
+                return False
+
+    print(f"Connecting {args.clients} clients to {args.host}:{args.port}...")
+    connect_start = time.perf_counter()
+    results = await asyncio.gather(*(connect(c) for c in clients))
+    connect_wall = time.perf_counter() - connect_start
+    live = [c for c, ok in zip(clients, results) if ok]
+    receivers = [asyncio.create_task(c.receive()) for c in live]
+
+    # Let joins and history replay settle before measuring
+    await asyncio.sleep(args.warmup)
+    print(f"Sending for {args.duration}s at {args.rate} msg/s per client ({args.size} bytes)...")
+
+    async def sample_loop():
+        while True:
+            sampler.sample()
+            await asyncio.sleep(0.5)
+
+    sampler.start()
+    sampler_task = asyncio.create_task(sample_loop())
+    run_start = time.perf_counter()
+    stop_at = run_start + args.duration
+    await asyncio.gather(*(c.send_loop(stop_at) for c in live), return_exceptions=True)
+    sent_done = time.perf_counter()
+    # Give in-flight lines time to arrive before counting
+    await asyncio.sleep(args.drain)
+    elapsed = sent_done - run_start
+    sampler.stop()
+    sampler_task.cancel()
+
+    for c in live:
+        c.close()
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(*receivers, return_exceptions=True)
+    return stats, connect_wall, elapsed
+
+def expected_deliveries(args, sent):
+    """Every line reaches everyone else in the sender's room."""
+    per_room = args.clients / max(args.rooms, 1)
+    return int(sent * max(per_room - 1, 0))
+
+def build_report(args, stats, connect_wall, elapsed, sampler):
+    expected = expected_deliveries(args, stats.sent)
+    return {
+        "report_version": REPORT_VERSION,
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "clients": args.clients,
+            "rooms": args.rooms,
+            "rate_per_client": args.rate,
+            "message_size": args.size,
+            "duration_s": args.duration,
+        },
+        "connect": {
+            "ok": len(stats.connect_ns),
+            "failed": stats.connect_failed,
+            "wall_s": round(connect_wall, 3),
+            "latency_ms": summarize_ms(stats.connect_ns),
+        },
+        "throughput": {
+            "sent": stats.sent,
+            "delivered": stats.delivered,
+            "expected_deliveries": expected,
+            "delivery_ratio": round(stats.delivered / expected, 4) if expected else None,
+            "sent_per_s": round(stats.sent / elapsed, 1),
+            "delivered_per_s": round(stats.delivered / elapsed, 1),
+        },
+        "latency_ms": summarize_ms(stats.latency_ns),
+        "server": sampler.report(elapsed),
+        "client_errors": stats.errors,
+    }
+
+# Metrics compared by --compare: (section, key, True if higher is better)
+COMPARED = [
+    ("throughput", "delivered_per_s", True),
+    ("throughput", "delivery_ratio", True),
+    ("latency_ms", "p50", False),
+    ("latency_ms", "p95", False),
+    ("latency_ms", "p99", False),
+    ("connect", "wall_s", False),
+    ("server", "cpu_percent", False),
+    ("server", "peak_rss_mb", False),
+]
+
+def print_report(report, baseline=None):
+    print("\n" + "=" * 60)
+    print(f"{'metric':<32}{'value':>12}{'baseline':>16}")
+    print("-" * 60)
+    for section, key, higher_is_better in COMPARED:
+        value = report.get(section, {}).get(key)
+        if value is None:
+            continue
+        line = f"{section + '.' + key:<32}{value:>12}"
+        old = (baseline or {}).get(section, {}).get(key)
+        if old is not None:
+            better = value >= old if higher_is_better else value <= old
+            color = GREEN if better else RED
+            line += f"{color}{old:>16}{ENDC}"
+        print(line)
+    print("=" * 60)
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def spawn_server(args):
+    server_script = Path(__file__).resolve().parent / "messenger_server.py"
+    command = [sys.executable, str(server_script), "--port", str(args.port), "--no-log"] + args.server_arg
+    proc = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(args.host, args.port):
+        proc.kill()
+        raise SystemExit(f"{RED}ERROR: spawned server did not start listening on {args.port}{ENDC}")
+    return proc
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for messenger_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=55555)
+    parser.add_argument("--clients", type=int, default=100, help="simulated users (default 100)")
+    parser.add_argument("--rooms", type=int, default=1, help="spread users over this many rooms (default 1)")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages per second per user (default 1)")
+    parser.add_argument("--size", type=int, default=64, help="chat line size in bytes (default 64)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of sending (default 10)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds to wait after connecting")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for in-flight lines")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="connects in flight at once")
+    parser.add_argument("--spawn-server", action="store_true", help="start a local messenger_server.py for the run")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="extra argument for the spawned server, e.g. --server-arg=--threaded (repeatable)")
+    parser.add_argument("--server-pid", type=int, help="pid of an already running server to sample")
+    parser.add_argument("--label", default="", help="free-form label stored in the report")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    proc = spawn_server(args) if args.spawn_server else None
+    pid = proc.pid if proc else args.server_pid
+    sampler = ProcessSampler(pid)
+    try:
+        stats, connect_wall, elapsed = asyncio.run(run_load(args, sampler))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=5)
+
+    report = build_report(args, stats, connect_wall, elapsed, sampler)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# messenger_log.py
+# Append-only chat history for messenger_server.py.
+#
+# Messages are written to segment files that rotate once they reach a size
+# limit. Each segment is named after the first sequence number it holds:
+#
+#   chat_log/00000000000000000001.log   records
+#   chat_log/00000000000000000001.idx   sparse (seq, offset) index
+#
+# A record is a fixed header followed by the room name and a ready-to-send
+# HISTORY frame, so replay copies bytes straight out of a memory-mapped
+# segment without decoding or re-encoding anything:
+#
+#   seq (8) | crc32 (4) | room length (2) | frame length (4) | room | frame
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+
+from core import protocol
+
+RECORD = struct.Struct("!QIHI")
+INDEX_ENTRY = struct.Struct("!QQ")
+
+SEGMENT_BYTES = 16 * 1024 * 1024  # Rotate to a new segment after this many bytes
+INDEX_EVERY = 64                  # One index entry per this many records
+FSYNC_POLICIES = ("always", "batch", "off")
+FSYNC_INTERVAL = 1.0              # Seconds between fsyncs in 'batch' mode
+
+class Segment:
+    """One .log/.idx file pair. `index` is a sorted list of (seq, offset)."""
+
+    def __init__(self, base_seq, log_path, idx_path):
+        self.base_seq = base_seq
+        self.log_path = log_path
+        self.idx_path = idx_path
+        self.index = []
+        self.size = 0
+        self.last_seq = base_seq - 1
+
+    def offset_for(self, seq):
+        """Byte offset to start scanning from to find `seq`."""
+        pos = bisect.bisect_right(self.index, (seq, float("inf"))) - 1
+        return self.index[pos][1] if pos >= 0 else 0
+
+def iter_records(buf, offset, end):
+    """Yields (seq, room, frame_start, frame_end, next_offset) from a buffer.
+    Stops at the first incomplete or corrupt record."""
+    while offset + RECORD.size <= end:
+        seq, crc, room_len, frame_len = RECORD.unpack_from(buf, offset)
+        body = offset + RECORD.size
+        record_end = body + room_len + frame_len
+        if record_end > end or zlib.crc32(buf[body:record_end]) != crc:
+            return
+        room = bytes(buf[body:body + room_len]).decode("utf-8")
+        yield seq, room, body + room_len, record_end, record_end
+        offset = record_end
+
+class MessageLog:
+    """Segmented, append-only message log with sparse seq -> offset indexes."""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, fsync="batch",
+                 fsync_interval=FSYNC_INTERVAL, index_every=INDEX_EVERY):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.index_every = index_every
+        self.lock = threading.Lock()
+        self.segments = []
+        self.log_file = None
+        self.idx_file = None
+        self.dirty = False
+        self.closed = False
+        self._since_index = 0
+
+        self._load_segments()
+        if not self.segments:
+            self._open_segment(1)
+        else:
+            self._reopen_active()
+
+        self.syncer = None
+        if self.fsync == "batch":
+            self.syncer = threading.Thread(target=self._sync_loop, daemon=True)
+            self.syncer.start()
+
+    # --- STARTUP / RECOVERY ---
+
+    def _load_segments(self):
+        for log_path in sorted(self.directory.glob("*.log")):
+            try:
+                base_seq = int(log_path.stem)
+            except ValueError:
+                continue
+            seg = Segment(base_seq, log_path, log_path.with_suffix(".idx"))
+            seg.size = log_path.stat().st_size
+            if seg.idx_path.exists():
+                raw = seg.idx_path.read_bytes()
+                usable = len(raw) - len(raw) % INDEX_ENTRY.size
+                seg.index = [entry for entry in INDEX_ENTRY.iter_unpack(raw[:usable]) if entry[1] < seg.size]
+            self.segments.append(seg)
+
+        # Only the newest segment can have a torn tail or a stale index; scan it
+        # from its last index entry to find the true end and last seq.
+        if self.segments:
+            self._recover(self.segments[-1])
+        # Older segments just need their last seq, which the next segment's
+        # base tells us
+        for seg, nxt in zip(self.segments, self.segments[1:]):
+            seg.last_seq = nxt.base_seq - 1
+
+    def _recover(self, seg):
+        start = seg.index[-1][1] if seg.index else 0
+        seg.last_seq = seg.index[-1][0] - 1 if seg.index else seg.base_seq - 1
+        end = start
+        with open(seg.log_path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        for seq, _, _, _, next_offset in iter_records(data, 0, len(data)):
+            seg.last_seq = seq
+            end = start + next_offset
+        if end < seg.size:
+            # Drop a half-written record left behind by a crash, and any index
+            # entry that pointed at it
+            with open(seg.log_path, "r+b") as f:
+                f.truncate(end)
+            seg.size = end
+            seg.index = [entry for entry in seg.index if entry[1] < end]
+            seg.idx_path.write_bytes(b"".join(INDEX_ENTRY.pack(*entry) for entry in seg.index))
+
+    def _reopen_active(self):
+        seg = self.segments[-1]
+        self.log_file = open(seg.log_path, "ab", buffering=0)
+        self.idx_file = open(seg.idx_path, "ab", buffering=0)
+        self._since_index = self.index_every  # Index the next record we write
+
+    def _open_segment(self, base_seq):
+        seg = Segment(base_seq, self.directory / f"{base_seq:020d}.log", self.directory / f"{base_seq:020d}.idx")
+        self.log_file = open(seg.log_path, "ab", buffering=0)
+        self.idx_file = open(seg.idx_path, "ab", buffering=0)
+        self._since_index = self.index_every
+        self.segments.append(seg)
+
+    # --- WRITING ---
+
+    @property
+    def last_seq(self):
+        return self.segments[-1].last_seq
+
+    def append(self, room, text):
+        """Stores one chat line for `room` and returns its sequence number.
+        Lines longer than protocol.MAX_LINE_BYTES would not fit in a HISTORY
+        frame: ProtocolError is raised and nothing is written."""
+        if len(text.encode("utf-8")) > protocol.MAX_LINE_BYTES:
+            raise protocol.ProtocolError(f"chat line exceeds {protocol.MAX_LINE_BYTES} bytes")
+        with self.lock:
+            seg = self.segments[-1]
+            if seg.size >= self.segment_bytes:
+                self._rotate()
+                seg = self.segments[-1]
+            seq = seg.last_seq + 1
+            room_bytes = room.encode("utf-8")
+            frame = protocol.encode_frame(protocol.HISTORY, f"#{seq} {text}")
+            body = room_bytes + frame
+            record = RECORD.pack(seq, zlib.crc32(body), len(room_bytes), len(frame)) + body
+
+            if self._since_index >= self.index_every:
+                self.idx_file.write(INDEX_ENTRY.pack(seq, seg.size))
+                seg.index.append((seq, seg.size))
+                self._since_index = 0
+            self._since_index += 1
+
+            # Unbuffered file: one write() per record, visible to mmap readers at once
+            self.log_file.write(record)
+            seg.size += len(record)
+            seg.last_seq = seq
+            if self.fsync == "always":
+                os.fsync(self.log_file.fileno())
+            else:
+                self.dirty = True
+            return seq
+
+    def _rotate(self):
+        if self.fsync != "off":
+            os.fsync(self.log_file.fileno())
+            os.fsync(self.idx_file.fileno())
+        self.log_file.close()
+        self.idx_file.close()
+        self._open_segment(self.segments[-1].last_seq + 1)
+
+    def sync(self):
+        with self.lock:
+            if self.dirty and not self.closed:
+                os.fsync(self.log_file.fileno())
+                os.fsync(self.idx_file.fileno())
+                self.dirty = False
+
+    def _sync_loop(self):
+        while not self.closed:
+            time.sleep(self.fsync_interval)
+            try:
+                self.sync()
+            except (OSError, ValueError):
+                pass
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            if self.fsync != "off":
+                os.fsync(self.log_file.fileno())
+                os.fsync(self.idx_file.fileno())
+            self.closed = True
+            self.log_file.close()
+            self.idx_file.close()
+
+    # --- READING ---
+
+    def replay(self, after_seq=0, rooms=None, max_bytes=None):
+        """Yields (seq, frame_bytes) for records after `after_seq`, optionally
+        limited to `rooms`. Segments are memory-mapped one at a time, so the
+        history never has to fit in RAM. Stops early once `max_bytes` of frames
+        have been produced."""
+        with self.lock:
+            # Snapshot the segment list and sizes; records are never rewritten
+            snapshot = [(seg, seg.size) for seg in self.segments]
+        first = max(after_seq + 1, 1)
+        bases = [seg.base_seq for seg, _ in snapshot]
+        start = max(bisect.bisect_right(bases, first) - 1, 0)
+        produced = 0
+
+        for seg, size in snapshot[start:]:
+            if size == 0 or seg.last_seq < first:
+                continue
+            with open(seg.log_path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buf:
+                offset = seg.offset_for(first) if seg.base_seq <= first else 0
+                for seq, room, frame_start, frame_end, _ in iter_records(buf, offset, size):
+                    if seq < first or (rooms is not None and room not in rooms):
+                        continue
+                    yield seq, buf[frame_start:frame_end]
+                    produced += frame_end - frame_start
+                    if max_bytes is not None and produced >= max_bytes:
+                        return
+
+    def tail(self, room, count, scan_limit=None):
+        """The last `count` messages of `room`, looking back at most
+        `scan_limit` records (default 100x count) to keep joins cheap."""
+        scan_limit = scan_limit or count * 100
+        recent = deque(maxlen=count)
+        for seq, frame in self.replay(max(self.last_seq - scan_limit, 0), rooms={room}):
+            recent.append((seq, frame))
+        return list(recent)
@@ -1,110 +1,1151 @@
-# messenger_server.py
-# This script must be running for the 'messenger.py' app to work.
-import socket
-import threading
-import time
-
-# --- SERVER CONFIGURATION ---
-HOST = '0.0.0.0'  # Listen on all interfaces
-PORT = 55555      # A high-numbered, unused port
-
-# --- GLOBAL STATE ---
-clients = []
-usernames = []
-# Using simple ANSI escape codes for server status colors
-GREEN = '\033[92m'
-RED = '\033[91m'
-YELLOW = '\033[93m'
-ENDC = '\033[0m'
-
-def broadcast(message, sender_client=None):
-    """Sends a message to all connected clients."""
-    for client in clients:
-        # Don't send the message back to the sender
-        if client != sender_client:
-            try:
-                client.send(message)
-            except:
-                # Handle broken connections silently
-                remove_client(client)
-
-def remove_client(client):
-    """Removes a disconnected client."""
-    if client in clients:
-        index = clients.index(client)
-        username = usernames[index]
-        clients.remove(client)
-        usernames.remove(username)
-        print(f"{YELLOW}[DISCONNECT]{ENDC} {username} has left the chat.")
-        broadcast(f"{username} left the chat.".encode('utf-8'))
-        
-def handle_client(client, addr):
-    """Handles all communication for a single client connection."""
-    
-    # First message from client must be the username
-    try:
-        username = client.recv(1024).decode('utf-8')
-        if not username:
-            client.close()
-            return
-    except:
-        client.close()
-        return
-
-    usernames.append(username)
-    clients.append(client)
-    
-    print(f"{GREEN}[NEW CONNECTION]{ENDC} {username} connected from {addr}")
-    broadcast(f"{username} joined the chat.".encode('utf-8'), client)
-    
-    while True:
-        try:
-            # Keep receiving message data
-            message = client.recv(1024)
-            if not message:
-                # Empty message means the client gracefully disconnected
-                break
-                
-            # Prepend the username to the message and broadcast
-            full_message = f"<{username}>: ".encode('utf-8') + message
-            print(f"[{time.strftime('%H:%M:%S')}] {full_message.decode('utf-8').strip()}")
-            broadcast(full_message, client)
-            
-        except:
-            # Client abruptly disconnected
-            break
-
-    # Cleanup when the loop breaks
-    remove_client(client)
-    client.close()
-
-def start_server():
-    """Main server loop to listen for connections."""
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        server.bind((HOST, PORT))
-        server.listen()
-        print(f"\n{GREEN}<< Messenger Server Running >>{ENDC}")
-        print(f"Listening on {HOST}:{PORT}")
-        
-    except Exception as e:
-        print(f"{RED}ERROR: Could not start server. {e}{ENDC}")
-        return
-
-    while True:
-        try:
-            client, addr = server.accept()
-            # Start a new thread for every connected client
-            thread = threading.Thread(target=handle_client, args=(client, addr))
-            thread.start()
-            print(f"{YELLOW}[STATUS]{ENDC} Active connections: {threading.active_count() - 1}")
-        except KeyboardInterrupt:
-            print(f"\n{YELLOW}Server shut down by user.{ENDC}")
-            server.close()
-            break
-        except Exception as e:
-            print(f"{RED}Error accepting connection: {e}{ENDC}")
-            time.sleep(1)
-
-if __name__ == '__main__':
-    start_server()
\ No newline at end of file
+# messenger_server.py
+# This script must be running for the 'messenger.py' app to work.
+import argparse
+import asyncio
+import bisect
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from core import protocol
+import messenger_log
+
+try:
+    import resource  # Unix only, used to raise the open file limit
+except ImportError:
+    resource = None
+
+# --- SERVER CONFIGURATION ---
+HOST = '0.0.0.0'  # Listen on all interfaces
+PORT = 55555      # A high-numbered, unused port
+BACKLOG = 4096    # Pending connections the kernel may queue for us
+
+# --- OUTBOUND QUEUE LIMITS ---
+# Every client gets its own bounded queue of frames waiting to be written, so a
+# slow reader only ever delays itself.
+HIGH_WATERMARK = 256 * 1024  # Queued bytes that trigger the slow-consumer policy
+LOW_WATERMARK = 64 * 1024    # 'drop_oldest' trims the queue back down to this
+SLOW_POLICY = 'drop_oldest'  # 'drop_oldest' or 'disconnect'
+
+# --- ROOMS ---
+DEFAULT_ROOM = 'lobby'  # Every client starts here
+
+# --- TELEMETRY ---
+VERBOSE = True   # Print every chat line to the console (--quiet turns it off)
+RATE_WINDOW = 10  # Seconds of history behind the per-second rates
+FANOUT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+# --- HISTORY ---
+LOG_DIR = Path(__file__).resolve().parent / 'chat_log'
+HISTORY_ON_JOIN = 50  # Recent lines replayed to someone entering a room
+
+# --- GLOBAL STATE ---
+# Indexes instead of parallel lists: fan-out only touches a room's members and
+# removing a client costs O(rooms it joined). Each client object also carries
+# its own .name, .rooms (set) and .room (where plain chat lines go).
+users = {}   # username -> client
+rooms = {}   # room name -> set of clients
+message_log = None  # messenger_log.MessageLog, unless started with --no-log
+bus = None            # BusLink when running as one worker of a sharded server
+remote_users = set()  # Usernames connected to the other workers
+clients_lock = threading.RLock()  # Guards users/rooms (threaded engine)
+
+# Server-wide outbound counters, including clients that already left
+queue_totals = {
+    "queued_bytes": 0,      # Bytes ever accepted into a client queue
+    "dropped_bytes": 0,     # Bytes discarded by the drop_oldest policy
+    "dropped_frames": 0,    # Queue entries discarded by the drop_oldest policy
+    "slow_disconnects": 0,  # Clients kicked by the disconnect policy
+}
+queue_totals_lock = threading.Lock()
+# Using simple ANSI escape codes for server status colors
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+ENDC = '\033[0m'
+
+class SlowConsumerError(ConnectionError):
+    """Raised by send() when the 'disconnect' policy gives up on a client."""
+
+class OutboundQueue:
+    """Bounded FIFO of encoded frames waiting to be written to one client.
+
+    Entries are whole frame batches, so dropping one never leaves a torn frame
+    on the wire."""
+
+    def __init__(self, high_watermark=None, low_watermark=None, policy=None):
+        self.high_watermark = high_watermark or HIGH_WATERMARK
+        self.low_watermark = min(low_watermark or LOW_WATERMARK, self.high_watermark)
+        self.policy = policy or SLOW_POLICY
+        self.frames = deque()
+        self.queued_bytes = 0     # Current depth
+        self.dropped_bytes = 0    # Lifetime counters for this client
+        self.dropped_frames = 0
+        self.overflowing = False  # True from the first drop until the writer catches up
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, data):
+        """Queues `data`. Returns (bytes dropped to make room, True if this is
+        the first drop since the writer last caught up), or None if the policy
+        says the client must be disconnected. Under 'drop_oldest', `data` is
+        itself dropped if it alone is bigger than the high watermark."""
+        dropped_bytes = dropped_frames = 0
+        fits = len(data) <= self.high_watermark
+        first_drop = False
+        with self.lock:
+            if self.queued_bytes + len(data) > self.high_watermark:
+                if self.policy == 'disconnect':
+                    return None
+                if not fits:
+                    # No amount of dropping makes room for it, so it is what goes
+                    dropped_bytes, dropped_frames = len(data), 1
+                else:
+                    # Drop the oldest entries until we are back under the low watermark
+                    while self.frames and self.queued_bytes + len(data) > self.low_watermark:
+                        old = self.frames.popleft()
+                        self.queued_bytes -= len(old)
+                        dropped_bytes += len(old)
+                        dropped_frames += 1
+                self.dropped_bytes += dropped_bytes
+                self.dropped_frames += dropped_frames
+                first_drop, self.overflowing = not self.overflowing, True
+            if fits:
+                self.frames.append(data)
+                self.queued_bytes += len(data)
+        with queue_totals_lock:
+            queue_totals["queued_bytes"] += len(data) if fits else 0
+            queue_totals["dropped_bytes"] += dropped_bytes
+            queue_totals["dropped_frames"] += dropped_frames
+        return dropped_bytes, first_drop
+
+    def pop_all(self):
+        """Takes everything queued as one buffer, so the writer issues a single
+        sendall() per wake-up no matter how many frames piled up."""
+        with self.lock:
+            data = b"".join(self.frames)
+            self.frames.clear()
+            self.queued_bytes = 0
+            self.overflowing = False
+        return data
+
+def enqueue(client, data):
+    """Shared send() logic for both client types: apply the slow-consumer
+    policy and report it once per overflow episode."""
+    pushed = client.queue.push(data)
+    if pushed is None:
+        with queue_totals_lock:
+            queue_totals["slow_disconnects"] += 1
+        print(f"{RED}[SLOW CONSUMER]{ENDC} {client.name} exceeded {client.queue.high_watermark} queued bytes, disconnecting.")
+        client.close()
+        raise SlowConsumerError(f"{client.name} is too slow")
+    dropped, first_drop = pushed
+    if first_drop:
+        print(f"{YELLOW}[SLOW CONSUMER]{ENDC} {client.name} is falling behind, dropped {dropped} bytes.")
+
+class ThreadedClient:
+    """Socket plus a dedicated writer thread draining its outbound queue, so
+    broadcast() never blocks on another client's full receive window."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.name = None
+        self.queue = OutboundQueue()
+        self.closed = False
+        self.wakeup = threading.Condition()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionError("client is closed")
+        enqueue(self, data)
+        with self.wakeup:
+            self.wakeup.notify()
+        return len(data)
+
+    def _write_loop(self):
+        while True:
+            with self.wakeup:
+                while not self.queue and not self.closed:
+                    self.wakeup.wait()
+                if self.closed:
+                    return
+            try:
+                self.sock.sendall(self.queue.pop_all())
+            except OSError:
+                self.close()
+                return
+
+    def reject(self, frame):
+        """Writes one last frame directly, then hangs up."""
+        try:
+            self.sock.sendall(frame)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        with self.wakeup:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify()
+        try:
+            # shutdown() also wakes the handler thread blocked in recv()
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+def queue_stats():
+    """Snapshot of outbound queue counters plus the current depth per client."""
+    with clients_lock:
+        live = list(users.values())
+    with queue_totals_lock:
+        stats = dict(queue_totals)
+    stats["current_queued_bytes"] = sum(c.queue.queued_bytes for c in live)
+    stats["per_client"] = {
+        c.name: {
+            "queued_bytes": c.queue.queued_bytes,
+            "queued_frames": len(c.queue),
+            "dropped_bytes": c.queue.dropped_bytes,
+            "dropped_frames": c.queue.dropped_frames,
+        }
+        for c in live
+    }
+    return stats
+
+class Metrics:
+    """Live server counters, per-second rates and a fan-out duration histogram.
+    Shared by every engine; served as JSON or Prometheus text on the admin
+    endpoint."""
+
+    COUNTERS = {
+        "connections_total": "Users that connected since the server started.",
+        "messages_in": "Frames received from clients.",
+        "messages_out": "Frames queued for delivery to clients.",
+        "bytes_in": "Bytes received from clients.",
+        "bytes_out": "Bytes queued for delivery to clients.",
+        "send_failures": "Sends that failed and dropped the client.",
+    }
+    RATES = ("messages_in", "messages_out", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.fanout_buckets = [0] * (len(FANOUT_BUCKETS) + 1)  # Last slot is +Inf
+        self.fanout_sum = 0.0
+        self.fanout_count = 0
+        self.samples = deque(maxlen=RATE_WINDOW + 1)  # (monotonic time, counters)
+        self.started = time.time()
+
+    def add(self, **amounts):
+        with self.lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def observe_fanout(self, seconds):
+        with self.lock:
+            self.fanout_buckets[bisect.bisect_left(FANOUT_BUCKETS, seconds)] += 1
+            self.fanout_sum += seconds
+            self.fanout_count += 1
+
+    def tick(self):
+        with self.lock:
+            self.samples.append((time.monotonic(), dict(self.counters)))
+
+    def _tick_loop(self):
+        while True:
+            self.tick()
+            time.sleep(1)
+
+    def start(self):
+        threading.Thread(target=self._tick_loop, name="metrics", daemon=True).start()
+
+    def rates(self):
+        with self.lock:
+            if len(self.samples) < 2:
+                return dict.fromkeys(self.RATES, 0.0)
+            (t0, first), (t1, last) = self.samples[0], self.samples[-1]
+        return {name: round((last[name] - first[name]) / (t1 - t0), 2) for name in self.RATES}
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            buckets = list(self.fanout_buckets)
+            fanout_sum, fanout_count = self.fanout_sum, self.fanout_count
+        queues = queue_stats()
+        with clients_lock:
+            active, room_count = len(users), len(rooms)
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "active_connections": active,
+            "rooms": room_count,
+            "counters": counters,
+            "rates_per_s": self.rates(),
+            "fanout_seconds": {"buckets": dict(zip([*map(str, FANOUT_BUCKETS), "+Inf"], buckets)),
+                               "sum": round(fanout_sum, 6), "count": fanout_count},
+            "queues": queues,
+        }
+
+metrics = Metrics()
+
+def prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(snapshots):
+    """Prometheus text format for {labels: snapshot}; labels is a string such
+    as 'worker="0"' (empty for a single process)."""
+    series = {}  # metric -> (type, help, [(labels, value), ...])
+
+    def add(name, kind, help_text, labels, value):
+        series.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+
+    def join(*parts):
+        parts = [p for p in parts if p]
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    for base, snap in snapshots.items():
+        add("messenger_active_connections", "gauge", "Users currently connected.", join(base), snap["active_connections"])
+        add("messenger_rooms", "gauge", "Rooms with at least one member.", join(base), snap["rooms"])
+        for name, value in snap["counters"].items():
+            metric = name if name.endswith("_total") else f"{name}_total"
+            add(f"messenger_{metric}", "counter", Metrics.COUNTERS[name], join(base), value)
+        for name, value in snap["rates_per_s"].items():
+            add(f"messenger_{name}_per_second", "gauge", f"{name.replace('_', ' ').capitalize()} per second over the last {RATE_WINDOW}s.", join(base), value)
+        cumulative = 0
+        for le, count in snap["fanout_seconds"]["buckets"].items():
+            cumulative += count
+            add("messenger_fanout_seconds_bucket", "histogram", "Time spent queueing one message for a room.", join(base, f'le="{le}"'), cumulative)
+        add("messenger_fanout_seconds_sum", "", "", join(base), snap["fanout_seconds"]["sum"])
+        add("messenger_fanout_seconds_count", "", "", join(base), snap["fanout_seconds"]["count"])
+        queues = snap["queues"]
+        for name in ("dropped_bytes", "dropped_frames", "slow_disconnects", "queued_bytes"):
+            add(f"messenger_queue_{name}_total", "counter", f"Outbound queue {name.replace('_', ' ')}.", join(base), queues[name])
+        for user, depth in queues["per_client"].items():
+            add("messenger_client_queue_bytes", "gauge", "Bytes waiting in one client's outbound queue.",
+                join(base, f'user="{prometheus_label(user)}"'), depth["queued_bytes"])
+
+    lines = []
+    for name, (kind, help_text, values) in series.items():
+        if kind:
+            family = name[:-len("_bucket")] if name.endswith("_bucket") else name
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+        lines.extend(f"{name}{labels} {value}" for labels, value in values)
+    return "\n".join(lines) + "\n"
+
+def serve_admin(address, render):
+    """Answers metrics requests on a local TCP port or Unix socket path, from
+    a daemon thread so it works next to any engine. Speaks just enough HTTP
+    for curl and Prometheus (GET /metrics, GET /metrics.json); a bare 'json'
+    or 'prometheus' line also works, e.g. through `nc -U`."""
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.unlink(address)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(address)
+    listener.listen(16)
+
+    def answer(conn):
+        conn.settimeout(2)
+        request = conn.recv(4096).decode("latin-1")
+        first = request.split("\r\n", 1)[0].split("\n", 1)[0].strip()
+        parts = first.split()
+        if len(parts) >= 2 and parts[0] in ("GET", "HEAD"):
+            path = parts[1].split("?", 1)[0]
+            http = True
+        else:
+            path = {"json": "/metrics.json", "prometheus": "/metrics"}.get(first.lower(), first)
+            http = False
+        if path == "/metrics":
+            body, content_type, status = render("prometheus"), "text/plain; version=0.0.4", "200 OK"
+        elif path in ("/", "/metrics.json"):
+            body, content_type, status = render("json"), "application/json", "200 OK"
+        else:
+            body, content_type, status = "not found: try /metrics or /metrics.json\n", "text/plain", "404 Not Found"
+        body = body.encode("utf-8")
+        if http:
+            head = f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+            conn.sendall(head.encode("latin-1") + body)
+        else:
+            conn.sendall(body)
+
+    def loop():
+        while True:
+            conn, _ = listener.accept()
+            with conn:
+                try:
+                    answer(conn)
+                except OSError:
+                    pass
+
+    threading.Thread(target=loop, name="admin", daemon=True).start()
+    return listener
+
+def render_local(fmt):
+    snap = metrics.snapshot()
+    if fmt == "json":
+        return json.dumps(snap, indent=2)
+    return render_prometheus({"": snap})
+
+def admin_address(args):
+    """--admin-socket path, or ('127.0.0.1', --admin-port), or None."""
+    if args.admin_socket:
+        return args.admin_socket
+    return ("127.0.0.1", args.admin_port) if args.admin_port else None
+
+def start_admin(address, render=render_local):
+    """Starts the admin endpoint if one was requested on the command line."""
+    if address is None:
+        return
+    try:
+        serve_admin(address, render)
+        where = address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+        print(f"{YELLOW}[STATUS]{ENDC} Metrics on {where} (/metrics, /metrics.json)")
+    except OSError as e:
+        print(f"{RED}ERROR: Could not start admin endpoint. {e}{ENDC}")
+
+def send_to(targets, message, sender_client=None):
+    """Queues a message (one or more encoded frames) for every client in
+    `targets` except the sender."""
+    sent = failed = 0
+    for client in targets:
+        # Don't send the message back to the sender
+        if client != sender_client:
+            try:
+                client.send(message)
+                sent += 1
+            except:
+                # Handle broken connections silently
+                failed += 1
+                remove_client(client)
+    if sent or failed:
+        metrics.add(messages_out=sent * protocol.count_frames(message), bytes_out=sent * len(message), send_failures=failed)
+
+def broadcast(message, sender_client=None):
+    """Queues a message for all connected clients, whatever room they are in."""
+    with clients_lock:
+        targets = list(users.values())
+    send_to(targets, message, sender_client)
+
+def room_broadcast(room, message, sender_client=None, local_only=False):
+    """Queues a message for the members of one room only. In sharded mode the
+    message is also published so the other workers deliver it to theirs."""
+    started = time.perf_counter()
+    with clients_lock:
+        targets = list(rooms.get(room, ()))
+    send_to(targets, message, sender_client)
+    metrics.observe_fanout(time.perf_counter() - started)
+    if bus is not None and not local_only:
+        bus.publish(BUS_ROOM, room, message)
+
+def join_room(client, room):
+    with clients_lock:
+        rooms.setdefault(room, set()).add(client)
+        client.rooms.add(room)
+        client.room = room
+    room_broadcast(room, protocol.encode_frame(protocol.JOIN, f"{client.name} joined {room}."), client)
+
+def leave_room(client, room):
+    """Takes `client` out of `room`. Returns False if it was not a member."""
+    with clients_lock:
+        if room not in client.rooms:
+            return False
+        client.rooms.discard(room)
+        members = rooms.get(room)
+        if members is not None:
+            members.discard(client)
+            if not members:
+                del rooms[room]
+        if client.room == room:
+            # Fall back to the lobby if still in it, otherwise any joined room
+            if DEFAULT_ROOM in client.rooms:
+                client.room = DEFAULT_ROOM
+            else:
+                client.room = next(iter(client.rooms), None)
+    room_broadcast(room, protocol.encode_frame(protocol.LEAVE, f"{client.name} left {room}."))
+    return True
+
+def remove_client(client):
+    """Removes a disconnected client."""
+    with clients_lock:
+        if users.get(client.name) is not client:
+            return
+        del users[client.name]
+        joined = list(client.rooms)
+    print(f"{YELLOW}[DISCONNECT]{ENDC} {client.name} has left the chat.")
+    if bus is not None:
+        bus.publish(BUS_USER_OFF, client.name)
+    for room in joined:
+        leave_room(client, room)
+
+def read_username(frames):
+    """Pulls the username out of the first frames sent by a client.
+    Returns (username, remaining_frames); username is None if it is missing."""
+    if not frames or frames[0][0] != protocol.USERNAME:
+        return None, []
+    username = frames[0][1].decode('utf-8').strip()
+    # Spaces would make the name impossible to address with /msg
+    return (username.replace(" ", "_") or None), frames[1:]
+
+def register_client(client, username, addr):
+    """Adds a client to the user index and the default room.
+    Returns False if the username is already taken."""
+    with clients_lock:
+        if username in users or username in remote_users:
+            taken = True
+        else:
+            taken = False
+            client.name = username
+            client.rooms = set()
+            client.room = None
+            users[username] = client
+    if taken:
+        print(f"{RED}[REJECTED]{ENDC} {addr} tried to use taken username {username}")
+        client.reject(protocol.encode_frame(protocol.SYSTEM, f"Username '{username}' is already taken."))
+        return False
+
+    metrics.add(connections_total=1)
+    print(f"{GREEN}[NEW CONNECTION]{ENDC} {username} connected from {addr}")
+    print(f"{YELLOW}[STATUS]{ENDC} Active connections: {len(users)}")
+    if bus is not None:
+        bus.publish(BUS_USER_ON, username)
+    join_room(client, DEFAULT_ROOM)
+    send_history(client, room=DEFAULT_ROOM)
+    return True
+
+def send_history(client, room=None, after_seq=None):
+    """Replays logged lines to one client as a single batch: the recent tail
+    of `room`, or everything after `after_seq` in the client's rooms. The batch
+    is capped below the high watermark so replay never trips the slow-consumer
+    policy; the client is told where to continue."""
+    if message_log is None:
+        return
+    limit = HIGH_WATERMARK // 2
+    if after_seq is None:
+        records = message_log.tail(room, HISTORY_ON_JOIN)
+    else:
+        with clients_lock:
+            joined = set(client.rooms)
+        records = list(message_log.replay(after_seq, rooms=joined, max_bytes=limit))
+    if not records:
+        return
+    last_seq = records[-1][0]
+    size = sum(len(frame) for _, frame in records)
+    if after_seq is not None and size >= limit:
+        notice = f"More history available: /history {last_seq}"
+    else:
+        notice = f"End of history (#{last_seq})."
+    send_to([client], b"".join(frame for _, frame in records) + protocol.encode_frame(protocol.SYSTEM, notice))
+
+def run_command(client, text, direct):
+    """Handles a /command line. Returns a SYSTEM reply for the sender, or None.
+    Direct messages are appended to `direct` as (target, frame) pairs."""
+    command, _, rest = text.partition(" ")
+    command = command.lower()
+    rest = rest.strip()
+
+    if command == "/join":
+        if not rest:
+            return "Usage: /join <room>"
+        if rest in client.rooms:
+            client.room = rest
+            return f"Now talking in {rest}."
+        join_room(client, rest)
+        send_history(client, room=rest)
+        return f"Joined {rest}. Now talking in {rest}."
+
+    if command == "/leave":
+        room = rest or client.room
+        if not room or not leave_room(client, room):
+            return f"You are not in {room or 'any room'}."
+        return f"Left {room}." + (f" Now talking in {client.room}." if client.room else " Use /join <room> to talk again.")
+
+    if command == "/msg":
+        target_name, _, message = rest.partition(" ")
+        message = message.strip()
+        if not target_name or not message:
+            return "Usage: /msg <user> <message>"
+        with clients_lock:
+            target = users.get(target_name)
+            remote = target_name in remote_users
+        line = f"*{client.name}* -> *{target_name}*: {message}"
+        if target is not None:
+            direct.append((target, protocol.encode_frame(protocol.DIRECT, line)))
+        elif remote:
+            # Connected to another worker; let that worker deliver it
+            bus.publish(BUS_DIRECT, target_name, protocol.encode_frame(protocol.DIRECT, line))
+        else:
+            return f"No user named {target_name}."
+        return None
+
+    if command == "/history":
+        if message_log is None:
+            return "History is disabled on this server."
+        try:
+            after_seq = int(rest.lstrip("#")) if rest else max(message_log.last_seq - HISTORY_ON_JOIN, 0)
+        except ValueError:
+            return "Usage: /history [seq]"
+        send_history(client, after_seq=after_seq)
+        return None
+
+    if command == "/rooms":
+        with clients_lock:
+            joined = sorted(client.rooms)
+        return f"Your rooms: {', '.join(joined) or '(none)'}; talking in {client.room or '(none)'}."
+
+    return f"Unknown command {command}. Try /join, /leave, /msg, /history or /rooms."
+
+def process_frames(client, username, frames):
+    """Handles every frame decoded from one read. Chat lines from the same read
+    are grouped per room, so each member gets a single send() per batch.
+    Returns False once the client asked to quit."""
+    outgoing = {}  # room -> [(type, payload), ...]
+    direct = []
+    replies = []
+    keep_going = True
+    metrics.add(messages_in=len(frames), bytes_in=sum(protocol.HEADER_SIZE + len(payload) for _, payload in frames))
+    for msg_type, payload in frames:
+        if msg_type == protocol.QUIT:
+            keep_going = False
+            break
+        if msg_type != protocol.CHAT:
+            continue
+        if len(payload) > protocol.MAX_CHAT_BYTES:
+            replies.append((protocol.SYSTEM, f"Message too long ({len(payload)} bytes, at most {protocol.MAX_CHAT_BYTES}); not sent."))
+            continue
+        text = payload.decode('utf-8', 'replace').strip()
+        if text.startswith("/"):
+            try:
+                reply = run_command(client, text, direct)
+            except protocol.ProtocolError:
+                reply = "Message too long once your name is added; not sent."
+            if reply:
+                replies.append((protocol.SYSTEM, reply))
+            continue
+        room = client.room
+        if room is None:
+            replies.append((protocol.SYSTEM, "You are not in any room. Use /join <room>."))
+            continue
+        # Prepend the username (and room, outside the lobby) to the message
+        prefix = "" if room == DEFAULT_ROOM else f"[{room}] "
+        full_message = f"{prefix}<{username}>: {text}"
+        # Long names or rooms can push a line that was short enough over the frame limit
+        if len(full_message.encode('utf-8')) > protocol.MAX_LINE_BYTES:
+            replies.append((protocol.SYSTEM, "Message too long once your name and room are added; not sent."))
+            continue
+        if VERBOSE:
+            print(f"[{time.strftime('%H:%M:%S')}] {full_message}")
+        if message_log is not None:
+            try:
+                message_log.append(room, full_message)
+            except protocol.ProtocolError as e:
+                replies.append((protocol.SYSTEM, f"Message could not be stored ({e}); not sent."))
+                continue
+        outgoing.setdefault(room, []).append((protocol.CHAT, full_message))
+    for room, batch in outgoing.items():
+        room_broadcast(room, protocol.encode_frames(batch), client)
+    for target, frame in direct:
+        send_to([target], frame)
+    if replies:
+        send_to([client], protocol.encode_frames(replies))
+    return keep_going
+
+def handle_client(sock, addr):
+    """Handles all communication for a single client connection."""
+    client = ThreadedClient(sock)
+    reader = protocol.FrameReader()
+
+    # First frame from client must be the username
+    try:
+        frames = []
+        while not frames:
+            frames = protocol.recv_frames(sock, reader)
+            if frames is None:
+                client.close()
+                return
+        username, frames = read_username(frames)
+        if not username:
+            client.close()
+            return
+    except:
+        client.close()
+        return
+
+    if not register_client(client, username, addr):
+        return
+
+    while True:
+        try:
+            if not process_frames(client, username, frames):
+                break
+            # Keep receiving message data
+            frames = protocol.recv_frames(sock, reader)
+            if frames is None:
+                # Empty read means the client gracefully disconnected
+                break
+        except:
+            # Client abruptly disconnected or sent garbage
+            break
+
+    # Cleanup when the loop breaks
+    remove_client(client)
+    client.close()
+
+def start_server():
+    """Main server loop to listen for connections."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        server.bind((HOST, PORT))
+        server.listen()
+        print(f"\n{GREEN}<< Messenger Server Running >>{ENDC}")
+        print(f"Listening on {HOST}:{PORT}")
+        
+    except Exception as e:
+        print(f"{RED}ERROR: Could not start server. {e}{ENDC}")
+        return
+
+    while True:
+        try:
+            client, addr = server.accept()
+            # Start a new thread for every connected client
+            thread = threading.Thread(target=handle_client, args=(client, addr))
+            thread.start()
+        except KeyboardInterrupt:
+            print(f"\n{YELLOW}Server shut down by user.{ENDC}")
+            server.close()
+            break
+        except Exception as e:
+            print(f"{RED}Error accepting connection: {e}{ENDC}")
+            time.sleep(1)
+
+# --- ASYNCIO ENGINE ---
+# One event loop multiplexes every connection, so an idle user costs a few KB
+# of buffers instead of a whole OS thread.
+
+class AsyncClient:
+    """asyncio counterpart of ThreadedClient: a writer task drains the queue
+    and awaits drain(), so only this client waits on its own socket."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.name = None
+        self.queue = OutboundQueue()
+        self.closed = False
+        self.ready = asyncio.Event()
+        # Keep the transport's own buffer small; backpressure belongs to our queue
+        writer.transport.set_write_buffer_limits(high=64 * 1024)
+        self.task = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionError("client is closed")
+        enqueue(self, data)
+        self.ready.set()
+        return len(data)
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.closed:
+                    return
+                self.writer.write(self.queue.pop_all())
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.close()
+
+    def reject(self, frame):
+        """Writes one last frame directly, then hangs up (close() flushes it)."""
+        self.writer.write(frame)
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.ready.set()
+        self.writer.close()
+
+def raise_fd_limit():
+    """Lifts the soft open-file limit to the hard limit so the async engine
+    can hold many thousands of sockets. Returns the resulting soft limit."""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+async def handle_client_async(reader, writer):
+    """Coroutine version of handle_client(); same join/chat/leave flow."""
+    addr = writer.get_extra_info('peername')
+    client = AsyncClient(writer)
+    frame_reader = protocol.FrameReader()
+
+    # First frame from client must be the username
+    try:
+        frames = []
+        while not frames:
+            frames = await protocol.read_frames(reader, frame_reader)
+            if frames is None:
+                client.close()
+                return
+        username, frames = read_username(frames)
+        if not username:
+            client.close()
+            return
+    except Exception:
+        client.close()
+        return
+
+    if not register_client(client, username, addr):
+        return
+
+    while True:
+        try:
+            if not process_frames(client, username, frames):
+                break
+            # StreamReader.read() returns without yielding while data is
+            # buffered; give the writer tasks a turn between batches
+            await asyncio.sleep(0)
+            frames = await protocol.read_frames(reader, frame_reader)
+            if frames is None:
+                break
+        except Exception:
+            break
+
+    remove_client(client)
+    client.close()
+
+async def serve_async():
+    server = await asyncio.start_server(handle_client_async, HOST, PORT, backlog=BACKLOG)
+    async with server:
+        await server.serve_forever()
+
+def start_async_server():
+    """Main entry point for the asyncio engine."""
+    limit = raise_fd_limit()
+    try:
+        print(f"\n{GREEN}<< Messenger Server Running (asyncio) >>{ENDC}")
+        print(f"Listening on {HOST}:{PORT}")
+        if limit is not None:
+            print(f"{YELLOW}[STATUS]{ENDC} Open file limit: {limit}")
+        asyncio.run(serve_async())
+    except KeyboardInterrupt:
+        print(f"\n{YELLOW}Server shut down by user.{ENDC}")
+    except OSError as e:
+        print(f"{RED}ERROR: Could not start server. {e}{ENDC}")
+
+# --- SHARDED MODE ---
+# Several worker processes accept on the same port through SO_REUSEPORT, so the
+# kernel spreads connections across CPU cores. Each worker runs the asyncio
+# engine for its own users and publishes everything that must reach users on
+# other workers (room traffic, direct messages, who is online) to a small hub
+# in the supervisor process over a Unix socket. The hub relays it to the other
+# workers, so every user still sees one chat.
+
+BUS_MAX_PAYLOAD = 16 * 1024 * 1024
+BUS_KEY = struct.Struct("!H")
+BUS_HELLO = 100     # worker -> hub, key = worker id
+BUS_STATS = 101     # worker -> hub, key = worker id, data = JSON counters
+BUS_ROOM = 102      # key = room, data = frames for that room's members
+BUS_DIRECT = 103    # key = username, data = frame for that user
+BUS_USER_ON = 104   # key = username now connected somewhere
+BUS_USER_OFF = 105  # key = username that left
+STATS_INTERVAL = 2.0      # Seconds between worker stats reports
+RESTART_BACKOFF = 2.0     # Minimum seconds between restarts of one worker
+SUPERVISOR_REPORT = 10.0  # Seconds between supervisor status lines
+
+def encode_bus(op, key, data=b""):
+    key = key.encode('utf-8')
+    return protocol.encode_frame(op, BUS_KEY.pack(len(key)) + key + data, max_payload=BUS_MAX_PAYLOAD)
+
+def decode_bus(payload):
+    (key_len,) = BUS_KEY.unpack_from(payload)
+    end = BUS_KEY.size + key_len
+    return payload[BUS_KEY.size:end].decode('utf-8'), payload[end:]
+
+class BusLink:
+    """A worker's connection to the supervisor hub."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def publish(self, op, key, data=b""):
+        self.writer.write(encode_bus(op, key, data))
+
+async def read_bus(reader):
+    """Applies events published by the other workers to local users."""
+    frame_reader = protocol.FrameReader(max_payload=BUS_MAX_PAYLOAD)
+    while True:
+        frames = await protocol.read_frames(reader, frame_reader)
+        if frames is None:
+            print(f"{RED}[WORKER]{ENDC} Lost the supervisor bus, shutting down.")
+            return
+        for op, payload in frames:
+            key, data = decode_bus(payload)
+            if op == BUS_ROOM:
+                room_broadcast(key, data, local_only=True)
+            elif op == BUS_DIRECT:
+                with clients_lock:
+                    target = users.get(key)
+                if target is not None:
+                    send_to([target], data)
+            elif op == BUS_USER_ON:
+                remote_users.add(key)
+            elif op == BUS_USER_OFF:
+                remote_users.discard(key)
+
+async def report_stats(worker_id):
+    while True:
+        bus.publish(BUS_STATS, str(worker_id), json.dumps(metrics.snapshot()).encode('utf-8'))
+        await asyncio.sleep(STATS_INTERVAL)
+
+async def serve_worker(worker_id, bus_path):
+    global bus
+    reader, writer = await asyncio.open_unix_connection(bus_path)
+    bus = BusLink(writer)
+    bus.publish(BUS_HELLO, str(worker_id))
+    server = await asyncio.start_server(handle_client_async, HOST, PORT, backlog=BACKLOG, reuse_port=True)
+    async with server:
+        tasks = [
+            asyncio.create_task(server.serve_forever()),
+            asyncio.create_task(read_bus(reader)),
+            asyncio.create_task(report_stats(worker_id)),
+        ]
+        # Any task ending (normally the bus closing) ends the worker
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+def run_worker(worker_id, bus_path, config):
+    """Process entry point for one shard. `config` carries the settings the
+    supervisor was started with, since a spawned process starts from defaults."""
+    globals().update(config)
+    raise_fd_limit()
+    metrics.start()
+    try:
+        asyncio.run(serve_worker(worker_id, bus_path))
+    except KeyboardInterrupt:
+        pass
+
+class Supervisor:
+    """Starts the workers, restarts any that die, relays the bus between them
+    and reports per-worker connection counts."""
+
+    def __init__(self, worker_count, config):
+        self.worker_count = worker_count
+        self.config = config
+        self.ctx = multiprocessing.get_context("spawn")
+        self.bus_dir = tempfile.mkdtemp(prefix="cyber_chat_")
+        self.bus_path = os.path.join(self.bus_dir, "bus.sock")
+        self.procs = {}         # worker id -> Process
+        self.started_at = {}    # worker id -> monotonic start time
+        self.links = {}         # worker id -> bus StreamWriter
+        self.worker_users = {}  # worker id -> usernames it announced
+        self.connections = {}   # worker id -> last reported connection count
+        self.worker_metrics = {}  # worker id -> last metrics snapshot
+        self.restarts = 0
+
+    def spawn(self, worker_id):
+        proc = self.ctx.Process(target=run_worker, args=(worker_id, self.bus_path, self.config),
+                                name=f"chat-worker-{worker_id}", daemon=True)
+        proc.start()
+        self.procs[worker_id] = proc
+        self.started_at[worker_id] = time.monotonic()
+
+    def relay(self, source, data):
+        for worker_id, writer in self.links.items():
+            if worker_id != source:
+                writer.write(data)
+
+    async def handle_link(self, reader, writer):
+        worker_id = None
+        frame_reader = protocol.FrameReader(max_payload=BUS_MAX_PAYLOAD)
+        try:
+            while True:
+                frames = await protocol.read_frames(reader, frame_reader)
+                if frames is None:
+                    break
+                for op, payload in frames:
+                    key, data = decode_bus(payload)
+                    if op == BUS_HELLO:
+                        worker_id = int(key)
+                        self.links[worker_id] = writer
+                        self.worker_users[worker_id] = set()
+                        # Tell the new worker who is already online elsewhere
+                        online = [encode_bus(BUS_USER_ON, name)
+                                  for other, names in self.worker_users.items() if other != worker_id
+                                  for name in names]
+                        if online:
+                            writer.write(b"".join(online))
+                        continue
+                    if op == BUS_STATS:
+                        snap = json.loads(data)
+                        self.worker_metrics[worker_id] = snap
+                        self.connections[worker_id] = snap["active_connections"]
+                        continue
+                    if op == BUS_USER_ON:
+                        self.worker_users[worker_id].add(key)
+                    elif op == BUS_USER_OFF:
+                        self.worker_users[worker_id].discard(key)
+                    self.relay(worker_id, encode_bus(op, key, data))
+        except (ConnectionError, OSError, protocol.ProtocolError):
+            pass
+        finally:
+            if worker_id is not None and self.links.get(worker_id) is writer:
+                del self.links[worker_id]
+                self.connections.pop(worker_id, None)
+                self.worker_metrics.pop(worker_id, None)
+                # A dead worker cannot say goodbye for its users; do it for it
+                gone = self.worker_users.pop(worker_id, set())
+                if gone:
+                    self.relay(worker_id, b"".join(encode_bus(BUS_USER_OFF, name) for name in gone))
+            writer.close()
+
+    async def monitor(self):
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for worker_id, proc in list(self.procs.items()):
+                if proc.is_alive() or now - self.started_at[worker_id] < RESTART_BACKOFF:
+                    continue
+                print(f"{RED}[SUPERVISOR]{ENDC} Worker {worker_id} (pid {proc.pid}) exited with code {proc.exitcode}, restarting.")
+                self.restarts += 1
+                self.spawn(worker_id)
+            if now - last_report >= SUPERVISOR_REPORT:
+                last_report = now
+                counts = ", ".join(f"w{wid}={self.connections.get(wid, 0)}" for wid in sorted(self.procs))
+                print(f"{YELLOW}[SUPERVISOR]{ENDC} Connections: {counts} | total={sum(self.connections.values())} | restarts={self.restarts}")
+
+    async def run(self):
+        hub = await asyncio.start_unix_server(self.handle_link, path=self.bus_path)
+        for worker_id in range(self.worker_count):
+            self.spawn(worker_id)
+        async with hub:
+            await self.monitor()
+
+    def render(self, fmt):
+        """Admin endpoint view: every worker's metrics, plus totals."""
+        snaps = dict(self.worker_metrics)
+        if fmt == "json":
+            totals = dict.fromkeys(Metrics.COUNTERS, 0)
+            for snap in snaps.values():
+                for name, value in snap["counters"].items():
+                    totals[name] += value
+            return json.dumps({
+                "active_connections": sum(snap["active_connections"] for snap in snaps.values()),
+                "restarts": self.restarts,
+                "counters": totals,
+                "workers": snaps,
+            }, indent=2)
+        return render_prometheus({f'worker="{wid}"': snap for wid, snap in sorted(snaps.items())})
+
+    def shutdown(self):
+        for proc in self.procs.values():
+            proc.terminate()
+        for proc in self.procs.values():
+            proc.join(timeout=5)
+        shutil.rmtree(self.bus_dir, ignore_errors=True)
+
+def start_sharded_server(worker_count, admin=None):
+    """Main entry point for --workers N."""
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "AF_UNIX"):
+        print(f"{RED}ERROR: --workers needs SO_REUSEPORT and Unix sockets, which this platform lacks.{ENDC}")
+        return
+    config = {
+        "HOST": HOST, "PORT": PORT,
+        "HIGH_WATERMARK": HIGH_WATERMARK, "LOW_WATERMARK": LOW_WATERMARK, "SLOW_POLICY": SLOW_POLICY,
+        "VERBOSE": VERBOSE,
+    }
+    supervisor = Supervisor(worker_count, config)
+    start_admin(admin, supervisor.render)
+    # Treat SIGTERM like Ctrl+C so the workers are stopped along with us
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"\n{GREEN}<< Messenger Server Running ({worker_count} workers) >>{ENDC}")
+    print(f"Listening on {HOST}:{PORT}")
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        print(f"\n{YELLOW}Server shut down by user.{ENDC}")
+    finally:
+        supervisor.shutdown()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cyber_CLI messenger server")
+    parser.add_argument("--host", default=HOST, help=f"interface to bind (default {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port to listen on (default {PORT})")
+    parser.add_argument("--threaded", action="store_true",
+                        help="use the legacy thread-per-client engine instead of asyncio")
+    parser.add_argument("--quiet", action="store_true", help="do not print every chat line to the console")
+    parser.add_argument("--admin-port", type=int, default=None,
+                        help="serve live metrics on 127.0.0.1:PORT (GET /metrics or /metrics.json)")
+    parser.add_argument("--admin-socket", default=None, help="serve live metrics on this Unix socket path instead")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run N asyncio worker processes sharing the port via SO_REUSEPORT (no chat history)")
+    parser.add_argument("--high-watermark", type=int, default=HIGH_WATERMARK,
+                        help=f"queued bytes per client before the slow-consumer policy applies (default {HIGH_WATERMARK})")
+    parser.add_argument("--low-watermark", type=int, default=LOW_WATERMARK,
+                        help=f"queue size drop_oldest trims back to (default {LOW_WATERMARK})")
+    parser.add_argument("--slow-policy", choices=("drop_oldest", "disconnect"), default=SLOW_POLICY,
+                        help=f"what to do with a client whose queue is full (default {SLOW_POLICY})")
+    parser.add_argument("--log-dir", default=str(LOG_DIR), help=f"where chat history is stored (default {LOG_DIR})")
+    parser.add_argument("--no-log", action="store_true", help="keep no chat history")
+    parser.add_argument("--fsync", choices=messenger_log.FSYNC_POLICIES, default="batch",
+                        help="when history is flushed to disk: every message, about once a second, or never (default batch)")
+    parser.add_argument("--segment-mb", type=int, default=messenger_log.SEGMENT_BYTES // (1024 * 1024),
+                        help="history segment size before rotation, in MB")
+    parser.add_argument("--history", type=int, default=HISTORY_ON_JOIN,
+                        help=f"lines replayed to a client entering a room (default {HISTORY_ON_JOIN})")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    HOST, PORT = args.host, args.port
+    HIGH_WATERMARK, LOW_WATERMARK, SLOW_POLICY = args.high_watermark, args.low_watermark, args.slow_policy
+    HISTORY_ON_JOIN = args.history
+    VERBOSE = not args.quiet
+    if args.workers and args.threaded:
+        raise SystemExit("--workers runs the asyncio engine; it cannot be combined with --threaded")
+    if args.workers:
+        if not args.no_log:
+            print(f"{YELLOW}[STATUS]{ENDC} Chat history is not kept in sharded mode.")
+        start_sharded_server(args.workers, admin_address(args))
+        raise SystemExit(0)
+    if not args.no_log:
+        message_log = messenger_log.MessageLog(args.log_dir, segment_bytes=args.segment_mb * 1024 * 1024, fsync=args.fsync)
+        print(f"{YELLOW}[STATUS]{ENDC} Chat history in {args.log_dir} (last seq {message_log.last_seq}, fsync {args.fsync})")
+    metrics.start()
+    start_admin(admin_address(args))
+    try:
+        if args.threaded:
+            start_server()
+        else:
+            start_async_server()
+    finally:
+        if message_log is not None:
+            message_log.close()
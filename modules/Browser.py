@@ -1,92 +1,395 @@
-APP_INFO = {
-    "name": "Cyb_browser",
-    "icon": "🌐",
-    "description": "Browse the internet"
-}
-
-from core import utils
-import requests
-from bs4 import BeautifulSoup
-
-def launch():
-    utils.clear_console()
-    utils.Print_Typing(utils.Colors.col_text("Welcome to Cyber_Browser\n", color_code=utils.Colors.BRIGHT_MAGENTA), fast=False)
-    url = input("\nEnter URL (or 'q' to quit) > ").strip()
-    while True:
-        if url.lower() in ("q", "quit", "exit"):
-            utils.clear_console()
-            break
-        if not url.startswith("http"):
-            url = "https://" + url
-            utils.clear_console()
-            fetch_and_display(url)
-
-def fetch_and_display(url):
-    try:
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/122.0.0.0 Safari/537.36"
-            )
-        }
-
-        utils.Print_Typing(f"Fetching {url} ...\n", fast=False)
-        res = requests.get(url, headers=headers, timeout=10)
-        res.raise_for_status()
-
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(res.text, "html.parser")
-
-        title = soup.title.string if soup.title else "(No title)"
-        utils.Print_Typing(utils.Colors.col_text(f"\n{title}\n", utils.Colors.BRIGHT_GREEN), fast=False)
-
-        for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
-            tag.decompose()
-
-        # Prefer article or main content
-        article = soup.find("article") or soup.find("main")
-
-        if article:
-            paragraphs = [p.get_text(strip=True) for p in article.find_all("p") if p.get_text(strip=True)]
-        else:
-            paragraphs = [p.get_text(strip=True) for p in soup.find_all("p") if p.get_text(strip=True)]
-
-        # Combine and trim long text
-        text = "\n\n".join(paragraphs[:20])  # temporary limit
-        if not text:
-            text = "(No readable content found)"
-
-        utils.Print_Typing(utils.Colors.col_text("\n--- Content ---\n", utils.Colors.BRIGHT_CYAN), fast=False)
-        #print(text)
-
-                # --- Display content with pagination ---
-        utils.Print_Typing(utils.Colors.col_text("\n--- Content ---\n", utils.Colors.BRIGHT_CYAN), fast=False)
-
-        lines = text.splitlines()
-        page_size = 25  # number of lines per "page"
-        total_lines = len(lines)
-
-        current = 0
-        while current < total_lines:
-            end = current + page_size
-            for line in lines[current:end]:
-                print(line)
-            current = end
-
-            if current < total_lines:
-                cmd = input(utils.Colors.col_text("\n[Press Enter to continue, 'q' to quit reading] ", utils.Colors.BRIGHT_MAGENTA)).strip().lower()
-                if cmd in ("q", "quit", "exit"):
-                    break
-            else:
-                print(utils.Colors.col_text("\n[End of Page]", utils.Colors.BRIGHT_MAGENTA))
-
-        # Placeholder for readable text extraction (coming next)
-        #print("\n[Page fetched successfully — content extraction coming soon]")
-
-    except requests.exceptions.HTTPError as e:
-        print(utils.Colors.col_text(f"\nHTTP Error: {e}", utils.Colors.RED))
-    except requests.exceptions.ConnectionError:
-        print(utils.Colors.col_text("\nConnection failed — check your internet.", utils.Colors.RED))
-    except Exception as e:
-        print(utils.Colors.col_text(f"\nError: {e}", utils.Colors.RED))
+APP_INFO = {
+    "name": "Cyb_browser",
+    "icon": "🌐",
+    "description": "Browse the internet"
+}
+
+from core import utils
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from modules import _extract, _html_stream, _http_cache
+
+HELP = ("Commands: <url> | go N (follow link N) | back | forward | links | reload | reader\n"
+        "          tabs | tab new [url] | tab N | tab close [N] | help | q")
+
+def launch():
+    with utils.Screen() as screen:
+        screen.write(utils.Colors.col_text("Welcome to Cyber_Browser\n", color_code=utils.Colors.BRIGHT_MAGENTA))
+        screen.line(HELP)
+    tabs = [Tab()]
+    current = 0
+    prefetcher = Prefetcher()
+    try:
+        while True:
+            tab = tabs[current]
+            where = f"tab {current + 1}/{len(tabs)}" + (f": {tab.title}" if tab.title else "")
+            command = input(f"\n[{where}] Enter URL or command (or 'q' to quit) > ").strip()
+            words = command.split()
+            verb = words[0].lower() if words else ""
+
+            if verb in ("q", "quit", "exit"):
+                utils.clear_console()
+                break
+            elif not verb:
+                continue
+            elif verb == "help":
+                print(HELP)
+            elif verb == "go":
+                number = int(words[1]) if len(words) == 2 and words[1].isdigit() else None
+                if number is None:
+                    print(utils.Colors.col_text("Usage: go N (N is a link number from 'links')", utils.Colors.RED))
+                elif 1 <= number <= len(tab.links):
+                    tab.open(tab.links[number - 1], prefetcher)
+                else:
+                    print(utils.Colors.col_text(f"No link {number} on this page ({len(tab.links)} links).", utils.Colors.RED))
+            elif verb in ("back", "b", "forward", "f"):
+                url = tab.back() if verb in ("back", "b") else tab.forward()
+                if url:
+                    tab.show(url, prefetcher)
+                else:
+                    print(utils.Colors.col_text(f"Nothing to go {'back' if verb in ('back', 'b') else 'forward'} to.", utils.Colors.RED))
+            elif verb in ("reload", "r", "reader") and not tab.url:
+                print(utils.Colors.col_text("No page loaded in this tab.", utils.Colors.RED))
+            elif verb in ("reload", "r"):
+                tab.show(tab.url, prefetcher)
+            elif verb == "links":
+                show_links(tab.links)
+            elif verb == "reader":
+                utils.clear_console()
+                show_reader(tab.url)
+            elif verb == "tabs":
+                with utils.Screen(clear=False) as screen:
+                    for number, each in enumerate(tabs, 1):
+                        marker = "*" if number == current + 1 else " "
+                        screen.line(f"{marker} {number}. {each.title or '(empty)'}  {each.url or ''}")
+            elif verb == "tab":
+                action = words[1].lower() if len(words) > 1 else ""
+                if action == "new":
+                    tabs.append(Tab())
+                    current = len(tabs) - 1
+                    if len(words) > 2:
+                        tabs[current].open(normalize_url(words[2]), prefetcher)
+                elif action == "close":
+                    number = int(words[2]) if len(words) > 2 and words[2].isdigit() else current + 1
+                    if len(tabs) > 1 and 1 <= number <= len(tabs):
+                        tabs.pop(number - 1)
+                        current = min(current if number - 1 > current else max(0, current - 1), len(tabs) - 1)
+                    else:
+                        print(utils.Colors.col_text("Cannot close that tab.", utils.Colors.RED))
+                elif action.isdigit() and 1 <= int(action) <= len(tabs):
+                    current = int(action) - 1
+                    if tabs[current].url:
+                        tabs[current].show(tabs[current].url, prefetcher)
+                else:
+                    print(utils.Colors.col_text("Usage: tab new [url] | tab N | tab close [N]", utils.Colors.RED))
+            else:
+                tab.open(normalize_url(command), prefetcher)
+    finally:
+        prefetcher.close()
+
+def normalize_url(url):
+    return url if url.startswith("http") else "https://" + url
+
+def show_links(links):
+    with utils.Screen(clear=False) as screen:
+        if not links:
+            screen.line("(No links on this page)")
+        for number, url in enumerate(links, 1):
+            screen.line(f"{utils.Colors.col_text(f'[{number}]', utils.Colors.BRIGHT_CYAN)} {url}")
+
+class Tab:
+    """One tab: its history, and the title and links of the page it shows."""
+
+    def __init__(self):
+        self.history = []
+        self.position = -1  # Index of the current page in history
+        self.title = None
+        self.links = []
+
+    @property
+    def url(self):
+        return self.history[self.position] if self.position >= 0 else None
+
+    def open(self, url, prefetcher):
+        """Shows `url` and, if it loads, makes it the newest page in history."""
+        if self.show(url, prefetcher):
+            del self.history[self.position + 1:]  # A new page ends the forward history
+            self.history.append(url)
+            self.position += 1
+
+    def show(self, url, prefetcher):
+        utils.clear_console()
+        shown = fetch_and_display(url, prefetcher)
+        if shown:
+            self.title, self.links = shown
+        return shown is not None
+
+    def back(self):
+        if self.position > 0:
+            self.position -= 1
+            return self.url
+        return None
+
+    def forward(self):
+        if self.position < len(self.history) - 1:
+            self.position += 1
+            return self.url
+        return None
+
+# --- Prefetch ---
+
+PREFETCH_LINKS = 4                   # Links from the top of a page fetched ahead
+PREFETCH_WORKERS = 2                 # Prefetches in flight at once
+PREFETCH_PAGE_LIMIT = 1024 * 1024    # Pages bigger than this are not prefetched
+PREFETCH_BUDGET = 4 * 1024 * 1024    # Bytes of prefetched pages held in memory
+PREFETCH_WAIT = 10                   # Seconds to wait for a prefetch already under way
+
+class Prefetcher:
+    """Fetches the first few links of the page being read on a small thread
+    pool and keeps the bodies in memory, so following one renders at once."""
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        self.pending = {}          # url -> Future
+        self.pages = OrderedDict()  # url -> (Stream, body), oldest first
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def start(self, links):
+        """Queues the top links of a new page; drops queued ones it no longer has."""
+        wanted = links[:PREFETCH_LINKS]
+        with self.lock:
+            for url, future in list(self.pending.items()):
+                if url not in wanted and future.cancel():
+                    del self.pending[url]
+            for url in wanted:
+                if url not in self.pages and url not in self.pending:
+                    self.pending[url] = self.pool.submit(self._fetch, url)
+
+    def _fetch(self, url):
+        page = None
+        try:
+            stream = _http_cache.open_stream(url, limit=PREFETCH_PAGE_LIMIT)
+            if stream.cache == _http_cache.HIT or "html" not in stream.headers.get("content-type", "html"):
+                stream.close()  # Already instant from disk, or not a page we render
+            else:
+                body = b"".join(stream)
+                if not stream.truncated:
+                    page = (stream, body)
+        except Exception:
+            # Network, decode or cache-write errors alike: following the link
+            # fetches it again and shows the error properly
+            pass
+        finally:
+            # Stored before leaving pending, so take() never finds neither
+            with self.lock:
+                if page:
+                    self.pages[url] = page
+                    self.size += len(page[1])
+                    while self.size > PREFETCH_BUDGET:
+                        _, (_, dropped) = self.pages.popitem(last=False)
+                        self.size -= len(dropped)
+                self.pending.pop(url, None)
+
+    def take(self, url):
+        """A Stream over the prefetched `url`, waiting for it if it is still
+        being fetched, or None if it was not prefetched."""
+        with self.lock:
+            future = self.pending.get(url)
+            if future is not None and future.cancel():
+                del self.pending[url]  # Not started yet; a plain fetch is just as quick
+                future = None
+        if future is not None:
+            try:
+                future.result(timeout=PREFETCH_WAIT)
+            except Exception:
+                return None
+        with self.lock:
+            if url not in self.pages:
+                return None
+            stream, body = self.pages.pop(url)
+            self.size -= len(body)
+        return _http_cache.Stream(stream.url, stream.status, stream.headers, stream.encoding,
+                                  _http_cache.PREFETCHED, time.monotonic(), body=body)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+PAGE_SIZE = 25  # Lines per screen
+
+def describe_fetch(page):
+    """One line saying where the page came from and how long it took."""
+    status = {
+        _http_cache.HIT: ("cache hit", utils.Colors.BRIGHT_GREEN),
+        _http_cache.REVALIDATED: ("cache hit, revalidated", utils.Colors.BRIGHT_GREEN),
+        _http_cache.MISS: ("cache miss", utils.Colors.BRIGHT_YELLOW),
+        _http_cache.UNCACHED: ("not cacheable", utils.Colors.BRIGHT_YELLOW),
+        _http_cache.PREFETCHED: ("prefetched", utils.Colors.BRIGHT_GREEN),
+    }[page.cache]
+    return utils.Colors.col_text(f"[{status[0]}, {page.elapsed * 1000:.0f} ms]", status[1])
+
+class PageLoader(threading.Thread):
+    """Reads a Stream and parses it on a background thread, so the pager can
+    show the first screen while the rest of the page is still downloading."""
+
+    def __init__(self, stream):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.parser = _html_stream.TextStream(self.add_paragraph, stream.encoding, base_url=stream.url)
+        self.lines = []
+        self.title_seen = False  # The title is known, or is not coming
+        self.done = False
+        self.error = None
+        self.stopped = False     # Set when the reader leaves the page early
+        self.changed = threading.Condition()
+
+    def run(self):
+        try:
+            for chunk in self.stream:
+                self.parser.feed_bytes(chunk)
+                if self.parser.title is not None and not self.title_seen:
+                    self.notify(title_seen=True)
+                if self.stopped:
+                    break
+            else:
+                self.parser.close()
+        except Exception as e:
+            if not self.stopped:
+                self.error = e  # After stop() the closed connection is expected to fail
+        finally:
+            self.notify(title_seen=True, done=True)
+
+    def notify(self, **changes):
+        with self.changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.changed.notify_all()
+
+    def add_paragraph(self, text):
+        with self.changed:
+            if self.lines:
+                self.lines.append("")
+            self.lines.extend(text.splitlines())
+            # Anything in the body means the <head> and its title are behind us
+            self.title_seen = True
+            self.changed.notify_all()
+
+    def wait_for_title(self):
+        with self.changed:
+            self.changed.wait_for(lambda: self.title_seen)
+        return self.parser.title
+
+    def wait_for_lines(self, count):
+        """Blocks until `count` lines exist or the page is done; returns the lines so far."""
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.lines) >= count or self.done)
+            return self.lines[:count]
+
+    def stop(self):
+        """Leaves the page: the download stops and its connection is closed."""
+        self.stopped = True
+        self.stream.close()
+
+def fetch_and_display(url, prefetcher=None):
+    """Shows a page a screen at a time. Returns (title, links), or None if
+    it could not be loaded. The page's top links are then prefetched."""
+    try:
+        utils.Print_Typing(f"Fetching {url} ...\n", fast=False)
+        stream = prefetcher.take(url) if prefetcher else None
+        if stream is None:
+            # Pooled keep-alive session and on-disk cache; raises HTTPError on 4xx/5xx.
+            # Returns once the headers are in; the body is read as it is displayed.
+            stream = _http_cache.open_stream(url)
+        print(describe_fetch(stream))
+
+        loader = PageLoader(stream)
+        loader.start()
+        title = loader.wait_for_title() or "(No title)"
+        utils.Print_Typing(utils.Colors.col_text(f"\n{title}\n", utils.Colors.BRIGHT_GREEN), fast=False)
+
+        # --- Display content with pagination, as it arrives ---
+        utils.Print_Typing(utils.Colors.col_text("\n--- Content ---\n", utils.Colors.BRIGHT_CYAN), fast=False)
+
+        current = 0
+        while True:
+            lines = loader.wait_for_lines(current + PAGE_SIZE)
+            with utils.Screen(clear=False) as screen:
+                for line in lines[current:]:
+                    screen.line(line)
+            current = len(lines)
+
+            if loader.done and current >= len(loader.lines):
+                break
+            cmd = input(utils.Colors.col_text("\n[Press Enter to continue, 'q' to quit reading] ", utils.Colors.BRIGHT_MAGENTA)).strip().lower()
+            if cmd in ("q", "quit", "exit"):
+                loader.stop()
+                break
+
+        if loader.error:
+            raise loader.error
+        if loader.done and not loader.lines:
+            print("(No readable content found)")
+        if loader.done:
+            notes = []
+            if stream.truncated:
+                notes.append(f"cut off at {stream.received / 1024 / 1024:.0f} MB")
+            if loader.parser.capped:
+                notes.append("text limit reached")
+            size = f"{stream.received / 1024:.1f} KB"
+            print(utils.Colors.col_text(f"\n[End of Page, {size}{''.join(', ' + note for note in notes)}]", utils.Colors.BRIGHT_MAGENTA))
+
+        links = list(loader.parser.links)
+        if links:
+            print(utils.Colors.col_text(f"{len(links)} links: 'links' lists them, 'go N' follows one.", utils.Colors.BRIGHT_CYAN))
+        if prefetcher:
+            prefetcher.start(links)
+        return title, links
+
+    except requests.exceptions.HTTPError as e:
+        print(utils.Colors.col_text(f"\nHTTP Error: {e}", utils.Colors.RED))
+    except requests.exceptions.ConnectionError:
+        print(utils.Colors.col_text("\nConnection failed — check your internet.", utils.Colors.RED))
+    except Exception as e:
+        print(utils.Colors.col_text(f"\nError: {e}", utils.Colors.RED))
+    return None
+
+def show_reader(url):
+    """Reader view: only the page's main content, as picked by _extract."""
+    try:
+        # Usually a cache hit, since the page was just shown
+        stream = _http_cache.open_stream(url)
+        body = b"".join(stream)
+        started = time.perf_counter()
+        found = _extract.extract(body, encoding=stream.encoding or "utf-8")
+        took = (time.perf_counter() - started) * 1000
+    except requests.exceptions.RequestException as e:
+        print(utils.Colors.col_text(f"\nCould not load the page: {e}", utils.Colors.RED))
+        return
+    except Exception as e:
+        print(utils.Colors.col_text(f"\nError: {e}", utils.Colors.RED))
+        return
+
+    utils.Print_Typing(utils.Colors.col_text(f"\n{found.title or '(No title)'}\n", utils.Colors.BRIGHT_GREEN), fast=False)
+    print(utils.Colors.col_text(f"[reader view: {found.where or 'nothing found'}, {found.backend}, {took:.0f} ms]",
+                                utils.Colors.BRIGHT_CYAN))
+    if not found.blocks:
+        print("(No main content found; 'reload' shows the whole page)")
+        return
+
+    lines = []
+    for block in found.blocks:
+        if lines:
+            lines.append("")
+        lines.extend(block.splitlines())
+    for start in range(0, len(lines), PAGE_SIZE):
+        with utils.Screen(clear=False) as screen:
+            for line in lines[start:start + PAGE_SIZE]:
+                screen.line(line)
+        if start + PAGE_SIZE < len(lines):
+            cmd = input(utils.Colors.col_text("\n[Press Enter to continue, 'q' to quit reading] ", utils.Colors.BRIGHT_MAGENTA)).strip().lower()
+            if cmd in ("q", "quit", "exit"):
+                return
+    print(utils.Colors.col_text("\n[End of Article]", utils.Colors.BRIGHT_MAGENTA))
@@ -0,0 +1,290 @@
+# _extract.py
+# Main-content extraction for Cyb_browser's reader view.
+#
+# A readability-style scorer that makes one pass over the document and never
+# builds a tree. Parser events (start tag, text, end tag) drive a stack of
+# open elements:
+#
+#   text blocks   text goes to the innermost open element. When a p, pre,
+#                 blockquote, li, dd or h1-h6 closes, or any other element
+#                 with 25+ characters of its own text, that text becomes a
+#                 block. The block is credited to every open ancestor, so
+#                 each ancestor knows the content beneath it
+#   scoring       a closing block of 25+ characters (other than li, dd and
+#                 headings) scores 1 + commas + 1 per 100 characters (at
+#                 most 3) for its parent, and half that for its grandparent
+#   candidates    when a container closes, its score is cut by its share of
+#                 link text and nudged by its class/id ("article", "content"
+#                 up; "comment", "sidebar" down). Only the best so far is
+#                 kept, so memory stays at the open stack plus one winner
+#   siblings      content split over several similar containers (posts in a
+#                 thread, sections of a long article) is taken together: a
+#                 container whose children score within SIBLING_SHARE of its
+#                 best child scores their sum
+#   skipped       script, style, nav, aside, footer, form... and anything
+#                 whose class/id looks like boilerplate
+#
+# With lxml installed its HTML parser drives the same handler through the
+# parser-target interface (start/end/data/close). It is faster and fixes
+# broken markup the way browsers do. Otherwise html.parser from the standard
+# library is used, and end tags that were left out are implied here.
+import re
+from html.parser import HTMLParser
+
+from modules._html_stream import CLOSES_PARAGRAPH
+
+try:
+    from lxml import etree  # Optional, faster and more forgiving
+except ImportError:
+    etree = None
+
+MIN_PARAGRAPH = 25     # Characters a block needs before it counts towards a score
+CLASS_WEIGHT = 25      # Bonus or penalty from a container's class/id
+SIBLING_SHARE = 0.5    # Share of the best child's score a sibling needs to be taken with it
+
+TEXT_BLOCKS = {"p", "pre", "blockquote", "li", "dd", "h1", "h2", "h3", "h4", "h5", "h6"}
+UNSCORED_BLOCKS = {"li", "dd", "h1", "h2", "h3", "h4", "h5", "h6"}
+SKIPPED = {"script", "style", "noscript", "template", "svg", "math", "iframe", "object",
+           "nav", "aside", "footer", "header", "form", "button", "select", "textarea"}
+VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+        "source", "track", "wbr"}
+INLINE = {"a", "abbr", "b", "bdi", "bdo", "cite", "code", "data", "dfn", "em", "font", "i", "kbd",
+          "label", "mark", "q", "s", "samp", "small", "span", "strong", "sub", "sup", "time", "u", "var"}
+
+# Start tags that end an open element without its end tag, which html.parser
+# leaves to us: <li> ends the previous <li>, <td> the previous cell...
+IMPLIED_END = {"li": {"li"}, "dt": {"dd", "dt"}, "dd": {"dd", "dt"}, "tr": {"tr"}, "td": {"td", "th"},
+               "th": {"td", "th"}, "option": {"option"}}
+SCOPE = {"ul", "ol", "dl", "table", "tbody", "thead", "tfoot", "select", "body", "html"}
+
+POSITIVE = re.compile(r"article|body|content|entry|hentry|main|page|post|text|blog|story", re.I)
+NEGATIVE = re.compile(r"combx|comment|com-|contact|foot|footer|footnote|masthead|media|meta|outbrain|"
+                      r"promo|related|scroll|shoutbox|sidebar|sponsor|shopping|tags|tool|widget|share|"
+                      r"social|advert|banner|menu|nav|cookie|newsletter", re.I)
+UNLIKELY = re.compile(r"banner|breadcrumbs|combx|comment|community|cover-wrap|disqus|extra|gdpr|legends|"
+                      r"menu|related|remark|replies|rss|shoutbox|sidebar|skyscraper|social|sponsor|"
+                      r"supplemental|ad-break|agegate|pagination|pager|popup|yom-remote|cookie|newsletter", re.I)
+MAYBE = re.compile(r"and|article|body|column|content|main|shadow", re.I)
+
+class Extract:
+    """What extract() found: the page title and the main content's blocks."""
+
+    def __init__(self, title, blocks, score, where, backend):
+        self.title = title
+        self.blocks = blocks    # Text of each block in the winning container, in order
+        self.score = score
+        self.where = where      # e.g. 'article#main.post', for tuning
+        self.backend = backend  # 'lxml' or 'html.parser'
+
+    @property
+    def text(self):
+        return "\n\n".join(self.blocks)
+
+class _Node:
+    __slots__ = ("tag", "ident", "skip", "score", "scored", "blocks", "chars", "link_chars", "text", "children")
+
+    def __init__(self, tag, ident, skip):
+        self.tag = tag
+        self.ident = ident      # "tag#id.class" for reports
+        self.skip = skip
+        self.score = 0.0
+        self.scored = False     # Some block credited it with a score
+        self.blocks = []        # Text of the blocks beneath it, in order
+        self.chars = 0          # Characters of text beneath it...
+        self.link_chars = 0     # ...and how many of them are link text
+        self.text = None if skip else []  # Pieces of its own text, while open
+        self.children = []      # Best candidate score within each child that had one
+
+class Scorer:
+    """Parser target: feed it start/data/end events, then close() for an Extract."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stack = []
+        self.skipping = 0       # Open elements that are skipped, including the ones inside them
+        self.in_link = 0
+        self.in_title = False
+        self.title = []
+        self.best = None
+        self.best_score = 0.0
+
+    # --- parser target interface ---
+
+    def start(self, tag, attrib):
+        tag = tag.lower()
+        if tag == "title":
+            self.in_title = True
+        if tag == "a":
+            self.in_link += 1
+        if tag in VOID or tag in INLINE:
+            return
+        self._imply_end(tag)
+        if self.skipping or tag in SKIPPED:
+            self.skipping += 1
+            self.stack.append(_Node(tag, tag, True))
+            return
+        ident = " ".join(filter(None, (attrib.get("id"), attrib.get("class"))))
+        skip = bool(ident) and UNLIKELY.search(ident) is not None and not MAYBE.search(ident) \
+            and tag not in ("body", "html", "article", "main")
+        node = _Node(tag, self._describe(tag, attrib), skip)
+        if skip:
+            self.skipping += 1
+        else:
+            node.score = self._class_weight(ident)
+        self.stack.append(node)
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag == "title":
+            self.in_title = False
+        if tag == "a":
+            self.in_link = max(0, self.in_link - 1)
+        if tag in VOID or tag in INLINE:
+            return
+        # html.parser does not imply missing end tags: close whatever was left open
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth].tag == tag:
+                break
+        else:
+            return  # A stray end tag
+        while len(self.stack) > depth:
+            self._close(self.stack.pop())
+
+    def data(self, text):
+        if self.in_title:
+            self.title.append(text)
+            return
+        if self.skipping or not self.stack:
+            return
+        for node in reversed(self.stack):
+            if node.text is not None:
+                node.text.append(text)
+                break
+        length = len(text.strip())
+        if length:
+            for node in self.stack:
+                node.chars += length
+                if self.in_link:
+                    node.link_chars += length
+
+    def close(self):
+        while self.stack:
+            self._close(self.stack.pop())
+        title = " ".join("".join(self.title).split()) or None
+        if self.best is None:
+            return Extract(title, [], 0.0, None, self.backend)
+        return Extract(title, self.best.blocks, round(self.best_score, 2), self.best.ident, self.backend)
+
+    def _imply_end(self, tag):
+        if self.stack and self.stack[-1].tag == "p" and (tag in CLOSES_PARAGRAPH or tag in IMPLIED_END):
+            self._close(self.stack.pop())
+        targets = IMPLIED_END.get(tag)
+        if not targets:
+            return
+        for depth in range(len(self.stack) - 1, -1, -1):
+            open_tag = self.stack[depth].tag
+            if open_tag in targets:
+                while len(self.stack) > depth:
+                    self._close(self.stack.pop())
+                return
+            if open_tag in SCOPE:
+                return
+
+    # --- scoring ---
+
+    def _close(self, node):
+        if node.skip:
+            self.skipping -= 1
+            return
+        text = " ".join("".join(node.text).split())
+        node.text = None
+        if text and (node.tag in TEXT_BLOCKS or len(text) >= MIN_PARAGRAPH):
+            if node.tag not in TEXT_BLOCKS:
+                node.blocks.append(text)  # A container's own text is part of it
+            for ancestor in self.stack:
+                ancestor.blocks.append(text)
+            if node.tag not in UNSCORED_BLOCKS and len(text) >= MIN_PARAGRAPH:
+                points = 1 + text.count(",") + min(len(text) // 100, 3)
+                if self.stack:
+                    self.stack[-1].score += points
+                    self.stack[-1].scored = True
+                if len(self.stack) > 1:
+                    self.stack[-2].score += points / 2
+                    self.stack[-2].scored = True
+        if node.tag in TEXT_BLOCKS:
+            return
+        score = 0.0
+        if node.scored:
+            link_density = node.link_chars / node.chars if node.chars else 0
+            score = node.score * (1 - link_density)
+        best_child = max(node.children, default=0.0)
+        similar = [value for value in node.children if value >= best_child * SIBLING_SHARE]
+        if len(similar) > 1:
+            score = max(score, sum(similar))
+        if score > self.best_score:
+            self.best, self.best_score = node, score
+        if self.stack and max(score, best_child) > 0:
+            self.stack[-1].children.append(max(score, best_child))
+
+    @staticmethod
+    def _class_weight(ident):
+        weight = 0
+        if ident:
+            if POSITIVE.search(ident):
+                weight += CLASS_WEIGHT
+            if NEGATIVE.search(ident):
+                weight -= CLASS_WEIGHT
+        return weight
+
+    @staticmethod
+    def _describe(tag, attrib):
+        ident = tag
+        if attrib.get("id"):
+            ident += "#" + attrib["id"]
+        if attrib.get("class"):
+            ident += "." + ".".join(attrib["class"].split())
+        return ident
+
+class _StdlibFeeder(HTMLParser):
+    """Drives a Scorer from the standard library's HTMLParser."""
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+        if tag not in VOID:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+def backends():
+    return ("lxml", "html.parser") if etree is not None else ("html.parser",)
+
+def extract(html, backend=None, encoding="utf-8"):
+    """Finds the main content of `html` (str or bytes) and returns an Extract.
+    `backend` is 'lxml' or 'html.parser'; by default lxml when installed."""
+    backend = backend or backends()[0]
+    if backend == "lxml":
+        if etree is None:
+            raise ValueError("lxml is not installed")
+        if isinstance(html, str):
+            html, encoding = html.encode("utf-8"), "utf-8"
+        parser = etree.HTMLParser(target=Scorer("lxml"), encoding=encoding)
+        parser.feed(html)
+        return parser.close()
+    if isinstance(html, bytes):
+        html = html.decode(encoding, "replace")
+    scorer = Scorer("html.parser")
+    feeder = _StdlibFeeder(scorer)
+    feeder.feed(html)
+    feeder.close()
+    return scorer.close()
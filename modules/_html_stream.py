@@ -0,0 +1,139 @@
+# _html_stream.py
+# Incremental HTML-to-text for Cyb_browser.
+#
+# The browser feeds the response in as it downloads, and each paragraph is
+# handed over as soon as it closes. So the first screen of text can be shown
+# while the rest of the page is still arriving. This is one pass with no tree:
+# html.parser tokenises each chunk, and only the text of the paragraph being
+# read is held.
+#
+#   skipped     script, style, nav, footer, header, aside (and what is in them)
+#   paragraphs  <p>, closed by </p> or by any block that cannot sit inside one
+#   links       every http(s) <a href> outside script/style, numbered in the
+#               order first seen; a link inside a paragraph is marked [N]
+#
+# Text kept in memory is capped at `max_chars`; past that the parser keeps
+# reading but drops the text.
+import codecs
+from html.parser import HTMLParser
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+MAX_TEXT_CHARS = 2 * 1024 * 1024  # Characters of page text kept at most
+MAX_LINKS = 2000                  # Links numbered at most
+
+SKIPPED = {"script", "style", "nav", "footer", "header", "aside", "noscript", "template"}
+HIDDEN = {"script", "style", "noscript", "template"}  # Not even their links count
+
+# Start tags that end an open <p>, as in the HTML parsing rules
+CLOSES_PARAGRAPH = {
+    "p", "div", "address", "article", "aside", "blockquote", "details", "dialog", "dl", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr",
+    "main", "menu", "nav", "ol", "pre", "section", "table", "ul",
+}
+
+class TextStream(HTMLParser):
+    """Feed it bytes with feed_bytes(); `on_paragraph(text)` is called for
+    every non-empty paragraph, in document order."""
+
+    def __init__(self, on_paragraph, encoding="utf-8", max_chars=MAX_TEXT_CHARS, base_url=""):
+        super().__init__(convert_charrefs=True)
+        self.on_paragraph = on_paragraph
+        self.max_chars = max_chars
+        self.base_url = base_url  # Relative links resolve against this (or <base href>)
+        self.kept = 0          # Characters handed to on_paragraph so far
+        self.capped = False    # True once max_chars was reached
+        self.title = None
+        self.links = []        # Absolute URLs; link N is links[N - 1]
+        self._numbers = {}     # URL -> its number
+        self._hidden = 0       # Depth inside HIDDEN elements
+        self._link = None      # Number of the <a> being read inside a paragraph
+        try:
+            codec = codecs.lookup(encoding or "utf-8").name
+        except LookupError:
+            codec = "utf-8"  # A charset Python does not know; as good a guess as any
+        self._decoder = codecs.getincrementaldecoder(codec)(errors="replace")
+        self._skip = 0         # Depth inside SKIPPED elements
+        self._in_title = False
+        self._title = []
+        self._paragraph = None  # Text pieces of the open <p>, or None
+
+    def feed_bytes(self, chunk):
+        self.feed(self._decoder.decode(chunk))
+
+    def close(self):
+        self.feed(self._decoder.decode(b"", final=True))
+        super().close()
+        self._end_paragraph()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED:
+            self._skip += 1
+        if tag in HIDDEN:
+            self._hidden += 1
+        elif tag == "a" and not self._hidden:
+            self._link = self._add_link(dict(attrs).get("href"))
+        elif tag == "base":
+            href = dict(attrs).get("href")
+            if href:
+                self.base_url = urljoin(self.base_url, href)
+        elif tag == "title" and self.title is None:
+            self._in_title = True
+        if tag in CLOSES_PARAGRAPH:
+            self._end_paragraph()
+        if tag == "p" and not self._skip:
+            self._paragraph = []
+        elif tag == "br" and self._paragraph is not None:
+            self._paragraph.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/>, <img/>...: never opens anything
+        if tag == "br" and self._paragraph is not None:
+            self._paragraph.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED:
+            self._skip = max(0, self._skip - 1)
+        if tag in HIDDEN:
+            self._hidden = max(0, self._hidden - 1)
+        elif tag == "a":
+            if self._link and self._paragraph is not None and not self._skip:
+                self._paragraph.append(f" [{self._link}]")
+            self._link = None
+        elif tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = " ".join("".join(self._title).split()) or None
+        elif tag in ("p", "body", "html") or tag in CLOSES_PARAGRAPH:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title.append(data)
+        elif self._paragraph is not None and not self._skip:
+            self._paragraph.append(data)
+
+    def _add_link(self, href):
+        """Numbers `href` (resolved, without #fragment) and returns its number,
+        or None for links that go nowhere we can show."""
+        if not href or href.strip().startswith("#"):
+            return None
+        url = urldefrag(urljoin(self.base_url, href.strip())).url
+        if urlsplit(url).scheme not in ("http", "https"):
+            return None  # mailto:, javascript:, in-page anchors...
+        number = self._numbers.get(url)
+        if number is None and len(self.links) < MAX_LINKS:
+            self.links.append(url)
+            number = self._numbers[url] = len(self.links)
+        return number
+
+    def _end_paragraph(self):
+        if self._paragraph is None:
+            return
+        text = " ".join("".join(self._paragraph).split())
+        self._paragraph = None
+        if not text or self.capped:
+            return
+        if self.kept + len(text) > self.max_chars:
+            text = text[:self.max_chars - self.kept]
+            self.capped = True
+        self.kept += len(text)
+        self.on_paragraph(text)
@@ -0,0 +1,415 @@
+# _http_cache.py
+# Pooled HTTP session and on-disk response cache for Cyb_browser.
+#
+# Every request goes through one requests.Session, so connections (and their
+# TLS handshakes) stay alive and are reused from page to page.
+#
+# Responses are cached in settings/http_cache/, two files per URL:
+#
+#   <key>.body   the response body, as received
+#   <key>.json   final url, status, the headers that matter, encoding, expiry
+#
+# Freshness follows the HTTP caching rules (RFC 9111) for a private cache:
+#
+#   no-store, Vary: *    never written to disk
+#   max-age, Expires     served from disk until they run out
+#   no-cache             stored, but revalidated on every visit
+#   Last-Modified only   fresh for 10% of the document's age, at most a day
+#
+# A stale entry with an ETag or Last-Modified is revalidated with
+# If-None-Match / If-Modified-Since, and a 304 refreshes it with no download.
+# The cache has a byte budget. When it is over budget, the least recently
+# used entries are evicted first; a hit touches the .json file, so its mtime
+# is the LRU clock.
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core import utils
+
+CACHE_DIR = utils.SETTINGS_FILE.parent / 'http_cache'
+CACHE_BUDGET = 50 * 1024 * 1024  # Bytes of bodies and metadata kept on disk
+MAX_ENTRY_SHARE = 4              # One response may use at most 1/4 of the budget
+HEURISTIC_SHARE = 0.1            # Share of a document's age it may be reused for
+HEURISTIC_CAP = 24 * 3600        # ...but never longer than this
+POOL_SIZE = 10                   # Keep-alive connections per host
+TIMEOUT = 10
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/122.0.0.0 Safari/537.36"
+)
+
+# Response headers worth keeping with a cached body
+KEPT_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "expires", "date", "age", "vary")
+
+# How a page was served, shown by the browser
+HIT = "hit"                  # From disk, no network at all
+REVALIDATED = "revalidated"  # From disk after the server answered 304
+MISS = "miss"                # Downloaded and stored
+UNCACHED = "uncached"        # Downloaded; the server asked us not to store it
+PREFETCHED = "prefetched"    # Fetched ahead of time and handed over from memory
+
+# --- SESSION ---
+
+_session = None
+_lock = threading.Lock()
+
+def get_session():
+    """The shared keep-alive session, created on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+    return _session
+
+# --- FRESHNESS ---
+
+def parse_cache_control(value):
+    """{'max-age': '60', 'no-cache': None, ...} from a Cache-Control header."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+def parse_date(value):
+    """An HTTP date as a timestamp, or None if missing or malformed."""
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def lifetime(headers):
+    """Seconds a response with `headers` may be reused without asking the
+    server: 0 means always revalidate, None means do not store it at all."""
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-store" in directives or headers.get("vary", "").strip() == "*":
+        return None
+    if "no-cache" in directives:
+        return 0
+    try:
+        age = max(0, int(headers.get("age") or 0))
+    except ValueError:
+        age = 0
+    if "max-age" in directives:
+        try:
+            return max(0, int(directives["max-age"]) - age)
+        except (TypeError, ValueError):
+            return 0  # A max-age we cannot read makes the response stale
+    date = parse_date(headers.get("date")) or time.time()
+    if "expires" in headers:
+        expires = parse_date(headers["expires"])
+        return max(0, expires - date) if expires else 0
+    last_modified = parse_date(headers.get("last-modified"))
+    if last_modified:
+        return min(HEURISTIC_CAP, max(0, (date - last_modified) * HEURISTIC_SHARE))
+    return 0
+
+def storable_lifetime(headers):
+    """lifetime(), or None for a response not worth storing either: one that
+    is stale at once and has no ETag or Last-Modified to revalidate it by
+    could never be reused, only take room from entries that can."""
+    seconds = lifetime(headers)
+    if seconds == 0 and "etag" not in headers and "last-modified" not in headers:
+        return None
+    return seconds
+
+# --- PAGES ---
+
+class Page:
+    """A fetched response, wherever it came from."""
+
+    def __init__(self, url, status, headers, content, encoding, cache, elapsed):
+        self.url = url            # Final URL, after redirects
+        self.status = status
+        self.headers = headers    # Lower-cased names
+        self.content = content    # Body bytes
+        self.encoding = encoding
+        self.cache = cache        # HIT, REVALIDATED, MISS or UNCACHED
+        self.elapsed = elapsed    # Seconds, including any network round trip
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", "replace")
+
+# --- CACHE ---
+
+class HttpCache:
+    """Response bodies on disk, keyed by requested URL, within a byte budget."""
+
+    def __init__(self, directory=CACHE_DIR, budget=CACHE_BUDGET):
+        self.directory = directory
+        self.budget = budget
+        self.lock = threading.Lock()  # Prefetch threads store alongside the browser
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def load(self, url):
+        """(metadata, body) for `url`, or None if it is not cached."""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url or len(body) != meta.get("size"):
+            return None  # Half-written or a hash collision; treat as a miss
+        return meta, body
+
+    def touch(self, url):
+        """Marks `url` as just used, for LRU eviction."""
+        try:
+            os.utime(self._paths(url)[0])
+        except OSError:
+            pass
+
+    def store(self, url, final_url, status, headers, body, encoding):
+        """Writes a response to disk. Returns its metadata, or None if it may
+        not or cannot be cached."""
+        seconds = storable_lifetime(headers)
+        if seconds is None or len(body) > self.budget // MAX_ENTRY_SHARE:
+            return None
+        meta = {
+            "url": url,
+            "final_url": final_url,
+            "status": status,
+            "headers": {name: headers[name] for name in KEPT_HEADERS if name in headers},
+            "encoding": encoding,
+            "size": len(body),
+            "stored": time.time(),
+            "expires": time.time() + seconds,
+        }
+        meta_path, body_path = self._paths(url)
+        with self.lock:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                # Each file is replaced atomically; a reader that lands between
+                # the two sees a size mismatch and takes it as a miss
+                self._write(body_path, body)
+                self._write(meta_path, json.dumps(meta).encode("utf-8"))
+            except OSError:
+                return None
+            self._evict()
+        return meta
+
+    def refresh(self, url, meta, headers):
+        """Updates a cached entry after a 304: new validators and expiry."""
+        headers = {**meta["headers"], **{name: headers[name] for name in KEPT_HEADERS if name in headers}}
+        seconds = lifetime(headers)
+        meta = dict(meta, headers=headers, expires=time.time() + (seconds or 0))
+        with self.lock:
+            try:
+                self._write(self._paths(url)[0], json.dumps(meta).encode("utf-8"))
+            except OSError:
+                pass
+        return meta
+
+    @staticmethod
+    def _write(path, data):
+        temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def entries(self):
+        """[(last used, bytes, meta path, body path)] for every cached URL."""
+        found = []
+        for meta_path in self.directory.glob("*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                used = meta_path.stat().st_mtime
+                size = meta_path.stat().st_size + (body_path.stat().st_size if body_path.exists() else 0)
+            except OSError:
+                continue
+            found.append((used, size, meta_path, body_path))
+        return found
+
+    def _evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, meta_path, body_path in entries:
+            if total <= self.budget:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
+
+    def clear(self):
+        with self.lock:
+            for _, _, meta_path, body_path in self.entries():
+                for path in (meta_path, body_path):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+
+_cache = None
+
+def get_cache():
+    """The browser's shared cache, created on first use."""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = HttpCache()
+    return _cache
+
+# --- FETCHING ---
+
+def lookup(cache, url):
+    """(meta, body, conditional headers) for a cached `url`, or (None, None,
+    {}). The headers are None while the entry is still fresh."""
+    entry = cache.load(url)
+    if not entry:
+        return None, None, {}
+    meta, body = entry
+    if meta["expires"] > time.time():
+        return meta, body, None
+    conditional = {}
+    if "etag" in meta["headers"]:
+        conditional["If-None-Match"] = meta["headers"]["etag"]
+    if "last-modified" in meta["headers"]:
+        conditional["If-Modified-Since"] = meta["headers"]["last-modified"]
+    return meta, body, conditional
+
+def lower_headers(response):
+    return {name.lower(): value for name, value in response.headers.items()}
+
+def fetch(url, cache=None, session=None, timeout=TIMEOUT):
+    """GETs `url`, from the cache when it may be. Returns a Page. Raises the
+    usual requests exceptions, including HTTPError for 4xx/5xx."""
+    cache = cache or get_cache()
+    session = session or get_session()
+    started = time.monotonic()
+    meta, body, conditional = lookup(cache, url)
+    if meta and conditional is None:
+        cache.touch(url)
+        return Page(meta["final_url"], meta["status"], meta["headers"], body, meta["encoding"], HIT,
+                    time.monotonic() - started)
+
+    response = session.get(url, headers=conditional, timeout=timeout)
+    if meta and conditional and response.status_code == 304:
+        meta = cache.refresh(url, meta, lower_headers(response))
+        return Page(meta["final_url"], meta["status"], meta["headers"], body, meta["encoding"], REVALIDATED,
+                    time.monotonic() - started)
+    response.raise_for_status()
+
+    headers = lower_headers(response)
+    encoding = response.encoding or response.apparent_encoding
+    stored = cache.store(url, response.url, response.status_code, headers, response.content, encoding)
+    return Page(response.url, response.status_code, headers, response.content, encoding,
+                MISS if stored else UNCACHED, time.monotonic() - started)
+
+# --- STREAMING ---
+
+STREAM_CHUNK = 16 * 1024          # Bytes read from the socket at a time
+STREAM_LIMIT = 8 * 1024 * 1024    # Bytes of one page read at most; the rest is cut off
+
+class Stream:
+    """A response read chunk by chunk: iterate over it for the body. Cache
+    hits iterate over the stored body. A download stops at `limit` bytes
+    (setting `truncated`) and is stored in the cache once read to the end."""
+
+    def __init__(self, url, status, headers, encoding, cache, started, body=None, response=None,
+                 store=None, requested=None, limit=STREAM_LIMIT):
+        self.url = url          # Final URL, after redirects
+        self.status = status
+        self.headers = headers
+        self.encoding = encoding
+        self.cache = cache      # HIT, REVALIDATED, MISS, UNCACHED or PREFETCHED
+        self.elapsed = time.monotonic() - started  # Until the headers arrived
+        self.received = 0
+        self.truncated = False
+        self._body = body
+        self._response = response
+        self._store = store     # HttpCache to keep a completed download in...
+        self._requested = requested  # ...under the URL that was asked for
+        self._limit = limit
+
+    def __iter__(self):
+        if self._body is not None:
+            for start in range(0, len(self._body), STREAM_CHUNK):
+                chunk = self._body[start:start + STREAM_CHUNK]
+                self.received += len(chunk)
+                yield chunk
+            return
+        yield from self._download()
+
+    def close(self):
+        """Drops the connection of a stream that will not be read."""
+        if self._response is not None:
+            self._response.close()
+
+    def _download(self):
+        # Keep a copy for the cache only while it could still fit there
+        kept = [] if self._store else None
+        keep_limit = self._store.budget // MAX_ENTRY_SHARE if self._store else 0
+        try:
+            for chunk in self._response.iter_content(STREAM_CHUNK):
+                if self.received + len(chunk) > self._limit:
+                    chunk = chunk[:self._limit - self.received]
+                    self.truncated = True
+                self.received += len(chunk)
+                if kept is not None:
+                    kept.append(chunk)
+                    if self.received > keep_limit:
+                        kept = None
+                yield chunk
+                if self.truncated:
+                    return
+        finally:
+            self._response.close()  # Also runs when the reader gives up early
+        if kept is not None:
+            body = b"".join(kept)
+            if not self._store.store(self._requested, self.url, self.status, self.headers, body, self.encoding):
+                self.cache = UNCACHED
+
+def open_stream(url, cache=None, session=None, timeout=TIMEOUT, limit=STREAM_LIMIT):
+    """Like fetch(), but returns a Stream as soon as the headers are in, so
+    the body can be parsed while it downloads."""
+    cache = cache or get_cache()
+    session = session or get_session()
+    started = time.monotonic()
+    meta, body, conditional = lookup(cache, url)
+    if meta and conditional is None:
+        cache.touch(url)
+        return Stream(meta["final_url"], meta["status"], meta["headers"], meta["encoding"], HIT, started, body=body)
+
+    response = session.get(url, headers=conditional, timeout=timeout, stream=True)
+    if meta and conditional and response.status_code == 304:
+        response.close()
+        meta = cache.refresh(url, meta, lower_headers(response))
+        return Stream(meta["final_url"], meta["status"], meta["headers"], meta["encoding"], REVALIDATED, started,
+                      body=body)
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        response.close()
+        raise
+
+    headers = lower_headers(response)
+    # The body is not in yet, so no guessing from it: header charset or UTF-8
+    encoding = response.encoding or "utf-8"
+    storable = storable_lifetime(headers) is not None
+    return Stream(response.url, response.status_code, headers, encoding, MISS if storable else UNCACHED, started,
+                  response=response, store=cache if storable else None, requested=url, limit=limit)
@@ -0,0 +1,452 @@
+# _ping.py
+# In-process host discovery for the Network Scanner's sweep.
+#
+# Rather than forking a `ping` per address, every probe goes out from this
+# process in one burst and replies are matched as they come back, so a whole
+# subnet costs roughly one timeout window.
+#
+# How a host is probed is pluggable. A Prober fires probes with send(),
+# reports the addresses that answered from poll(), and forgets timed-out
+# addresses with discard(). Two ship here:
+#
+#   ICMPProber  ICMP echo over an unprivileged datagram socket, or a raw
+#               socket when running with privileges; replies matched by id/seq
+#   TCPProber   non-blocking connects to a few common ports; a completed
+#               handshake or a reset both prove the host is up
+#
+# Anything with the same four methods (e.g. a stand-in that answers from a
+# dict) can drive sweep() without touching the network.
+import errno
+import ipaddress
+import os
+import select
+import selectors
+import socket
+import struct
+import time
+from collections import deque
+
+from modules import _scan_engine
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+ICMP_HEADER = struct.Struct("!BBHHH")  # type, code, checksum, id, seq
+ICMP_PAYLOAD = b"cyber_cli sweep!"
+
+RECV_BUFFER = 1024 * 1024                  # A subnet's replies land at once; don't drop any
+TCP_PORTS = (80, 443, 22, 445, 139, 3389)  # Ports most hosts answer on, open or closed
+DEFAULT_TIMEOUT = 1.0                      # Seconds to wait for a host to answer
+METHODS = ("auto", "icmp", "tcp")
+
+# A refused connect means a live host sent us a reset
+REFUSED = {errno.ECONNREFUSED, getattr(errno, "WSAECONNREFUSED", errno.ECONNREFUSED)}
+IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK)}
+
+def checksum(data):
+    """RFC 1071 internet checksum."""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+class Prober:
+    """Interface a sweep drives. `capacity` is how many hosts may be in
+    flight at once before send() would run out of sockets or buffers."""
+    name = "none"
+    capacity = 1024
+
+    def send(self, ip):
+        """Fires one probe at `ip` without waiting for an answer. Returns
+        False if it could not go out for lack of buffers or sockets, so the
+        sweep can slow down and try that ip again."""
+        raise NotImplementedError
+
+    def poll(self, timeout):
+        """Waits up to `timeout` seconds and returns the ips that answered."""
+        raise NotImplementedError
+
+    def discard(self, ip):
+        """Forgets `ip` after it timed out, releasing anything held for it."""
+
+    def close(self):
+        pass
+
+# --- ICMP ---
+
+class ICMPProber(Prober):
+    """Echo requests from one socket. Raises OSError if the platform or our
+    privileges allow neither a datagram nor a raw ICMP socket of `kind`.
+    IPv4 only."""
+    capacity = 4096  # One socket for everything; only the buffers limit us
+
+    def __init__(self, kind=socket.SOCK_DGRAM):
+        self.sock = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+        self.sock.setblocking(False)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+        except OSError:
+            pass
+        self.raw = kind == socket.SOCK_RAW
+        self.name = "icmp-raw" if self.raw else "icmp"
+        # Datagram sockets get their id rewritten by the kernel and only see
+        # their own replies; a raw socket sees every echo reply on the box
+        self.ident = os.getpid() & 0xFFFF
+        self.seq = 0
+        self.by_seq = {}  # seq -> ip
+        self.by_ip = {}   # ip -> seq
+
+    def send(self, ip):
+        self.seq = (self.seq + 1) & 0xFFFF
+        header = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, self.ident, self.seq)
+        packet = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum(header + ICMP_PAYLOAD),
+                                  self.ident, self.seq) + ICMP_PAYLOAD
+        try:
+            self.sock.sendto(packet, (ip, 0))
+        except (BlockingIOError, InterruptedError):
+            return False  # Send buffer full: we are going faster than the link
+        except OSError as e:
+            # No route and the like: the host simply times out
+            return e.errno != errno.ENOBUFS
+        self.by_seq[self.seq] = ip
+        self.by_ip[ip] = self.seq
+        return True
+
+    def poll(self, timeout):
+        answered = []
+        ready, _, _ = select.select([self.sock], [], [], max(timeout, 0))
+        while ready:
+            try:
+                data, (source, _) = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            # Raw sockets (and datagram ones on some BSDs) include the IP header
+            if data and data[0] >> 4 == 4:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < ICMP_HEADER.size:
+                continue
+            icmp_type, _, _, ident, seq = ICMP_HEADER.unpack_from(data)
+            if icmp_type != ICMP_ECHO_REPLY or (self.raw and ident != self.ident):
+                continue  # Someone else's ping, or not a reply at all
+            if self.by_seq.get(seq) != source:
+                continue
+            del self.by_seq[seq]
+            del self.by_ip[source]
+            answered.append(source)
+        return answered
+
+    def discard(self, ip):
+        seq = self.by_ip.pop(ip, None)
+        if seq is not None:
+            self.by_seq.pop(seq, None)
+
+    def close(self):
+        self.sock.close()
+
+# --- TCP ---
+
+class TCPProber(Prober):
+    """Connects to `ports` on every host at once; the first handshake or
+    reset from any of them marks the host alive."""
+    name = "tcp"
+
+    def __init__(self, ports=TCP_PORTS):
+        self.ports = ports
+        self.selector = selectors.DefaultSelector()
+        self.socks = {}   # ip -> sockets still connecting
+        self.ready = []   # ips that answered inside send() itself
+        sockets = _scan_engine.plan_concurrency(8192)
+        if os.name == "nt":
+            sockets = min(sockets, 500)  # select() tops out at 512 sockets on Windows
+        self.capacity = max(1, sockets // len(ports))
+
+    def send(self, ip):
+        self.socks[ip] = []
+        for port in self.ports:
+            try:
+                sock = socket.socket(_scan_engine.address_family(ip), socket.SOCK_STREAM)
+            except OSError:
+                if not self.socks[ip]:
+                    del self.socks[ip]
+                    return False  # Out of descriptors
+                break  # Probe with the ports we managed to open
+            sock.setblocking(False)
+            result = sock.connect_ex((ip, port))
+            if result == 0 or result in REFUSED:
+                self._close(sock)
+                self.ready.append(ip)
+                self.discard(ip)
+                return True
+            if result not in IN_PROGRESS:
+                sock.close()  # Unreachable right away; try the next port
+                continue
+            self.selector.register(sock, selectors.EVENT_WRITE, ip)
+            self.socks[ip].append(sock)
+        return True
+
+    def poll(self, timeout):
+        answered, self.ready = self.ready, []
+        if answered:
+            timeout = 0
+        if not self.selector.get_map():
+            # select() with no sockets is an error on Windows
+            time.sleep(max(timeout, 0))
+            return answered
+        for key, _ in self.selector.select(max(timeout, 0)):
+            ip, sock = key.data, key.fileobj
+            if ip not in self.socks:
+                continue  # Another port on this host already answered
+            error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error == 0 or error in REFUSED:
+                answered.append(ip)
+                self.discard(ip)
+            else:
+                self.selector.unregister(sock)
+                sock.close()
+                self.socks[ip].remove(sock)
+        return answered
+
+    def _close(self, sock):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _scan_engine.LINGER_RESET)
+        except OSError:
+            pass
+        sock.close()
+
+    def discard(self, ip):
+        for sock in self.socks.pop(ip, ()):
+            self.selector.unregister(sock)
+            self._close(sock)
+
+    def close(self):
+        for ip in list(self.socks):
+            self.discard(ip)
+        self.selector.close()
+
+def open_prober(method="auto", ports=TCP_PORTS, ipv6=False):
+    """The best prober we are allowed to use: unprivileged ICMP, then raw
+    ICMP, then TCP. `method` 'icmp' or 'tcp' forces one. ICMP probing is
+    IPv4 only, so `ipv6` targets always get TCP."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    if ipv6 and method == "icmp":
+        raise ValueError("ICMP probes are IPv4 only; use TCP probes for IPv6 networks")
+    if method == "icmp" or (method == "auto" and not ipv6):
+        for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                return ICMPProber(kind)
+            except OSError:
+                continue
+        if method == "icmp":
+            raise PermissionError("ICMP sockets are not allowed here; run with privileges or use TCP probes")
+    return TCPProber(ports)
+
+# --- TARGETS ---
+
+def parse_networks(specs):
+    """ip_network objects for CIDR strings or bare addresses. Raises
+    ValueError naming the first one that does not parse."""
+    networks = []
+    for spec in specs:
+        try:
+            networks.append(ipaddress.ip_network(spec, strict=False))
+        except ValueError:
+            raise ValueError(f"'{spec}' is not an IP address or CIDR network")
+    return networks
+
+def host_count(network):
+    """len(list(network.hosts())) without building the list."""
+    if network.num_addresses <= 2:
+        return network.num_addresses  # /31 and /32 (or /127, /128) are all hosts
+    if network.version == 4:
+        return network.num_addresses - 2
+    return network.num_addresses - 1  # IPv6 skips only the subnet-router anycast
+
+def iter_targets(networks):
+    """Yields every host address as a string, one network after another.
+    Nothing is materialised, so a /8 costs no more memory than a /24."""
+    seen = []
+    for network in networks:
+        for host in network.hosts() if network.num_addresses > 2 else network:
+            # Overlapping specs ("10.0.0.0/16 10.0.5.0/24") are probed once
+            if any(host in earlier for earlier in seen):
+                continue
+            yield str(host)
+        seen.append(network)
+
+# --- ADAPTIVE WINDOW ---
+
+class AdaptiveWindow:
+    """AIMD limit on probes in flight, like TCP's congestion window.
+
+    The window grows by one for every probe that completes while things look
+    healthy (quickly until the first cut, then by roughly one per round) and
+    is halved when probes start going missing: a send fails for lack of
+    buffers, or the share of probes timing out in the last period jumps above
+    the long-run share. Comparing against the long-run share matters because
+    on a sparse network most probes time out for the honest reason that
+    nobody is there."""
+
+    LOSS_MARGIN = 0.25  # Extra timeout share over the baseline that counts as loss
+    BASELINE_WEIGHT = 0.2
+
+    def __init__(self, maximum, initial=256, minimum=4, period=1.0):
+        self.maximum = max(1, maximum)
+        self.minimum = min(minimum, self.maximum)
+        self.size = float(min(max(initial, self.minimum), self.maximum))
+        self.threshold = float(self.maximum)  # Slow start until the first cut
+        self.period = period
+        self.baseline = None
+        self.answered = self.lost = 0
+        self.period_started = time.monotonic()
+        self.last_cut = 0.0
+        self.cuts = 0
+
+    def __int__(self):
+        return int(self.size)
+
+    def completed(self, answered):
+        if answered:
+            self.answered += 1
+        else:
+            self.lost += 1
+        self._grow()
+
+    def _grow(self):
+        self.size += 1 if self.size < self.threshold else 1 / self.size
+        self.size = min(self.size, self.maximum)
+
+    def send_failed(self):
+        self._cut()
+
+    def _cut(self):
+        now = time.monotonic()
+        if now - self.last_cut < self.period:
+            return  # One cut per period; the probes already in flight were sent at the old rate
+        self.threshold = max(self.size / 2, self.minimum)
+        self.size = self.threshold
+        self.last_cut = now
+        self.cuts += 1
+
+    def review(self):
+        """Compares the last period's timeout share with the baseline."""
+        now = time.monotonic()
+        total = self.answered + self.lost
+        if now - self.period_started < self.period or not total:
+            return
+        share = self.lost / total
+        if self.baseline is not None and share > self.baseline + self.LOSS_MARGIN:
+            self._cut()
+        self.baseline = share if self.baseline is None else (
+            (1 - self.BASELINE_WEIGHT) * self.baseline + self.BASELINE_WEIGHT * share)
+        self.answered = self.lost = 0
+        self.period_started = now
+
+# --- SWEEP ---
+
+MAX_SEND_ATTEMPTS = 3     # Sends that may fail for lack of buffers before an ip is given up on
+SEND_BACKOFF = 0.05       # Pause when nothing is in flight and sends keep failing
+PROGRESS_INTERVAL = 0.25  # Seconds between on_progress calls
+
+class SweepReport:
+    """Hosts that answered, with their round-trip times, and sweep totals."""
+
+    def __init__(self, method, total=None):
+        self.method = method
+        self.total = total  # Hosts to probe, when known up front
+        self.alive = []     # (ip, rtt) in the order answers arrived
+        self.probed = 0
+        self.timed_out = 0
+        self.in_flight = 0
+        self.window = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def done(self):
+        return len(self.alive) + self.timed_out
+
+    def eta(self):
+        """Seconds left at the current completion rate, or None if unknown."""
+        elapsed = time.monotonic() - self.started
+        if not self.total or not self.done or not elapsed:
+            return None
+        return (self.total - self.done) / (self.done / elapsed)
+
+def sweep(targets, prober, timeout=DEFAULT_TIMEOUT, on_alive=None, total=None,
+          on_progress=None, window=None):
+    """Probes every ip in `targets` (any iterable, consumed lazily) through
+    `prober` and returns a SweepReport. Each host gets `timeout` seconds to
+    answer. The number in flight follows an AdaptiveWindow capped at
+    `prober.capacity`. `on_alive(ip, rtt)` is called as answers arrive, and
+    `on_progress(report)` a few times a second."""
+    report = SweepReport(prober.name, total)
+    window = window or AdaptiveWindow(prober.capacity, period=timeout)
+    targets = iter(targets)
+    retry = deque()  # (ip, attempts) whose send failed
+    in_flight = {}   # ip -> send time, oldest first
+    exhausted = False
+    next_progress = time.monotonic()
+
+    while True:
+        failed = False
+        while len(in_flight) < int(window) and (retry or not exhausted):
+            if retry:
+                ip, attempts = retry.popleft()
+            else:
+                ip, attempts = next(targets, None), 0
+                if ip is None:
+                    exhausted = True
+                    break
+                report.probed += 1
+            if ip in in_flight:
+                continue
+            if prober.send(ip) is False:
+                window.send_failed()
+                if attempts + 1 < MAX_SEND_ATTEMPTS:
+                    retry.append((ip, attempts + 1))
+                else:
+                    report.timed_out += 1
+                failed = True
+                break
+            in_flight[ip] = time.monotonic()
+        if not in_flight:
+            if exhausted and not retry:
+                break
+            time.sleep(SEND_BACKOFF if failed else 0)
+            continue
+
+        oldest = next(iter(in_flight.values()))
+        for ip in prober.poll(oldest + timeout - time.monotonic()):
+            sent = in_flight.pop(ip, None)
+            if sent is None:
+                continue
+            rtt = time.monotonic() - sent
+            report.alive.append((ip, rtt))
+            window.completed(True)
+            if on_alive:
+                on_alive(ip, rtt)
+
+        # Expire the hosts whose window has passed, oldest first
+        now = time.monotonic()
+        while in_flight:
+            ip, sent = next(iter(in_flight.items()))
+            if now - sent < timeout:
+                break
+            del in_flight[ip]
+            prober.discard(ip)
+            report.timed_out += 1
+            window.completed(False)
+        window.review()
+
+        if on_progress and now >= next_progress:
+            report.in_flight, report.window = len(in_flight), int(window)
+            on_progress(report)
+            next_progress = now + PROGRESS_INTERVAL
+
+    report.in_flight, report.window = 0, int(window)
+    report.elapsed = time.monotonic() - report.started
+    return report
@@ -0,0 +1,339 @@
+# _scan_engine.py
+# Concurrent TCP connect scanner used by net_scanner.py.
+#
+# Instead of one blocking connect() at a time, a pool of asyncio workers pulls
+# ports from a shared iterator and keeps up to `concurrency` non-blocking
+# connects in flight. Each port ends up in one of three states:
+#
+#   open      the handshake completed
+#   closed    the host answered with a reset (connection refused)
+#   filtered  no answer before the timeout, an ICMP unreachable, or any other
+#             connect error that is not the port itself answering
+#
+# The timeout is not fixed. Every open or closed answer is a round-trip sample,
+# and the per-port timeout follows the smoothed RTT and its variance the way
+# TCP's retransmission timer does (RFC 6298). With many connects in flight an
+# answer can wait a whole pass of a busy event loop before it is seen, so the
+# estimator is fed the fastest of the last `concurrency` answers, the probe
+# that waited least, rather than each one. A port that stays silent is
+# retried a few times with a doubled timeout before it is called filtered.
+#
+# The leading underscore keeps the desktop from listing this file as an app.
+import asyncio
+import errno
+import ipaddress
+import os
+import select
+import socket
+import struct
+import time
+from collections import deque
+
+try:
+    import resource  # Unix only, used to raise the open file limit
+except ImportError:
+    resource = None
+
+OPEN = "open"
+CLOSED = "closed"
+FILTERED = "filtered"
+STATES = (OPEN, CLOSED, FILTERED)
+
+DEFAULT_CONCURRENCY = 2000  # Connects in flight at once
+DEFAULT_TIMEOUT = 1.0       # Timeout before any RTT is known, and the most it may grow to
+MIN_TIMEOUT = 0.1           # Floor for the adaptive timeout, however fast the host
+DEFAULT_RETRIES = 2         # Extra attempts for a port that timed out
+FD_RESERVE = 64             # Descriptors left free for stdio, the event loop, logs
+EMFILE_BACKOFF = 0.05       # Pause before retrying a socket() or connect() that ran out of fds or local ports
+
+# struct linger {on, seconds}: u_short pairs on Windows, ints everywhere else
+LINGER_RESET = struct.pack("HH" if os.name == "nt" else "ii", 1, 0)
+
+# connect() errors that say nothing about the port: this machine has no local
+# port left to connect from (its ephemeral range is full of TIME_WAITs)
+PORTS_EXHAUSTED = {errno.EADDRNOTAVAIL}
+
+# --- FILE DESCRIPTOR LIMIT ---
+
+def raise_fd_limit(wanted):
+    """Raises the soft RLIMIT_NOFILE towards `wanted` (never past the hard
+    limit) and returns the soft limit now in force, or None where there is no
+    such limit (Windows)."""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+def plan_concurrency(requested):
+    """How many sockets we can really keep open at once: `requested`, or less
+    if the descriptor limit cannot be raised far enough."""
+    limit = raise_fd_limit(requested + FD_RESERVE)
+    if limit is None or limit == getattr(resource, "RLIM_INFINITY", None):
+        return requested
+    return max(1, min(requested, limit - FD_RESERVE))
+
+# --- TARGETS ---
+
+def parse_ports(spec):
+    """Sorted, de-duplicated ports from a spec like '22,80,8000-8100'.
+    Raises ValueError on anything outside 1-65535."""
+    ports = set()
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        low, _, high = part.partition("-")
+        low, high = int(low), int(high or low)
+        if not (1 <= low <= high <= 65535):
+            raise ValueError(f"bad port range '{part}': ports run 1-65535, low to high")
+        ports.update(range(low, high + 1))
+    return sorted(ports)
+
+def format_ports(ports):
+    """The shortest spec for a set of ports: [22, 80, 81, 82] -> '22,80-82'."""
+    ranges = []
+    for port in sorted(ports):
+        if ranges and ranges[-1][1] == port - 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ",".join(f"{low}-{high}" if high > low else str(low) for low, high in ranges)
+
+def ip_sort_key(ip):
+    """Sorts addresses numerically, IPv4 before IPv6."""
+    address = ipaddress.ip_address(ip)
+    return address.version, int(address)
+
+# --- PROBING ---
+
+def address_family(ip):
+    return socket.AF_INET6 if ":" in ip else socket.AF_INET
+
+async def open_socket(family):
+    """A non-blocking TCP socket; waits out a momentary EMFILE instead of failing."""
+    while True:
+        try:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except OSError as e:
+            if e.errno not in (errno.EMFILE, errno.ENFILE):
+                raise
+            await asyncio.sleep(EMFILE_BACKOFF)
+            continue
+        sock.setblocking(False)
+        return sock
+
+def writable_now(sock):
+    """True if `sock` is already writable, checked without waiting."""
+    if hasattr(select, "poll"):  # select() cannot take descriptors past FD_SETSIZE
+        poller = select.poll()
+        poller.register(sock, select.POLLOUT)
+        return bool(poller.poll(0))
+    return bool(select.select([], [sock], [], 0)[1])
+
+async def connect(sock, address):
+    """Non-blocking connect() on `sock`. Returns (errno, seconds taken), errno
+    0 once the handshake completed. The time runs from issuing connect() to
+    the event loop's writability callback, not to when the awaiting task is
+    resumed: with hundreds of probes in flight that wait is loop scheduling,
+    and it would swamp the round trip the timeouts are built on. An answer
+    that is already in when connect() returns (loopback, the local network)
+    is taken there and then."""
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    try:
+        sock.connect(address)
+        return 0, time.monotonic() - started
+    except (BlockingIOError, InterruptedError):
+        pass
+    except OSError as e:
+        return e.errno, time.monotonic() - started
+    if writable_now(sock):
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR), time.monotonic() - started
+    answered = loop.create_future()
+
+    def writable():
+        if not answered.done():
+            answered.set_result(time.monotonic() - started)
+
+    fd = sock.fileno()
+    try:
+        loop.add_writer(fd, writable)
+    except NotImplementedError:
+        # Proactor loop (Windows) has no readiness callbacks; time the await
+        try:
+            await loop.sock_connect(sock, address)
+            return 0, time.monotonic() - started
+        except OSError as e:
+            return e.errno, time.monotonic() - started
+    try:
+        took = await answered
+    finally:
+        loop.remove_writer(fd)
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR), took
+
+async def probe(ip, port, timeout, family=None):
+    """Tries one TCP handshake. Returns (state, seconds taken). Never raises
+    for what the network does: any error but a refusal counts as filtered."""
+    family = family or address_family(ip)
+    started = time.monotonic()
+    while True:
+        sock = await open_socket(family)
+        try:
+            try:
+                code, took = await asyncio.wait_for(connect(sock, (ip, port)), timeout)
+            except asyncio.TimeoutError:
+                return FILTERED, time.monotonic() - started
+            if code == 0:
+                # Close with a reset rather than a FIN so thousands of open ports do
+                # not leave thousands of TIME_WAIT entries behind
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_RESET)
+                return OPEN, took
+            if code == errno.ECONNREFUSED:
+                return CLOSED, took
+        finally:
+            sock.close()
+        if code not in PORTS_EXHAUSTED or time.monotonic() - started >= timeout:
+            # Unreachable, reset on the way, timed out in the kernel: nothing
+            # that tells the port apart from one behind a firewall
+            return FILTERED, time.monotonic() - started
+        # Out of local ports: wait for one to come free, as open_socket() does for EMFILE
+        await asyncio.sleep(EMFILE_BACKOFF)
+
+# --- TIMING ---
+
+class RTTEstimator:
+    """Smoothed round-trip time and variance (RFC 6298) for one host, turned
+    into the timeout to use for the next probe."""
+    ALPHA = 1 / 8  # Gain for the smoothed RTT
+    BETA = 1 / 4   # Gain for the variance
+    K = 4          # Variances of headroom above the smoothed RTT
+
+    def __init__(self, initial=DEFAULT_TIMEOUT, minimum=MIN_TIMEOUT, maximum=None, window=1):
+        self.initial = initial
+        self.maximum = maximum or initial
+        self.minimum = min(minimum, self.maximum)
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+        self.fastest = None
+        self.slowest = None
+        self.window = window  # Answers the fed-in sample is the fastest of
+        self.recent = deque()  # (sample number, rtt), rtt increasing: the window's minimum first
+
+    def sample(self, rtt):
+        self.samples += 1
+        self.fastest = rtt if self.fastest is None else min(self.fastest, rtt)
+        self.slowest = rtt if self.slowest is None else max(self.slowest, rtt)
+        while self.recent and self.recent[-1][1] >= rtt:
+            self.recent.pop()
+        self.recent.append((self.samples, rtt))
+        if self.recent[0][0] <= self.samples - self.window:
+            self.recent.popleft()
+        rtt = self.recent[0][1]
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+            return
+        self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+        self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+
+    def timeout(self, attempt=0):
+        """Timeout for a probe; each retry of the same port doubles it."""
+        base = self.initial if self.srtt is None else self.srtt + self.K * self.rttvar
+        return min(max(base, self.minimum) * 2 ** attempt, self.maximum)
+
+    def summary(self):
+        """The timing figures behind the timeouts, for reports."""
+        return {
+            "samples": self.samples,
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "min_rtt": self.fastest,
+            "max_rtt": self.slowest,
+            "timeout": self.timeout(),
+            "min_timeout": self.minimum,
+            "max_timeout": self.maximum,
+        }
+
+# --- SCANNING ---
+
+class ScanReport:
+    """Counts and open ports for one host, filled in as results arrive."""
+
+    def __init__(self, ip, concurrency, rtt, retries):
+        self.ip = ip
+        self.concurrency = concurrency
+        self.rtt = rtt  # The host's RTTEstimator
+        self.retries = retries
+        self.retried = 0  # Probes sent again after a timeout
+        self.counts = dict.fromkeys(STATES, 0)
+        self.open_ports = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add(self, port, state):
+        self.counts[state] += 1
+        if state == OPEN:
+            self.open_ports.append(port)
+
+    @property
+    def scanned(self):
+        return sum(self.counts.values())
+
+async def scan_ports_async(ip, ports, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                           on_result=None, retries=DEFAULT_RETRIES, min_timeout=MIN_TIMEOUT, limiter=None):
+    """Scans `ports` (any iterable) on `ip` and returns a ScanReport.
+
+    `timeout` is used until the first answers arrive and caps the adaptive
+    timeout afterwards; `min_timeout` is its floor. A port that times out is
+    tried up to `retries` more times before it is reported filtered.
+    `on_result(port, state, rtt)` is called for every port as soon as it is
+    decided, so callers can stream output. If given, `await limiter.acquire()`
+    is called before every connect, retries included, to cap the packet rate."""
+    concurrency = plan_concurrency(concurrency)
+    if hasattr(ports, "__len__"):
+        concurrency = max(1, min(concurrency, len(ports)))
+    rtt = RTTEstimator(timeout, min_timeout, window=concurrency)
+    report = ScanReport(ip, concurrency, rtt, retries)
+    family = address_family(ip)
+    pending = iter(ports)  # Shared by every worker; next() never interleaves
+    again = deque()        # (port, attempt) that timed out and get another go
+
+    async def worker():
+        while True:
+            if again:
+                port, attempt = again.popleft()
+            else:
+                port, attempt = next(pending, None), 0
+                if port is None:
+                    return  # Retries queued later are picked up by whoever queued them
+            if limiter:
+                await limiter.acquire()
+            state, took = await probe(ip, port, rtt.timeout(attempt), family)
+            if state == FILTERED and attempt < retries:
+                report.retried += 1
+                again.append((port, attempt + 1))
+                continue
+            if state != FILTERED:
+                rtt.sample(took)
+            report.add(port, state)
+            if on_result:
+                on_result(port, state, took)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    report.open_ports.sort()
+    report.elapsed = time.monotonic() - report.started
+    return report
+
+def scan(ip, ports, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, on_result=None,
+         retries=DEFAULT_RETRIES, min_timeout=MIN_TIMEOUT, limiter=None):
+    """Blocking wrapper around scan_ports_async() for the interactive app."""
+    return asyncio.run(scan_ports_async(ip, ports, concurrency, timeout, on_result, retries, min_timeout, limiter))
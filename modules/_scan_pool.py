@@ -0,0 +1,228 @@
+# _scan_pool.py
+# Spreads a large port scan across worker processes.
+#
+# One process tops out long before the network does: result handling, socket
+# setup and the GIL all share one core. The coordinator here cuts the
+# (host, port) space into chunks of up to CHUNK_PORTS ports and hands them to a pool
+# of worker processes, each running its own _scan_engine event loop.
+#
+#   coordinator ──chunks──> worker 1..N (asyncio scan_ports_async)
+#        ^                          │
+#        └──── results per chunk ───┘   re-ordered, then streamed to on_result
+#
+# Results come back in whatever order chunks finish, and are released in
+# (host, port) order, so callers see one ordered stream. Only a bounded window
+# of chunks is in flight at once, which also bounds how much is buffered.
+#
+# A TokenBucket in shared memory caps the connects per second of every worker
+# together. Each worker takes tokens in small batches to keep lock traffic low.
+#
+# Workers are started with "spawn" on every platform. This module is all
+# they import, so anything they run must live at module level here.
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from modules import _scan_engine
+
+CHUNK_PORTS = 4096      # Most ports per chunk handed to a worker
+MIN_CHUNK_PORTS = 256   # Fewest, so small scans still reach every worker
+CHUNKS_PER_WORKER = 2   # Chunks queued per worker, so none sits idle between chunks
+BURST_SECONDS = 0.05    # How much of the rate the bucket may hand out at once
+BATCH_SECONDS = 0.005   # How much of the rate a worker takes per trip to the bucket
+
+# --- RATE LIMIT ---
+
+class TokenBucket:
+    """A token bucket shared between processes: `rate` tokens a second, at
+    most `burst` saved up. One token is one connect attempt."""
+
+    def __init__(self, rate, burst=None, context=multiprocessing):
+        self.rate = float(rate)
+        self.burst = max(1.0, burst or self.rate * BURST_SECONDS)
+        self._lock = context.Lock()
+        self._tokens = context.Value("d", self.burst, lock=False)
+        # time.monotonic() is system-wide, so stamps compare across processes
+        self._stamp = context.Value("d", time.monotonic(), lock=False)
+
+    def take(self, wanted):
+        """Takes up to `wanted` tokens. Returns (tokens granted, seconds until
+        the next whole token if fewer were granted, else 0)."""
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self._tokens.value + (now - self._stamp.value) * self.rate)
+            self._stamp.value = now
+            granted = min(wanted, int(tokens))
+            self._tokens.value = tokens - granted
+        if granted < wanted:
+            return granted, (1 - (tokens - granted)) / self.rate
+        return granted, 0.0
+
+class Pacer:
+    """One process's view of a TokenBucket, with the `acquire()` coroutine
+    scan_ports_async() expects of a limiter."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.batch = max(1, min(64, int(bucket.rate * BATCH_SECONDS)))
+        self.spare = 0  # Tokens taken from the bucket and not yet used
+
+    async def acquire(self):
+        while not self.spare:
+            granted, wait_for = self.bucket.take(self.batch)
+            self.spare += granted
+            if not granted:
+                await asyncio.sleep(wait_for)
+        self.spare -= 1
+
+# --- WORKERS ---
+
+_worker = {}  # Per-process settings from init_worker()
+
+def init_worker(bucket, options):
+    _worker["pacer"] = Pacer(bucket) if bucket else None
+    _worker["options"] = options
+
+def scan_chunk(index, ip, ports):
+    """Runs in a worker: scans one chunk and returns its results, port order."""
+    results = []
+    report = _scan_engine.scan(ip, ports, on_result=lambda port, state, rtt: results.append((port, state, rtt)),
+                               limiter=_worker["pacer"], **_worker["options"])
+    results.sort()
+    return index, results, report.retried, report.rtt.summary(), report.concurrency
+
+# --- COORDINATOR ---
+
+class HostResult:
+    """Merged outcome for one host; chunks add to it as they are released."""
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.counts = dict.fromkeys(_scan_engine.STATES, 0)
+        self.open_ports = []
+        self.retried = 0
+        self.timings = []  # RTTEstimator.summary() of every chunk
+        self.concurrency = 0  # Most connects any one worker kept in flight for it
+        self.started = None
+        self.elapsed = 0.0
+
+    def add(self, results, retried, timing, concurrency):
+        for port, state, rtt in results:
+            self.counts[state] += 1
+            if state == _scan_engine.OPEN:
+                self.open_ports.append(port)
+        self.retried += retried
+        self.timings.append(timing)
+        self.concurrency = max(self.concurrency, concurrency)
+
+    def timing(self):
+        """One RTTEstimator.summary()-shaped dict for the whole host: sample
+        counts and extremes over every chunk, smoothed values from the chunk
+        that saw the most replies."""
+        best = max(self.timings, key=lambda timing: timing["samples"])
+        merged = dict(best, samples=sum(timing["samples"] for timing in self.timings))
+        for key, pick in (("min_rtt", min), ("max_rtt", max)):
+            values = [timing[key] for timing in self.timings if timing[key] is not None]
+            merged[key] = pick(values) if values else None
+        return merged
+
+class PoolReport:
+    """Everything a distributed scan found, host by host in target order."""
+
+    def __init__(self, processes, concurrency, rate):
+        self.processes = processes
+        self.concurrency = concurrency  # Per worker
+        self.rate = rate
+        self.hosts = []
+        self.chunks = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def scanned(self):
+        return sum(sum(host.counts.values()) for host in self.hosts)
+
+def default_processes():
+    return max(1, os.cpu_count() or 1)
+
+def plan_chunks(ips, ports, chunk_ports=CHUNK_PORTS):
+    """(ip, ports) chunks in (host, port) order; `ports` must be sorted."""
+    for ip in ips:
+        for start in range(0, len(ports), chunk_ports):
+            yield ip, ports[start:start + chunk_ports]
+
+def scan(ips, ports, processes=None, concurrency=_scan_engine.DEFAULT_CONCURRENCY, rate=None, on_result=None,
+         on_host=None, chunk_ports=None, **options):
+    """Scans `ports` on every ip in `ips` using a pool of worker processes and
+    returns a PoolReport.
+
+    `concurrency` is the total number of connects in flight, split between
+    the workers. `rate`, if given, caps connects per second across all of
+    them. `on_result(ip, port, state, rtt)` sees every port in (host, port)
+    order; `on_host(HostResult)` is called as each host is finished.
+    `chunk_ports` defaults to a size that gives every worker a few chunks. Other
+    keyword arguments (timeout, retries, min_timeout) go to the engine."""
+    processes = processes or default_processes()
+    ips, ports = list(ips), sorted(ports)
+    if not chunk_ports:
+        share = -(-len(ips) * len(ports) // (processes * CHUNKS_PER_WORKER))
+        chunk_ports = min(CHUNK_PORTS, max(MIN_CHUNK_PORTS, share))
+    context = multiprocessing.get_context("spawn")
+    bucket = TokenBucket(rate, context=context) if rate else None
+    options = dict(options, concurrency=max(1, concurrency // processes))
+    report = PoolReport(processes, options["concurrency"], rate)
+
+    chunks = enumerate(plan_chunks(ips, ports, chunk_ports))
+    chunk_hosts = {}  # Chunk index -> (ip, when it was submitted), until released
+    finished = {}     # Chunk index -> scan_chunk() result, waiting for its turn
+    released = 0      # Index of the next chunk to release
+    window = processes * CHUNKS_PER_WORKER
+    current = None    # HostResult being filled
+
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker,
+                             initargs=(bucket, options)) as pool:
+        running = set()
+
+        def submit_more():
+            # Bounded by chunks not yet released, not just those running, so a
+            # slow early chunk cannot let finished ones pile up behind it
+            while len(chunk_hosts) < window:
+                index, chunk = next(chunks, (None, None))
+                if chunk is None:
+                    return
+                chunk_hosts[index] = (chunk[0], time.monotonic())
+                running.add(pool.submit(scan_chunk, index, *chunk))
+
+        submit_more()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            running.difference_update(done)
+            for future in done:
+                result = future.result()
+                finished[result[0]] = result
+
+            # Release every chunk that is now next in line
+            while released in finished:
+                _, results, retried, timing, concurrency = finished.pop(released)
+                ip, submitted = chunk_hosts.pop(released)
+                if current is None or current.ip != ip:
+                    if current is not None and on_host:
+                        on_host(current)
+                    current = HostResult(ip)
+                    current.started = submitted
+                    report.hosts.append(current)
+                current.add(results, retried, timing, concurrency)
+                current.elapsed = time.monotonic() - current.started
+                if on_result:
+                    for port, state, rtt in results:
+                        on_result(ip, port, state, rtt)
+                released += 1
+                report.chunks += 1
+            submit_more()
+
+    if current is not None and on_host:
+        on_host(current)
+    report.elapsed = time.monotonic() - report.started
+    return report
@@ -0,0 +1,183 @@
+# _scan_store.py
+# Scan history for the Network Scanner, kept in SQLite next to config.json.
+#
+# Every scan or sweep is a run. A port scan run records the ports it found
+# open, and its scope (the port spec it covered), so a later run can tell a
+# port that closed from one that simply was not scanned. A sweep run records
+# the hosts that answered.
+#
+#   runs     id, kind ('scan' | 'sweep'), target, scope, started, finished, summary
+#   ports    run_id, host, port, state, rtt, seen, service, product
+#   hosts    run_id, host, rtt, seen
+#
+# A run whose `finished` is NULL was interrupted and is ignored by lookups.
+import json
+import sqlite3
+import time
+
+from core import utils
+from modules import _scan_engine
+
+DB_PATH = utils.SETTINGS_FILE.parent / 'scan_history.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    scope TEXT NOT NULL DEFAULT '',
+    started REAL NOT NULL,
+    finished REAL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_target ON runs (kind, target, finished);
+CREATE TABLE IF NOT EXISTS ports (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    rtt REAL,
+    seen REAL NOT NULL,
+    service TEXT,
+    product TEXT
+);
+CREATE INDEX IF NOT EXISTS ports_host ON ports (host, port, seen);
+CREATE INDEX IF NOT EXISTS ports_run ON ports (run_id);
+CREATE TABLE IF NOT EXISTS hosts (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    host TEXT NOT NULL,
+    rtt REAL,
+    seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hosts_run ON hosts (run_id);
+"""
+
+class Run:
+    """One row of `runs`."""
+
+    def __init__(self, id, kind, target, scope, started, finished, summary):
+        self.id = id
+        self.kind = kind
+        self.target = target
+        self.scope = scope
+        self.started = started
+        self.finished = finished
+        self.summary = json.loads(summary) if summary else {}
+
+    def when(self):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started))
+
+class Diff:
+    """What changed between two runs of the same target."""
+
+    def __init__(self, kind, target, before, after, appeared, disappeared):
+        self.kind = kind
+        self.target = target
+        self.before = before  # Older Run
+        self.after = after    # Newer Run
+        self.appeared = appeared
+        self.disappeared = disappeared
+
+class ScanStore:
+    """Thin wrapper over the history database. sqlite3 connections belong to
+    the thread that opened them, so a background scan opens its own store."""
+
+    def __init__(self, path=DB_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path), timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")  # A background writer never blocks readers
+        self.db.executescript(SCHEMA)
+        self._upgrade()
+
+    def _upgrade(self):
+        # Databases created before service detection lack these columns
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(ports)")}
+        with self.db:
+            for column in ("service", "product"):
+                if column not in columns:
+                    self.db.execute(f"ALTER TABLE ports ADD COLUMN {column} TEXT")
+
+    def close(self):
+        self.db.close()
+
+    # --- WRITING ---
+
+    def start_run(self, kind, target, scope=""):
+        with self.db:
+            cursor = self.db.execute("INSERT INTO runs (kind, target, scope, started) VALUES (?, ?, ?, ?)",
+                                     (kind, target, scope, time.time()))
+        return cursor.lastrowid
+
+    def add_ports(self, run_id, host, results, services=None):
+        """Stores (port, state, rtt) results, with what `services` ({port:
+        ServiceInfo}) says is running on them. Closed ports are implied by the
+        run's scope and are not stored."""
+        now = time.time()
+        services = services or {}
+        rows = []
+        for port, state, rtt in results:
+            if state == _scan_engine.CLOSED:
+                continue
+            info = services.get(port)
+            rows.append((run_id, host, port, state, rtt, now, info and info.service, info and info.product))
+        with self.db:
+            self.db.executemany("INSERT INTO ports (run_id, host, port, state, rtt, seen, service, product) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def add_hosts(self, run_id, results):
+        """Stores (ip, rtt) pairs for the hosts that answered a sweep."""
+        now = time.time()
+        with self.db:
+            self.db.executemany("INSERT INTO hosts (run_id, host, rtt, seen) VALUES (?, ?, ?, ?)",
+                                [(run_id, host, rtt, now) for host, rtt in results])
+
+    def finish_run(self, run_id, summary=None):
+        with self.db:
+            self.db.execute("UPDATE runs SET finished = ?, summary = ? WHERE id = ?",
+                            (time.time(), json.dumps(summary or {}), run_id))
+
+    # --- READING ---
+
+    def runs(self, kind, target, limit=2):
+        """The newest finished runs for `target`, newest first."""
+        rows = self.db.execute("SELECT id, kind, target, scope, started, finished, summary FROM runs "
+                               "WHERE kind = ? AND target = ? AND finished IS NOT NULL "
+                               "ORDER BY started DESC LIMIT ?", (kind, target, limit))
+        return [Run(*row) for row in rows]
+
+    def latest_run(self):
+        row = self.db.execute("SELECT id, kind, target, scope, started, finished, summary FROM runs "
+                              "WHERE finished IS NOT NULL ORDER BY started DESC LIMIT 1").fetchone()
+        return Run(*row) if row else None
+
+    def open_ports(self, run_id):
+        rows = self.db.execute("SELECT port FROM ports WHERE run_id = ? AND state = ? ORDER BY port",
+                               (run_id, _scan_engine.OPEN))
+        return [port for port, in rows]
+
+    def alive_hosts(self, run_id):
+        return [host for host, in self.db.execute("SELECT host FROM hosts WHERE run_id = ?", (run_id,))]
+
+    def known_open(self, host):
+        """Ports that were open on `host` in its last finished scan."""
+        runs = self.runs("scan", host, limit=1)
+        return self.open_ports(runs[0].id) if runs else []
+
+    def diff(self, kind, target):
+        """A Diff between the two newest finished runs of `target`, or None
+        if it has been run fewer than twice. For port scans only ports both
+        runs covered are compared."""
+        runs = self.runs(kind, target, limit=2)
+        if len(runs) < 2:
+            return None
+        after, before = runs
+        if kind == "scan":
+            shared = set(_scan_engine.parse_ports(before.scope)) & set(_scan_engine.parse_ports(after.scope))
+            old = set(self.open_ports(before.id)) & shared
+            new = set(self.open_ports(after.id)) & shared
+            key = int
+        else:
+            old = set(self.alive_hosts(before.id))
+            new = set(self.alive_hosts(after.id))
+            key = _scan_engine.ip_sort_key
+        return Diff(kind, target, before, after, sorted(new - old, key=key), sorted(old - new, key=key))
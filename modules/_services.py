@@ -0,0 +1,236 @@
+# _services.py
+# Service and banner detection for ports the scan engine finds open.
+#
+# Detection runs as a second stage in the same event loop as the port scan:
+# every open port is queued the moment it is found and a small pool of
+# detector tasks works through the queue while the scan carries on.
+#
+# For each port the detectors walk PROBES (ports named in a probe's `ports`
+# go first) until a response matches one of FINGERPRINTS:
+#
+#   greeting    connect and wait; SSH, FTP, SMTP, POP3, IMAP... speak first
+#   http-head   send "HEAD / HTTP/1.0"
+#   tls         TLS handshake, then "HEAD /" inside it
+#
+# Both tables are plain lists, so teaching the scanner a new protocol is one
+# Probe and/or one Fingerprint appended to them.
+import asyncio
+import re
+import ssl
+import time
+
+from modules import _scan_engine
+
+DETECT_WORKERS = 32   # Ports being fingerprinted at once
+MAX_RESPONSE = 2048   # Bytes read from a service before matching
+BANNER_WIDTH = 80     # Characters of banner kept for display
+
+HTTP_PORTS = (80, 81, 591, 3000, 5000, 8000, 8008, 8080, 8081, 8888, 9000)
+TLS_PORTS = (443, 465, 636, 853, 990, 993, 995, 5061, 8443, 9443)
+
+class Probe:
+    """One way of getting a service to say something. `payload` may contain
+    '{host}'; None means just listen. `ports` are where this probe is tried
+    first."""
+
+    def __init__(self, name, payload=None, tls=False, ports=(), timeout=2.0):
+        self.name = name
+        self.payload = payload
+        self.tls = tls
+        self.ports = frozenset(ports)
+        self.timeout = timeout
+
+class Fingerprint:
+    """Names a service when `pattern` matches a response. The product comes
+    from `product`'s first group if given, else `pattern`'s first group."""
+
+    def __init__(self, service, pattern, product=None):
+        self.service = service
+        self.pattern = re.compile(pattern, re.S)
+        self.product = re.compile(product, re.S | re.I) if product else None
+
+    def match(self, response):
+        found = self.pattern.search(response)
+        if not found:
+            return None
+        if self.product:
+            named = self.product.search(response)
+            return named.group(1) if named else ""
+        return found.group(1) if found.groups() else ""
+
+PROBES = [
+    Probe("greeting", None, timeout=2.0),
+    Probe("http-head", b"HEAD / HTTP/1.0\r\nHost: {host}\r\nUser-Agent: Cyber_CLI\r\n\r\n", ports=HTTP_PORTS, timeout=3.0),
+    Probe("tls", b"HEAD / HTTP/1.0\r\nHost: {host}\r\nUser-Agent: Cyber_CLI\r\n\r\n", tls=True, ports=TLS_PORTS, timeout=3.0),
+]
+
+FINGERPRINTS = [
+    Fingerprint("ssh", rb"^SSH-\d+\.\d+-([^\r\n]+)"),
+    Fingerprint("smtp", rb"(?i)^220[ -][^\r\n]*(?:smtp|postfix|exim|sendmail)", rb"^220[ -](\S+ [^\r\n]*)"),
+    Fingerprint("ftp", rb"(?i)^220[ -][^\r\n]*(?:ftp|filezilla)", rb"^220[ -]([^\r\n]*)"),
+    Fingerprint("pop3", rb"^\+OK([^\r\n]*)"),
+    Fingerprint("imap", rb"^\* OK([^\r\n]*)"),
+    Fingerprint("mysql", rb"^.\x00\x00\x00\x0a([\d.]+[^\x00]*)\x00"),
+    Fingerprint("vnc", rb"^RFB (\d{3}\.\d{3})"),
+    Fingerprint("http", rb"^HTTP/\d\.\d \d{3}", rb"\r\nServer: *([^\r\n]+)"),
+    Fingerprint("telnet", rb"^\xff[\xfb-\xfe]"),
+    Fingerprint("ftp", rb"^220[ -]([^\r\n]*)"),  # Bare 220 greeting, most likely FTP
+]
+
+class ServiceInfo:
+    """What a port turned out to be running."""
+
+    def __init__(self, port, service, product="", banner="", probe=None, tls=None, elapsed=0.0, error=None):
+        self.port = port
+        self.service = service  # e.g. 'ssh', 'https', 'unknown'
+        self.product = product  # e.g. 'OpenSSH_9.6p1 Ubuntu-3'
+        self.banner = banner    # First line of the response, printable
+        self.probe = probe      # Name of the probe that got the answer
+        self.tls = tls          # {'version', 'cipher'} when spoken over TLS
+        self.elapsed = elapsed
+        self.error = error      # Why detection gave up on the port, if it failed outright
+
+    def describe(self):
+        text = " ".join(part for part in (self.service, self.product) if part)
+        return f"{text} ({self.error})" if self.error else text
+
+    def as_dict(self):
+        return {"port": self.port, "service": self.service, "product": self.product, "banner": self.banner,
+                "probe": self.probe, "tls": self.tls, "elapsed_ms": round(self.elapsed * 1000, 3),
+                "error": self.error}
+
+def printable(data):
+    line = data.split(b"\n", 1)[0].rstrip(b"\r")
+    text = line.decode("latin-1")
+    return "".join(ch if ch.isprintable() else "." for ch in text)[:BANNER_WIDTH]
+
+def identify(response):
+    """(service, product) for a response, or (None, '') if nothing matches."""
+    for fingerprint in FINGERPRINTS:
+        product = fingerprint.match(response)
+        if product is not None:
+            return fingerprint.service, product.decode("utf-8", "replace").strip()
+    return None, ""
+
+def tls_context():
+    # We are identifying services, not trusting them: accept any certificate
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+async def run_probe(probe, ip, port, host):
+    """Connects, sends the probe's payload, and returns (response bytes, tls
+    info or None). Raises OSError/asyncio.TimeoutError/ssl.SSLError if the
+    service will not talk this way."""
+    got = {"response": b"", "tls": None}
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(
+            ip, port, ssl=tls_context() if probe.tls else None,
+            server_hostname=(host if host != ip else None) if probe.tls else None)
+        try:
+            if probe.tls:
+                ssl_object = writer.get_extra_info("ssl_object")
+                got["tls"] = {"version": ssl_object.version(), "cipher": ssl_object.cipher()[0]}
+            if probe.payload:
+                writer.write(probe.payload.replace(b"{host}", host.encode("idna")))
+                await writer.drain()
+            while len(got["response"]) < MAX_RESPONSE:
+                chunk = await reader.read(MAX_RESPONSE - len(got["response"]))
+                if not chunk:
+                    break
+                got["response"] += chunk
+                if complete(got["response"]):
+                    break  # Enough to name it; don't wait for the rest
+        finally:
+            # No wait_closed(): a TLS peer that never answers our close_notify
+            # would hold the detector hostage
+            writer.close()
+
+    try:
+        await asyncio.wait_for(exchange(), probe.timeout)
+    except asyncio.TimeoutError:
+        # A partial answer is still worth matching
+        if not got["response"] and not got["tls"]:
+            raise
+    return got["response"], got["tls"]
+
+def complete(response):
+    """True once a response says all we need: it matches a fingerprint, and
+    for HTTP the headers (with Server:) have arrived."""
+    service, _ = identify(response)
+    return service is not None and (service != "http" or b"\r\n\r\n" in response)
+
+def probes_for(port):
+    """PROBES in the order to try them on `port`."""
+    return sorted(PROBES, key=lambda probe: port not in probe.ports)
+
+async def detect(ip, port, host=None):
+    """Works through the probes for one open port and returns a ServiceInfo."""
+    host = host or ip
+    started = time.monotonic()
+    fallback = None
+    for probe in probes_for(port):
+        try:
+            response, tls = await run_probe(probe, ip, port, host)
+        except (OSError, asyncio.TimeoutError, ssl.SSLError, EOFError, ValueError):
+            continue  # ValueError: e.g. a host name IDNA cannot encode for the TLS probes
+        service, product = identify(response)
+        if service:
+            if tls:
+                service = "https" if service == "http" else f"{service}/tls"
+            return ServiceInfo(port, service, product, printable(response), probe.name, tls, time.monotonic() - started)
+        if tls and not fallback:
+            # TLS but nothing we recognise inside it
+            fallback = ServiceInfo(port, "tls", tls["version"] or "", printable(response), probe.name, tls)
+        elif response and not fallback:
+            fallback = ServiceInfo(port, "unknown", "", printable(response), probe.name)
+    fallback = fallback or ServiceInfo(port, "unknown")
+    fallback.elapsed = time.monotonic() - started
+    return fallback
+
+# --- PIPELINE ---
+
+async def scan_with_services_async(ip, ports, host=None, on_result=None, on_service=None,
+                                   workers=DETECT_WORKERS, **scan_options):
+    """Runs scan_ports_async() and fingerprints open ports as they are found,
+    in parallel with the rest of the scan. Returns (ScanReport, {port: ServiceInfo}).
+    `on_service(info)` is called as each port is identified."""
+    queue = asyncio.Queue()
+    services = {}
+
+    def found(port, state, rtt):
+        if on_result:
+            on_result(port, state, rtt)
+        if state == _scan_engine.OPEN:
+            queue.put_nowait(port)
+
+    async def detector():
+        while True:
+            port = await queue.get()
+            try:
+                try:
+                    info = await detect(ip, port, host)
+                except Exception as e:
+                    # Costs this port its name, not the scan a detector: with
+                    # every detector gone, queue.join() would never return
+                    info = ServiceInfo(port, "unknown", error=f"{type(e).__name__}: {e}")
+                services[port] = info
+                if on_service:
+                    on_service(info)
+            finally:
+                queue.task_done()
+
+    detectors = [asyncio.create_task(detector()) for _ in range(workers)]
+    try:
+        report = await _scan_engine.scan_ports_async(ip, ports, on_result=found, **scan_options)
+        await queue.join()  # Ports found near the end are still being fingerprinted
+    finally:
+        for task in detectors:
+            task.cancel()
+    return report, services
+
+def scan_with_services(ip, ports, host=None, on_result=None, on_service=None, workers=DETECT_WORKERS, **scan_options):
+    """Blocking wrapper around scan_with_services_async()."""
+    return asyncio.run(scan_with_services_async(ip, ports, host, on_result, on_service, workers, **scan_options))
@@ -1,187 +1,770 @@
-APP_INFO = {
-    "name": "Network Scanner",
-    "icon": "🔍",
-    "description": "Scans a host for open ports or sweeps the local network for active hosts."
-}
-
-from core import utils
-import time
-import socket
-import platform
-import subprocess
-from concurrent.futures import ThreadPoolExecutor
-
-# --- Helper Functions for Network Scanning ---
-
-def get_local_ip():
-    """Fetches the local IP address using a common socket trick."""
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        # Connect to a non-existent external address (like a DNS server) to find the correct local interface IP.
-        s.connect(('8.8.8.8', 1)) 
-        IP = s.getsockname()[0]
-    except Exception:
-        IP = '127.0.0.1'
-    finally:
-        s.close()
-    return IP
-
-def get_ip_range_for_sweep(local_ip):
-    """Infers the /24 subnet range (1-254) from the local IP."""
-    # e.g., '192.168.1.100' -> '192.168.1.'
-    if local_ip == '127.0.0.1':
-        # Cannot sweep from localhost. Return an empty list or an error message.
-        return []
-        
-    network_prefix = ".".join(local_ip.split('.')[:-1]) + "."
-    # Create a list of all 254 possible host IPs in the /24 subnet
-    return [network_prefix + str(i) for i in range(1, 255)]
-
-def is_host_alive(ip):
-    """Checks if a host is alive using the system's ping command."""
-    # Use platform-specific flags for reliability
-    if platform.system().lower() == "windows":
-        command = ['ping', '-n', '1', '-w', '100', ip] # -n 1 packet, -w 100ms timeout
-    else:
-        command = ['ping', '-c', '1', '-W', '1', ip] # -c 1 packet, -W 1 second timeout
-
-    try:
-        # Run the ping command, suppressing output
-        result = subprocess.run(
-            command,
-            timeout=1, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE
-        )
-        # Return the IP if the ping was successful (returncode 0)
-        return ip if result.returncode == 0 else None
-    except subprocess.TimeoutExpired:
-        return None
-    except Exception:
-        return None
-
-def threaded_ping_sweep():
-    """Orchestrates the local network sweep."""
-    local_ip = get_local_ip()
-    ip_list = get_ip_range_for_sweep(local_ip)
-    
-    if not ip_list:
-        utils.Print_Typing(utils.Colors.col_text("\n[ERROR] Cannot sweep. Local IP is '127.0.0.1' or network lookup failed.", utils.Colors.RED))
-        return
-
-    utils.Print_Typing(utils.Colors.col_text(f"\nLocal IP: {local_ip}", utils.Colors.BRIGHT_MAGENTA))
-    utils.Print_Typing(f"Sweeping local network ({'.'.join(local_ip.split('.')[:-1])}.1-254) for active hosts (20 threads)...", delay=0.01)
-    
-    active_hosts = []
-    
-    # Use a thread pool for concurrent checking (max_workers=20 for speed)
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        # The executor maps the function 'is_host_alive' to all IPs in 'ip_list'
-        # This runs 20 pings simultaneously.
-        results = executor.map(is_host_alive, ip_list)
-        
-        # Filter and collect successful results
-        for ip in results:
-            if ip is not None:
-                active_hosts.append(ip)
-                print(utils.Colors.col_text(f"[ACTIVE] Host found at {ip}", utils.Colors.BRIGHT_GREEN))
-
-    print("\n" + "=" * 50)
-    if active_hosts:
-        utils.Print_Typing(utils.Colors.col_text(f"Sweep Complete. {len(active_hosts)} device(s) found.", utils.Colors.BRIGHT_GREEN))
-        print("Active IPs: " + ", ".join(active_hosts))
-    else:
-        utils.Print_Typing(utils.Colors.col_text("Sweep Complete. No other active hosts detected.", utils.Colors.BRIGHT_YELLOW))
-    print("=" * 50)
-
-# --- Port Scanning (Refactored from previous) ---
-
-def scan_ports(host, start_port, end_port):
-    """Attempts to connect to a range of ports on a specified host."""
-    
-    try:
-        ip = socket.gethostbyname(host)
-    except socket.gaierror:
-        utils.Print_Typing(utils.Colors.col_text(f"\n[ERROR] Hostname '{host}' could not be resolved.", utils.Colors.RED))
-        return
-
-    utils.Print_Typing(utils.Colors.col_text(f"\nTarget Host: {host} ({ip})", utils.Colors.BRIGHT_CYAN))
-    utils.Print_Typing(f"Scanning ports {start_port} to {end_port}...", delay=0.01)
-    print("-" * 40)
-
-    open_ports = []
-    
-    for port in range(start_port, end_port + 1):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.1) 
-        
-        # Check connection (connect_ex is faster and avoids exceptions on refusal)
-        result = sock.connect_ex((ip, port))
-        sock.close()
-        
-        if result == 0:
-            open_ports.append(port)
-            print(utils.Colors.col_text(f"[OPEN] Port {port}", utils.Colors.BRIGHT_GREEN))
-        # else: # Removed printing closed ports to make output cleaner
-        #     print(f"[CLOSED] Port {port}") 
-
-    print("-" * 40)
-    if open_ports:
-        utils.Print_Typing(utils.Colors.col_text(f"Scan Complete. {len(open_ports)} port(s) open.", utils.Colors.BRIGHT_GREEN))
-        print(f"Open Ports: {', '.join(map(str, open_ports))}")
-    else:
-        utils.Print_Typing(utils.Colors.col_text("Scan Complete. No open ports found in range.", utils.Colors.BRIGHT_YELLOW))
-
-# --- Application Launch ---
-
-def launch():
-    prompt_char = utils.load_settings().get('prompt_char', '>')
-    while True:
-        utils.clear_console()
-        print(utils.Colors.col_text("\n<< Network Scanner >>", utils.Colors.BRIGHT_MAGENTA))
-        print("Usage:")
-        print("  - " + utils.Colors.col_text("scan <host> <start_port> <end_port>", utils.Colors.BRIGHT_CYAN))
-        print("    Example: scan localhost 20 80 (Scan the current PC)")
-        print("    Example: scan 192.168.1.1 22 443 (Scan a remote IP)")
-        print("  - " + utils.Colors.col_text("sweep", utils.Colors.BRIGHT_CYAN) + " (Ping sweep the local network)")
-        print("\nType 'exit' to return to desktop.")
-        
-        user_input = input(f"Scan {prompt_char} ").strip()
-        
-        if user_input.lower() in ("exit", "quit", "q"):
-            utils.Print_Typing("Closing Network Scanner...")
-            utils.clear_console()
-            break
-        
-        parts = user_input.split()
-        command = parts[0].lower() if parts else ""
-
-        if command == 'sweep':
-            threaded_ping_sweep()
-            input(utils.Colors.col_text(f"\nPress Enter to continue. . .", utils.Colors.BRIGHT_YELLOW))
-            continue
-            
-        elif command == 'scan' and len(parts) == 4:
-            try:
-                host = parts[1]
-                start_port = int(parts[2])
-                end_port = int(parts[3])
-                
-                if not (1 <= start_port <= 65535 and 1 <= end_port <= 65535 and start_port <= end_port):
-                    utils.Print_Typing(utils.Colors.col_text("\nPorts must be between 1 and 65535, and start port must be <= end port.", utils.Colors.RED))
-                    time.sleep(1)
-                    continue
-
-                scan_ports(host, start_port, end_port)
-                input(utils.Colors.col_text(f"\nPress Enter to continue. . .", utils.Colors.BRIGHT_YELLOW))
-                
-            except ValueError:
-                utils.Print_Typing(utils.Colors.col_text("\nPorts must be valid numbers.", utils.Colors.RED))
-                time.sleep(1)
-            except Exception as e:
-                utils.Print_Typing(utils.Colors.col_text(f"\nAn unexpected error occurred: {e}", utils.Colors.RED))
-                time.sleep(1)
-
-        else:
-            utils.Print_Typing(utils.Colors.col_text("\nInvalid command or arguments. Check usage above.", utils.Colors.RED))
-            time.sleep(1)
\ No newline at end of file
+APP_INFO = {
+    "name": "Network Scanner",
+    "icon": "🔍",
+    "description": "Scans a host for open ports or sweeps the local network for active hosts."
+}
+
+from core import utils
+import time
+import socket
+import argparse
+import ipaddress
+import json
+import os
+import sqlite3
+import sys
+import threading
+from modules import _ping, _scan_engine, _scan_pool, _scan_store, _services
+
+MAX_SWEEP_HOSTS = 1 << 24  # A /8; anything bigger is a typo, not a lab network
+
+# --- Scan History ---
+
+background_scans = []  # BackgroundScan threads started by incremental scans
+
+def open_store(out=None):
+    """The scan history database, or None (with a warning on `out`, stdout by
+    default) if it cannot be opened."""
+    try:
+        return _scan_store.ScanStore()
+    except (sqlite3.Error, OSError) as e:
+        print(utils.Colors.col_text(f"[NOTE] Scan history unavailable ({e}); results will not be saved.", utils.Colors.BRIGHT_YELLOW), file=out)
+        return None
+
+def sweep_target(networks):
+    """How a sweep of `networks` is keyed in the history."""
+    return " ".join(map(str, networks))
+
+class BackgroundScan(threading.Thread):
+    """Finishes an incremental scan off the main thread so the prompt comes
+    back as soon as the known ports have been re-checked."""
+
+    def __init__(self, ip, ports, run_id, first_pass, options):
+        super().__init__(daemon=True)
+        self.ip = ip
+        self.ports = ports
+        self.run_id = run_id
+        self.first_pass = first_pass  # Report for the re-checked known ports
+        self.options = options
+        self.done = 0
+        self.found = []
+        self.report = None
+        self.error = None
+
+    def run(self):
+        results = []
+
+        def record(port, state, rtt):
+            self.done += 1
+            if state != _scan_engine.CLOSED:
+                results.append((port, state, rtt))
+            if state == _scan_engine.OPEN:
+                self.found.append(port)
+
+        try:
+            self.report = _scan_engine.scan(self.ip, self.ports, on_result=record, **self.options)
+            store = _scan_store.ScanStore()  # sqlite3 connections stay on their own thread
+            try:
+                store.add_ports(self.run_id, self.ip, results)
+                counts = {state: self.first_pass.counts[state] + self.report.counts[state] for state in _scan_engine.STATES}
+                store.finish_run(self.run_id, {"open_ports": sorted(self.first_pass.open_ports + self.found), "counts": counts})
+            finally:
+                store.close()
+        except Exception as e:
+            self.error = e
+
+    def status(self):
+        if self.error:
+            return utils.Colors.col_text(f"[BACKGROUND] Scan of {self.ip} failed: {self.error}", utils.Colors.RED)
+        found = f", new open: {', '.join(map(str, sorted(self.found)))}" if self.found else ""
+        if self.is_alive():
+            return utils.Colors.col_text(f"[BACKGROUND] Scanning {self.ip}: {self.done}/{len(self.ports)} remaining ports done{found}", utils.Colors.BRIGHT_CYAN)
+        return utils.Colors.col_text(f"[BACKGROUND] Scan of {self.ip} finished in {self.report.elapsed:.1f}s{found or ', no new open ports'}", utils.Colors.BRIGHT_GREEN)
+
+def show_background_scans(screen):
+    """Adds a line per background scan to `screen`; finished ones are shown once, then dropped."""
+    for job in list(background_scans):
+        screen.line(job.status())
+        if not job.is_alive():
+            background_scans.remove(job)
+
+def find_diff(store, args):
+    """Looks up the Diff for `args`: a host, a list of networks, or nothing
+    for the most recent target. Returns (diff, target); diff is None when
+    there are fewer than two runs to compare, target is None when nothing
+    has been recorded at all."""
+    if not args:
+        run = store.latest_run()
+        if run is None:
+            return None, None
+        return store.diff(run.kind, run.target), run.target
+    candidates = []
+    if len(args) == 1:
+        try:
+            candidates.append(("scan", socket.gethostbyname(args[0])))
+        except socket.gaierror:
+            pass
+    try:
+        candidates.append(("sweep", sweep_target(_ping.parse_networks(args))))
+    except ValueError:
+        pass
+    for kind, target in candidates:
+        diff = store.diff(kind, target)
+        if diff:
+            return diff, target
+    return None, " ".join(args)
+
+def show_diff(args):
+    """Lists what appeared or disappeared between the last two runs of a target."""
+    store = open_store()
+    if store is None:
+        return
+    try:
+        diff, target = find_diff(store, args)
+    finally:
+        store.close()
+
+    if target is None:
+        utils.Print_Typing(utils.Colors.col_text("\nNo finished scans or sweeps recorded yet.", utils.Colors.BRIGHT_YELLOW))
+        return
+    if diff is None:
+        utils.Print_Typing(utils.Colors.col_text(f"\nFewer than two recorded runs for {target}; nothing to compare yet.", utils.Colors.BRIGHT_YELLOW))
+        return
+    noun = "Port" if diff.kind == "scan" else "Host"
+    utils.Print_Typing(utils.Colors.col_text(f"\nChanges for {diff.target} ({diff.kind}) between {diff.before.when()} and {diff.after.when()}:", utils.Colors.BRIGHT_CYAN))
+    with utils.Screen(clear=False) as screen:
+        screen.line("-" * 40)
+        for item in diff.appeared:
+            screen.line(utils.Colors.col_text(f"[+] {noun} {item} appeared", utils.Colors.BRIGHT_GREEN))
+        for item in diff.disappeared:
+            screen.line(utils.Colors.col_text(f"[-] {noun} {item} disappeared", utils.Colors.RED))
+        if not diff.appeared and not diff.disappeared:
+            screen.line("No changes.")
+
+# --- Helper Functions for Network Scanning ---
+
+def get_local_ip():
+    """Fetches the local IP address using a common socket trick."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # Connect to a non-existent external address (like a DNS server) to find the correct local interface IP.
+        s.connect(('8.8.8.8', 1)) 
+        IP = s.getsockname()[0]
+    except Exception:
+        IP = '127.0.0.1'
+    finally:
+        s.close()
+    return IP
+
+def get_local_network(local_ip):
+    """Infers the local /24 network from the local IP, or None from localhost."""
+    if local_ip == '127.0.0.1':
+        # Cannot sweep from localhost.
+        return None
+    return ipaddress.ip_network(f"{local_ip}/24", strict=False)
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}" if minutes >= 60 else f"{minutes:02d}:{seconds:02d}"
+
+def ping_sweep(networks=None, method="auto", timeout=_ping.DEFAULT_TIMEOUT):
+    """Orchestrates a sweep of `networks`, or of the local /24 if none are given."""
+    if not networks:
+        local_ip = get_local_ip()
+        network = get_local_network(local_ip)
+        if network is None:
+            utils.Print_Typing(utils.Colors.col_text("\n[ERROR] Cannot sweep. Local IP is '127.0.0.1' or network lookup failed.", utils.Colors.RED))
+            return
+        utils.Print_Typing(utils.Colors.col_text(f"\nLocal IP: {local_ip}", utils.Colors.BRIGHT_MAGENTA))
+        networks = [network]
+
+    total = sum(_ping.host_count(network) for network in networks)
+    if total > MAX_SWEEP_HOSTS:
+        utils.Print_Typing(utils.Colors.col_text(f"\n[ERROR] {total} addresses is more than the {MAX_SWEEP_HOSTS} a sweep allows.", utils.Colors.RED))
+        return
+
+    try:
+        prober = _ping.open_prober(method, ipv6=any(network.version == 6 for network in networks))
+    except (OSError, ValueError) as e:
+        utils.Print_Typing(utils.Colors.col_text(f"\n[ERROR] {e}", utils.Colors.RED))
+        return
+
+    utils.Print_Typing(f"\nSweeping {', '.join(map(str, networks))} ({total} addresses, {prober.name} probes)...", delay=0.01)
+
+    def show(ip, rtt):
+        # Wipe the progress line, print the host, and let the next update redraw it
+        print("\r\033[K" + utils.Colors.col_text(f"[ACTIVE] Host found at {ip} ({rtt * 1000:.1f} ms)", utils.Colors.BRIGHT_GREEN))
+
+    def progress(report):
+        percent = 100 * report.done / total if total else 100
+        print(f"\r\033[K[{percent:5.1f}%] {report.done}/{total} done, {len(report.alive)} up, "
+              f"{report.in_flight} in flight (window {report.window}), ETA {format_eta(report.eta())}",
+              end="", flush=True)
+
+    # Targets are generated lazily; probes go out as fast as the window allows
+    store = open_store()
+    run_id = store.start_run("sweep", sweep_target(networks)) if store else None
+    try:
+        report = _ping.sweep(_ping.iter_targets(networks), prober, timeout, on_alive=show,
+                             total=total, on_progress=progress)
+        if store:
+            store.add_hosts(run_id, report.alive)
+            store.finish_run(run_id, {"alive": len(report.alive), "probed": report.probed, "method": report.method})
+    finally:
+        prober.close()
+        if store:
+            store.close()
+    active_hosts = sorted((ip for ip, _ in report.alive), key=ipaddress.ip_address)
+
+    print("\r\033[K\n" + "=" * 50)
+    if active_hosts:
+        utils.Print_Typing(utils.Colors.col_text(f"Sweep Complete. {len(active_hosts)} device(s) found in {report.elapsed:.2f}s.", utils.Colors.BRIGHT_GREEN))
+        print("Active IPs: " + ", ".join(active_hosts))
+    else:
+        utils.Print_Typing(utils.Colors.col_text("Sweep Complete. No other active hosts detected.", utils.Colors.BRIGHT_YELLOW))
+    print("=" * 50)
+
+def add_sweep_options(parser):
+    parser.add_argument("networks", nargs="*", help="CIDR networks or addresses (default: the local /24)")
+    parser.add_argument("-m", "--method", choices=_ping.METHODS, default="auto", help="how hosts are probed")
+    parser.add_argument("-t", "--timeout", type=float, default=_ping.DEFAULT_TIMEOUT, help="seconds each host gets to answer")
+
+def check_sweep_options(parsed):
+    """Validates parsed sweep options and turns the networks into ip_network objects."""
+    if parsed.timeout <= 0:
+        raise ValueError("The timeout must be above 0.")
+    parsed.networks = _ping.parse_networks(parsed.networks)
+    return parsed
+
+def sweep_arguments(args):
+    """Parses the words after 'sweep'. Raises ValueError with a readable message."""
+    parser = argparse.ArgumentParser(prog="sweep", add_help=False)
+    add_sweep_options(parser)
+    try:
+        parsed = parser.parse_args(args)
+    except SystemExit:
+        raise ValueError("Usage: sweep [<cidr> ...] [--method auto|icmp|tcp] [--timeout S]")
+    return check_sweep_options(parsed)
+
+def scan_ports(host, start_port, end_port, concurrency=_scan_engine.DEFAULT_CONCURRENCY, timeout=_scan_engine.DEFAULT_TIMEOUT,
+               retries=_scan_engine.DEFAULT_RETRIES, min_timeout=_scan_engine.MIN_TIMEOUT, incremental=False,
+               services=False, processes=1, rate=None):
+    """Scans a range of ports on a host with many connects in flight at once.
+    With `incremental`, ports that were open last time are re-checked first
+    and the rest of the range is left to a background thread. With
+    `services`, open ports are fingerprinted while the scan is still running.
+    `processes` above 1 spreads the range over worker processes; `rate` caps
+    connects per second."""
+    
+    try:
+        ip = socket.gethostbyname(host)
+    except socket.gaierror:
+        utils.Print_Typing(utils.Colors.col_text(f"\n[ERROR] Hostname '{host}' could not be resolved.", utils.Colors.RED))
+        return
+
+    # Never ask for more sockets than the process is allowed to open
+    ports = range(start_port, end_port + 1)
+    planned = plan_scan_concurrency(min(concurrency, len(ports)), services)
+    options = {"concurrency": planned, "timeout": timeout, "retries": retries, "min_timeout": min_timeout}
+    if processes > 1:
+        pool_scan(host, ip, ports, processes, rate, dict(options, concurrency=concurrency))
+        return
+    options["limiter"] = make_limiter(rate)
+
+    store = open_store()
+    known = [port for port in store.known_open(ip) if start_port <= port <= end_port] if incremental and store else []
+    if incremental and not known:
+        print(utils.Colors.col_text("[NOTE] No earlier open ports on record for this host; running a full scan.", utils.Colors.BRIGHT_YELLOW))
+    incremental = incremental and bool(known)
+
+    utils.Print_Typing(utils.Colors.col_text(f"\nTarget Host: {host} ({ip})", utils.Colors.BRIGHT_CYAN))
+    if incremental:
+        utils.Print_Typing(f"Re-checking {len(known)} port(s) that were open last time...", delay=0.01)
+    else:
+        utils.Print_Typing(f"Scanning ports {start_port} to {end_port} ({planned} at a time, timeout {min_timeout:g}-{timeout:g}s, {retries} retries"
+                           f"{f', at most {rate:g}/s' if rate else ''})...", delay=0.01)
+    if planned < min(concurrency, len(ports)):
+        print(utils.Colors.col_text(f"[NOTE] Open file limit allows only {planned} concurrent connects.", utils.Colors.BRIGHT_YELLOW))
+    print("-" * 40)
+
+    results = []
+
+    def show(port, state, rtt):
+        # Stream open ports as they are found; closed/filtered only go in the totals
+        results.append((port, state, rtt))
+        if state == _scan_engine.OPEN:
+            print(utils.Colors.col_text(f"[OPEN] Port {port} ({rtt * 1000:.1f} ms)", utils.Colors.BRIGHT_GREEN))
+        elif incremental:
+            print(utils.Colors.col_text(f"[{state.upper()}] Port {port} (was open)", utils.Colors.RED))
+
+    def show_service(info):
+        print(utils.Colors.col_text(f"[SERVICE] Port {info.port}: {info.describe()}", utils.Colors.BRIGHT_CYAN)
+              + (f"  {info.banner}" if info.banner and info.service == "unknown" else ""))
+
+    run_id = store.start_run("scan", ip, _scan_engine.format_ports(ports)) if store else None
+    found = {}
+    try:
+        if services:
+            report, found = _services.scan_with_services(ip, known if incremental else ports, host, on_result=show,
+                                                         on_service=show_service, **options)
+        else:
+            report = _scan_engine.scan(ip, known if incremental else ports, on_result=show, **options)
+        if store:
+            store.add_ports(run_id, ip, results, found)
+            if not incremental:
+                store.finish_run(run_id, {"open_ports": report.open_ports, "counts": report.counts})
+    finally:
+        if store:
+            store.close()
+
+    print("-" * 40)
+    counts = report.counts
+    print(f"{counts['open']} open, {counts['closed']} closed, {counts['filtered']} filtered "
+          f"in {report.elapsed:.2f}s")
+    print(format_timing(report))
+
+    if incremental and store:
+        # The rest of the range finishes in the background and lands in the same run
+        known_set = set(known)
+        job = BackgroundScan(ip, [port for port in ports if port not in known_set], run_id, report, options)
+        background_scans.append(job)
+        job.start()
+        utils.Print_Typing(utils.Colors.col_text(f"Scanning the other {len(job.ports)} port(s) in the background; progress shows on the menu.", utils.Colors.BRIGHT_CYAN))
+    elif report.open_ports:
+        utils.Print_Typing(utils.Colors.col_text(f"Scan Complete. {len(report.open_ports)} port(s) open.", utils.Colors.BRIGHT_GREEN))
+        print(f"Open Ports: {', '.join(format_open_port(port, found) for port in report.open_ports)}")
+    else:
+        utils.Print_Typing(utils.Colors.col_text("Scan Complete. No open ports found in range.", utils.Colors.BRIGHT_YELLOW))
+
+def pool_scan(host, ip, ports, processes, rate, options):
+    """scan_ports() spread over worker processes; results still print in port order."""
+    utils.Print_Typing(utils.Colors.col_text(f"\nTarget Host: {host} ({ip})", utils.Colors.BRIGHT_CYAN))
+    utils.Print_Typing(f"Scanning ports {ports[0]} to {ports[-1]} over {processes} processes "
+                       f"({options['concurrency']} connects in flight{f', at most {rate:g}/s' if rate else ''})...", delay=0.01)
+    print("-" * 40)
+    results = []
+
+    def show(ip, port, state, rtt):
+        results.append((port, state, rtt))
+        if state == _scan_engine.OPEN:
+            print(utils.Colors.col_text(f"[OPEN] Port {port} ({rtt * 1000:.1f} ms)", utils.Colors.BRIGHT_GREEN))
+
+    store = open_store()
+    run_id = store.start_run("scan", ip, _scan_engine.format_ports(ports)) if store else None
+    try:
+        report = _scan_pool.scan([ip], ports, processes, rate=rate, on_result=show, **options)
+        result = report.hosts[0]
+        if store:
+            store.add_ports(run_id, ip, results)
+            store.finish_run(run_id, {"open_ports": result.open_ports, "counts": result.counts})
+    finally:
+        if store:
+            store.close()
+
+    print("-" * 40)
+    counts = result.counts
+    print(f"{counts['open']} open, {counts['closed']} closed, {counts['filtered']} filtered "
+          f"in {report.elapsed:.2f}s ({report.chunks} chunks over {report.processes} processes)")
+    if result.open_ports:
+        utils.Print_Typing(utils.Colors.col_text(f"Scan Complete. {len(result.open_ports)} port(s) open.", utils.Colors.BRIGHT_GREEN))
+        print(f"Open Ports: {', '.join(map(str, result.open_ports))}")
+    else:
+        utils.Print_Typing(utils.Colors.col_text("Scan Complete. No open ports found in range.", utils.Colors.BRIGHT_YELLOW))
+
+def plan_scan_concurrency(requested, services=False):
+    """Connects the scan may keep in flight, leaving descriptors for the
+    service detectors when they run alongside it."""
+    if not services:
+        return _scan_engine.plan_concurrency(requested)
+    workers = _services.DETECT_WORKERS
+    return max(1, _scan_engine.plan_concurrency(requested + workers) - workers)
+
+def format_open_port(port, services):
+    info = services.get(port)
+    return f"{port} ({info.service})" if info else str(port)
+
+def format_timing(report):
+    """One line describing the timeouts the scan settled on."""
+    timing = report.rtt.summary()
+    ms = lambda seconds: "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+    return (f"Timing: srtt {ms(timing['srtt'])}, rttvar {ms(timing['rttvar'])}, "
+            f"rtt {ms(timing['min_rtt'])}-{ms(timing['max_rtt'])} over {timing['samples']} replies, "
+            f"timeout {ms(timing['timeout'])} (bounds {ms(timing['min_timeout'])}-{ms(timing['max_timeout'])}), "
+            f"{report.retried} retries")
+
+def add_scan_options(parser):
+    parser.add_argument("-c", "--concurrency", type=int, default=_scan_engine.DEFAULT_CONCURRENCY, help="connects in flight at once")
+    parser.add_argument("-t", "--timeout", type=float, default=_scan_engine.DEFAULT_TIMEOUT, help="longest wait per port, in seconds")
+    parser.add_argument("--min-timeout", type=float, default=_scan_engine.MIN_TIMEOUT, help="shortest wait per port, in seconds")
+    parser.add_argument("-r", "--retries", type=int, default=_scan_engine.DEFAULT_RETRIES, help="extra tries for ports that stay silent")
+    parser.add_argument("-p", "--processes", type=int, default=1, help="worker processes to spread the scan over")
+    parser.add_argument("--rate", type=float, help="most connects per second, across all processes")
+
+def check_scan_options(parsed):
+    if parsed.concurrency < 1 or parsed.timeout <= 0 or parsed.min_timeout <= 0 or parsed.retries < 0:
+        raise ValueError("Concurrency must be at least 1, timeouts above 0 and retries not negative.")
+    if parsed.processes < 1 or (parsed.rate is not None and parsed.rate <= 0):
+        raise ValueError("Processes must be at least 1 and the rate above 0.")
+    if parsed.processes > 1 and (parsed.services or getattr(parsed, "incremental", False)):
+        raise ValueError("--processes cannot be combined with --services or --incremental.")
+    return parsed
+
+def make_limiter(rate):
+    """The engine's rate limiter for a single-process scan, or None for no cap."""
+    return _scan_pool.Pacer(_scan_pool.TokenBucket(rate)) if rate else None
+
+def scan_arguments(args):
+    """Parses the words after 'scan'. Raises ValueError with a readable message."""
+    parser = argparse.ArgumentParser(prog="scan", add_help=False)
+    parser.add_argument("host")
+    parser.add_argument("start_port", type=int)
+    parser.add_argument("end_port", type=int)
+    add_scan_options(parser)
+    parser.add_argument("-i", "--incremental", action="store_true")
+    parser.add_argument("-s", "--services", action="store_true")
+    try:
+        parsed = parser.parse_args(args)
+    except SystemExit:
+        # argparse prints its own complaint and tries to exit; keep the app alive
+        raise ValueError("Usage: scan <host> <start_port> <end_port> [--concurrency N] [--timeout S] [--min-timeout S] [--retries N] "
+                         "[--processes N] [--rate PPS] [--incremental] [--services]")
+    if not (1 <= parsed.start_port <= 65535 and 1 <= parsed.end_port <= 65535 and parsed.start_port <= parsed.end_port):
+        raise ValueError("Ports must be between 1 and 65535, and start port must be <= end port.")
+    return check_scan_options(parsed)
+
+# --- Application Launch ---
+
+def launch():
+    prompt_char = utils.load_settings().get('prompt_char', '>')
+    while True:
+        with utils.Screen() as screen:
+            screen.line(utils.Colors.col_text("\n<< Network Scanner >>", utils.Colors.BRIGHT_MAGENTA))
+            show_background_scans(screen)
+            screen.line("Usage:")
+            screen.line("  - " + utils.Colors.col_text("scan <host> <start_port> <end_port>", utils.Colors.BRIGHT_CYAN))
+            screen.line("    Example: scan localhost 20 80 (Scan the current PC)")
+            screen.line("    Example: scan 192.168.1.1 22 443 (Scan a remote IP)")
+            screen.line("    Options: --concurrency N (connects in flight), --timeout S (longest wait per port),")
+            screen.line("             --min-timeout S (shortest), --retries N (extra tries for silent ports),")
+            screen.line("             --incremental (re-check last run's open ports now, the rest in the background),")
+            screen.line("             --services (identify what runs on open ports while the scan goes on),")
+            screen.line("             --processes N (spread the scan over N processes), --rate PPS (most connects per second)")
+            screen.line("  - " + utils.Colors.col_text("sweep [<cidr> ...]", utils.Colors.BRIGHT_CYAN) + " (Ping sweep networks, or the local /24 by default)")
+            screen.line("    Example: sweep 10.0.0.0/16 192.168.5.0/24")
+            screen.line("    Options: --method auto|icmp|tcp, --timeout S (seconds per host)")
+            screen.line("  - " + utils.Colors.col_text("diff [<host> | <cidr> ...]", utils.Colors.BRIGHT_CYAN) + " (What changed since the previous scan/sweep; default: the latest)")
+            screen.line("\nType 'exit' to return to desktop.")
+        
+        user_input = input(f"Scan {prompt_char} ").strip()
+        
+        if user_input.lower() in ("exit", "quit", "q"):
+            utils.Print_Typing("Closing Network Scanner...")
+            utils.clear_console()
+            break
+        
+        parts = user_input.split()
+        command = parts[0].lower() if parts else ""
+
+        if command == 'sweep':
+            try:
+                args = sweep_arguments(parts[1:])
+                ping_sweep(args.networks, args.method, args.timeout)
+            except ValueError as e:
+                utils.Print_Typing(utils.Colors.col_text(f"\n{e}", utils.Colors.RED))
+            input(utils.Colors.col_text(f"\nPress Enter to continue. . .", utils.Colors.BRIGHT_YELLOW))
+            continue
+            
+        elif command == 'diff':
+            show_diff(parts[1:])
+            input(utils.Colors.col_text(f"\nPress Enter to continue. . .", utils.Colors.BRIGHT_YELLOW))
+
+        elif command == 'scan' and len(parts) >= 4:
+            try:
+                args = scan_arguments(parts[1:])
+                scan_ports(args.host, args.start_port, args.end_port, args.concurrency, args.timeout,
+                           args.retries, args.min_timeout, args.incremental, args.services,
+                           args.processes, args.rate)
+                input(utils.Colors.col_text(f"\nPress Enter to continue. . .", utils.Colors.BRIGHT_YELLOW))
+                
+            except ValueError as e:
+                utils.Print_Typing(utils.Colors.col_text(f"\n{e}", utils.Colors.RED))
+                time.sleep(1)
+            except Exception as e:
+                utils.Print_Typing(utils.Colors.col_text(f"\nAn unexpected error occurred: {e}", utils.Colors.RED))
+                time.sleep(1)
+
+        else:
+            utils.Print_Typing(utils.Colors.col_text("\nInvalid command or arguments. Check usage above.", utils.Colors.RED))
+            time.sleep(1)
+# --- Headless Mode ---
+# python -m modules.net_scanner scan <host> <ports> [--json]
+# python -m modules.net_scanner sweep [<cidr> ...] [--json]
+# python -m modules.net_scanner diff [<host> | <cidr> ...] [--json]
+#
+# No typing animation, no clearing, no prompts: each result is written the
+# moment it is known, as a plain line or (with --json) one NDJSON record.
+
+class Emitter:
+    """Writes records as NDJSON or as short plain-text lines, flushing each
+    one so a pipe sees it immediately."""
+
+    def __init__(self, as_json, stream=sys.stdout):
+        self.as_json = as_json
+        self.stream = stream
+
+    def __call__(self, record):
+        if self.as_json:
+            line = json.dumps(record, separators=(",", ":"))
+        else:
+            line = self.describe(record)
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def describe(self, record):
+        kind = record["type"]
+        if kind == "port":
+            rtt = f" {record['rtt_ms']}ms" if record["rtt_ms"] is not None else ""
+            return f"{record['ip']}:{record['port']} {record['state']}{rtt}"
+        if kind == "host":
+            return f"{record['ip']} up {record['rtt_ms']}ms"
+        if kind == "service":
+            banner = f"  {record['banner']}" if record["service"] == "unknown" and record["banner"] else ""
+            return f"{record['ip']}:{record['port']} {record['service']} {record['product']}".rstrip() + banner
+        if kind == "change":
+            return f"{'+' if record['change'] == 'appeared' else '-'} {record['item']}"
+        if kind == "error":
+            return f"error: {record['message']}"
+        if record["kind"] == "scan":
+            counts, timing = record["counts"], record["timing_ms"]
+            return (f"{record['ip']}: {counts['open']} open, {counts['closed']} closed, {counts['filtered']} filtered "
+                    f"in {record['elapsed_s']}s (srtt {timing['srtt']}ms, timeout {timing['timeout']}ms, {record['retries']} retries)")
+        if record["kind"] == "sweep":
+            return f"{record['alive']}/{record['probed']} hosts up in {record['elapsed_s']}s ({record['method']} probes)"
+        return (f"{record['target']} ({record['of']}) {record['before']} -> {record['after']}: "
+                f"{record['appeared']} appeared, {record['disappeared']} disappeared")
+
+def milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+def resolve_targets(spec):
+    """[(name, ip)] for a comma-separated list of hostnames, addresses and
+    CIDR networks. Raises socket.gaierror or ValueError."""
+    targets = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        if "/" in part:
+            network = ipaddress.ip_network(part, strict=False)
+            if _ping.host_count(network) > MAX_SWEEP_HOSTS:
+                raise ValueError(f"{part} has more than the {MAX_SWEEP_HOSTS} addresses a scan allows")
+            targets.extend((str(ip), str(ip)) for ip in _ping.iter_targets([network]))
+        else:
+            targets.append((part, socket.gethostbyname(part)))
+    if not targets:
+        raise ValueError("no hosts given")
+    seen = set()
+    return [(host, ip) for host, ip in targets if not (ip in seen or seen.add(ip))]
+
+def scan_summary(host, ip, ports, counts, open_ports, retried, timing, concurrency, elapsed, **extra):
+    """The summary record for one scanned host."""
+    return {"type": "summary", "kind": "scan", "host": host, "ip": ip, "ports": _scan_engine.format_ports(ports),
+            "counts": counts, "open_ports": open_ports, "retries": retried, **extra,
+            "concurrency": concurrency, "elapsed_s": round(elapsed, 3),
+            "timing_ms": {key: value if key == "samples" else milliseconds(value) for key, value in timing.items()}}
+
+def headless_scan(args, emit):
+    try:
+        targets = resolve_targets(args.host)
+        ports = _scan_engine.parse_ports(args.ports)
+    except socket.gaierror:
+        emit({"type": "error", "message": f"hostname '{args.host}' could not be resolved"})
+        return 1
+    except ValueError as e:
+        emit({"type": "error", "message": str(e)})
+        return 1
+    if len(targets) > 1 or args.processes > 1:
+        if args.services:
+            emit({"type": "error", "message": "--services scans one host in one process"})
+            return 1
+        return headless_pool_scan(args, emit, targets, ports)
+    host, ip = targets[0]
+    states = set(args.states.split(","))
+    results = []
+
+    def record(port, state, rtt):
+        results.append((port, state, rtt))
+        if state in states:
+            emit({"type": "port", "host": host, "ip": ip, "port": port, "state": state,
+                  "rtt_ms": milliseconds(rtt) if state != _scan_engine.FILTERED else None})
+
+    def record_service(info):
+        emit({"type": "service", "host": host, "ip": ip, **info.as_dict()})
+
+    options = {"concurrency": plan_scan_concurrency(args.concurrency, args.services), "timeout": args.timeout,
+               "retries": args.retries, "min_timeout": args.min_timeout, "limiter": make_limiter(args.rate)}
+    store = None if args.no_save else open_store(sys.stderr)
+    run_id = store.start_run("scan", ip, _scan_engine.format_ports(ports)) if store else None
+    found = {}
+    try:
+        if args.services:
+            report, found = _services.scan_with_services(ip, ports, host, on_result=record,
+                                                         on_service=record_service, **options)
+        else:
+            report = _scan_engine.scan(ip, ports, on_result=record, **options)
+        if store:
+            store.add_ports(run_id, ip, results, found)
+            store.finish_run(run_id, {"open_ports": report.open_ports, "counts": report.counts})
+    finally:
+        if store:
+            store.close()
+
+    emit(scan_summary(host, ip, ports, report.counts, report.open_ports, report.retried, report.rtt.summary(),
+                      report.concurrency, report.elapsed,
+                      services={str(port): info.describe() for port, info in sorted(found.items())}))
+    return 0
+
+def headless_pool_scan(args, emit, targets, ports):
+    """headless_scan() for several hosts or processes: one ordered stream of
+    port records, and a summary per host as each one finishes."""
+    states = set(args.states.split(","))
+    names = {ip: host for host, ip in targets}
+    results = []  # Non-closed results for the host being released
+
+    def record(ip, port, state, rtt):
+        if state != _scan_engine.CLOSED:
+            results.append((port, state, rtt))
+        if state in states:
+            emit({"type": "port", "host": names[ip], "ip": ip, "port": port, "state": state,
+                  "rtt_ms": milliseconds(rtt) if state != _scan_engine.FILTERED else None})
+
+    def finish_host(result):
+        if store:
+            run_id = run_ids[result.ip]
+            store.add_ports(run_id, result.ip, results)
+            store.finish_run(run_id, {"open_ports": result.open_ports, "counts": result.counts})
+        results.clear()
+        emit(scan_summary(names[result.ip], result.ip, ports, result.counts, result.open_ports, result.retried,
+                          result.timing(), result.concurrency, result.elapsed, processes=args.processes))
+
+    store = None if args.no_save else open_store(sys.stderr)
+    # Every host's run is opened now, so it is stamped with when the scan began
+    scope = _scan_engine.format_ports(ports)
+    run_ids = {ip: store.start_run("scan", ip, scope) for _, ip in targets} if store else {}
+    try:
+        _scan_pool.scan([ip for _, ip in targets], ports, args.processes, args.concurrency, args.rate,
+                        on_result=record, on_host=finish_host, timeout=args.timeout,
+                        retries=args.retries, min_timeout=args.min_timeout)
+    finally:
+        if store:
+            store.close()
+    return 0
+
+def headless_sweep(args, emit):
+    networks = args.networks
+    if not networks:
+        network = get_local_network(get_local_ip())
+        if network is None:
+            emit({"type": "error", "message": "no networks given and the local network could not be found"})
+            return 1
+        networks = [network]
+    total = sum(_ping.host_count(network) for network in networks)
+    if total > MAX_SWEEP_HOSTS:
+        emit({"type": "error", "message": f"{total} addresses is more than the {MAX_SWEEP_HOSTS} a sweep allows"})
+        return 1
+    try:
+        prober = _ping.open_prober(args.method, ipv6=any(network.version == 6 for network in networks))
+    except (OSError, ValueError) as e:
+        emit({"type": "error", "message": str(e)})
+        return 1
+
+    store = None if args.no_save else open_store(sys.stderr)
+    run_id = store.start_run("sweep", sweep_target(networks)) if store else None
+    try:
+        report = _ping.sweep(_ping.iter_targets(networks), prober, args.timeout, total=total,
+                             on_alive=lambda ip, rtt: emit({"type": "host", "ip": ip, "rtt_ms": milliseconds(rtt)}))
+        if store:
+            store.add_hosts(run_id, report.alive)
+            store.finish_run(run_id, {"alive": len(report.alive), "probed": report.probed, "method": report.method})
+    finally:
+        prober.close()
+        if store:
+            store.close()
+
+    emit({"type": "summary", "kind": "sweep", "networks": list(map(str, networks)), "method": report.method,
+          "probed": report.probed, "alive": len(report.alive), "elapsed_s": round(report.elapsed, 3)})
+    return 0
+
+def headless_diff(args, emit):
+    store = open_store(sys.stderr)
+    if store is None:
+        return 1
+    try:
+        diff, target = find_diff(store, args.target)
+    finally:
+        store.close()
+    if diff is None:
+        emit({"type": "error", "message": "nothing recorded yet" if target is None else
+              f"fewer than two recorded runs for {target}"})
+        return 1
+    for change, items in (("appeared", diff.appeared), ("disappeared", diff.disappeared)):
+        for item in items:
+            emit({"type": "change", "kind": diff.kind, "target": diff.target, "change": change, "item": item})
+    emit({"type": "summary", "kind": "diff", "target": diff.target, "of": diff.kind,
+          "before": diff.before.when(), "after": diff.after.when(),
+          "appeared": len(diff.appeared), "disappeared": len(diff.disappeared)})
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m modules.net_scanner",
+                                     description="Run the Network Scanner without the interactive menu.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="scan ports on hosts")
+    scan.add_argument("host", help="host, address or CIDR network; several separated by commas")
+    scan.add_argument("ports", help="port spec, e.g. 1-65535 or 22,80,8000-8100")
+    add_scan_options(scan)
+    scan.add_argument("--services", action="store_true", help="identify services on open ports while scanning")
+    scan.add_argument("--states", default=_scan_engine.OPEN,
+                      help="comma-separated states to report per port (default: open; e.g. open,filtered,closed)")
+
+    sweep = commands.add_parser("sweep", help="find live hosts on networks")
+    add_sweep_options(sweep)
+
+    diff = commands.add_parser("diff", help="changes between the last two runs of a target")
+    diff.add_argument("target", nargs="*", help="host or networks (default: the most recent target)")
+
+    for command in (scan, sweep, diff):
+        command.add_argument("--json", action="store_true", help="write NDJSON records instead of text lines")
+    for command in (scan, sweep):
+        command.add_argument("--no-save", action="store_true", help="do not record this run in the scan history")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "scan":
+            check_scan_options(args)
+            unknown = set(args.states.split(",")) - set(_scan_engine.STATES)
+            if unknown:
+                raise ValueError(f"unknown state(s): {', '.join(sorted(unknown))}")
+        elif args.command == "sweep":
+            check_sweep_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    emit = Emitter(args.json)
+    handlers = {"scan": headless_scan, "sweep": headless_sweep, "diff": headless_diff}
+    try:
+        return handlers[args.command](args, emit)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head). Point stdout at devnull so
+        # the interpreter's final flush does not fail on the closed pipe too
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+# scanner_bench.py
+# Reproducible benchmark for the Network Scanner's port scan and sweep.
+#
+# Starts stand-in targets on loopback aliases (127.0.0.10, 127.0.0.11, ...)
+# in a separate process, so they cost the scanner nothing:
+#
+#   open      a listener that accepts and closes straight away
+#   filtered  a listener whose accept queue is kept full, so the kernel
+#             drops new SYNs and the probe times out like a firewalled port
+#
+# Open and filtered ports are drawn from --seed, so the same arguments give
+# the same targets on every run. The scan engine and the sweep are then run
+# against them. The report covers ports per second, sweep wall time, false
+# negatives, how far the smoothed RTT sits above the fastest answer (on
+# loopback it should not: anything more is event-loop delay leaking into the
+# timeouts) and the scanner's peak descriptors and threads. The JSON report
+# keeps the same shape between versions, so runs can be compared with
+# --compare.
+#
+#   python scanner_bench.py --hosts 4 --ports 10000-30000 --output before.json
+#   python scanner_bench.py --hosts 4 --ports 10000-30000 --compare before.json
+#
+# Loopback addresses other than 127.0.0.1 need no setup on Linux. Elsewhere,
+# add them as interface aliases first, or use --hosts 1.
+import argparse
+import asyncio
+import ipaddress
+import json
+import multiprocessing
+import os
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from modules import _ping, _scan_engine
+
+try:
+    import psutil  # Optional, used for descriptor counts where /proc is missing
+except ImportError:
+    psutil = None
+
+REPORT_VERSION = 1
+FIRST_HOST = ipaddress.ip_address("127.0.0.10")
+QUEUE_FILLERS = 4  # Connections parked on a filtered port to keep its accept queue full
+RTT_SLACK_MS = 2.0  # Most the smoothed RTT may sit above the fastest answer on loopback
+
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+ENDC = '\033[0m'
+
+# --- STAND-IN TARGETS ---
+
+def plan_targets(args):
+    """[(ip, open ports, filtered ports)] for every stand-in host, from the seed."""
+    rng = random.Random(args.seed)
+    ports = _scan_engine.parse_ports(args.ports)
+    plan = []
+    for n in range(args.hosts):
+        chosen = rng.sample(ports, min(args.open + args.filtered, len(ports)))
+        plan.append((str(FIRST_HOST + n), sorted(chosen[:args.open]), sorted(chosen[args.open:])))
+    return plan
+
+def serve_targets(plan, pipe):
+    """Runs in its own process: binds every planned port, reports back which
+    ones it got, then accepts-and-closes on open ports until told to stop."""
+    selector = selectors.DefaultSelector()
+    keep = []  # Filtered listeners and their fillers must stay open
+    bound = []
+    for ip, open_ports, filtered_ports in plan:
+        got_open, got_filtered = [], []
+        for port in open_ports:
+            try:
+                sock = socket.socket()
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind((ip, port))
+                sock.listen(1024)
+            except OSError:
+                continue  # Address missing or port taken; left out of the plan
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ)
+            got_open.append(port)
+        for port in filtered_ports:
+            try:
+                sock = socket.socket()
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind((ip, port))
+                sock.listen(0)
+            except OSError:
+                continue
+            keep.append(sock)
+            for _ in range(QUEUE_FILLERS):
+                filler = socket.socket()
+                filler.setblocking(False)
+                filler.connect_ex((ip, port))
+                keep.append(filler)
+            got_filtered.append(port)
+        bound.append((ip, got_open, got_filtered))
+    time.sleep(0.2)  # Let the fillers' handshakes land before anyone scans
+    pipe.send(bound)
+
+    while not pipe.poll():
+        for key, _ in selector.select(0.2):
+            try:
+                conn, _ = key.fileobj.accept()
+                conn.close()
+            except OSError:
+                pass
+
+class StandInTargets:
+    """Context manager around the serve_targets() process."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.bound = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        self.pipe, child_pipe = context.Pipe()
+        self.proc = context.Process(target=serve_targets, args=(self.plan, child_pipe), daemon=True)
+        self.proc.start()
+        if not self.pipe.poll(30):
+            self.proc.terminate()
+            raise SystemExit(f"{RED}ERROR: stand-in targets did not start{ENDC}")
+        self.bound = self.pipe.recv()
+        return self
+
+    def __exit__(self, *exc):
+        self.pipe.send("stop")
+        self.proc.join(timeout=5)
+        if self.proc.is_alive():
+            self.proc.terminate()
+
+# --- RESOURCE SAMPLING ---
+
+def open_descriptors():
+    if os.path.isdir("/proc/self/fd"):
+        return len(os.listdir("/proc/self/fd"))
+    if psutil is not None:
+        proc = psutil.Process()
+        return proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles()
+    return None
+
+class ResourceSampler(threading.Thread):
+    """Polls this process's descriptor and thread counts and keeps the peaks.
+    Its own thread is left out of the count."""
+
+    def __init__(self, interval=0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_fds = None
+        self.peak_threads = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        fds = open_descriptors()
+        if fds is not None:
+            self.peak_fds = max(self.peak_fds or 0, fds)
+        self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+# --- RUNS ---
+
+async def run_scans(args, bound):
+    """Scans every stand-in host in turn and scores the results against
+    what was planted there."""
+    totals = {"ports": 0, "elapsed": 0.0, "missed_open": 0, "unexpected_open": 0,
+              "filtered_planted": 0, "filtered_found": 0, "retries": 0, "srtt_over_min_ms": 0.0}
+    hosts = []
+    for ip, open_ports, filtered_ports in bound:
+        ports = _scan_engine.parse_ports(args.ports)
+        filtered = set()
+
+        def on_result(port, state, rtt):
+            if state == _scan_engine.FILTERED:
+                filtered.add(port)
+
+        report = await _scan_engine.scan_ports_async(ip, ports, args.concurrency, args.timeout, on_result,
+                                                     args.retries, args.min_timeout)
+        found = set(report.open_ports)
+        totals["ports"] += len(ports)
+        totals["elapsed"] += report.elapsed
+        totals["missed_open"] += len(set(open_ports) - found)
+        totals["unexpected_open"] += len(found - set(open_ports))
+        totals["filtered_planted"] += len(filtered_ports)
+        totals["filtered_found"] += len(filtered & set(filtered_ports))
+        totals["retries"] += report.retried
+        timing = report.rtt.summary()
+        srtt_ms = round((timing["srtt"] or 0.0) * 1000, 3)
+        min_rtt_ms = round((timing["min_rtt"] or 0.0) * 1000, 3)
+        totals["srtt_over_min_ms"] = max(totals["srtt_over_min_ms"], round(srtt_ms - min_rtt_ms, 3))
+        hosts.append({"ip": ip, "elapsed_s": round(report.elapsed, 3), "counts": report.counts,
+                      "srtt_ms": srtt_ms, "min_rtt_ms": min_rtt_ms})
+    return totals, hosts
+
+def run_sweep(args):
+    networks = _ping.parse_networks([args.sweep])
+    expected = sum(_ping.host_count(network) for network in networks)
+    prober = _ping.open_prober(args.sweep_method)
+    try:
+        report = _ping.sweep(_ping.iter_targets(networks), prober, args.sweep_timeout, total=expected)
+    finally:
+        prober.close()
+    return {
+        "network": args.sweep,
+        "method": report.method,
+        "expected": expected,
+        "found": len(report.alive),
+        "false_negatives": expected - len(report.alive),
+        "wall_s": round(report.elapsed, 3),
+    }
+
+def build_report(args, totals, hosts, sweep, sampler, planned_open):
+    elapsed = totals["elapsed"] or 1e-9
+    return {
+        "report_version": REPORT_VERSION,
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "hosts": args.hosts,
+            "ports": args.ports,
+            "open_per_host": args.open,
+            "filtered_per_host": args.filtered,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "timeout": args.timeout,
+            "min_timeout": args.min_timeout,
+            "retries": args.retries,
+        },
+        "scan": {
+            "ports": totals["ports"],
+            "elapsed_s": round(elapsed, 3),
+            "ports_per_s": round(totals["ports"] / elapsed, 1),
+            "open_planted": planned_open,
+            "false_negatives": totals["missed_open"],
+            "unexpected_open": totals["unexpected_open"],
+            "filtered_planted": totals["filtered_planted"],
+            "filtered_found": totals["filtered_found"],
+            "filtered_missed": totals["filtered_planted"] - totals["filtered_found"],
+            "retries": totals["retries"],
+            "srtt_over_min_ms": totals["srtt_over_min_ms"],
+            "hosts": hosts,
+        },
+        "sweep": sweep,
+        "resources": {
+            "peak_fds": sampler.peak_fds,
+            "peak_threads": sampler.peak_threads,
+        },
+    }
+
+# Metrics compared by --compare: (section, key, True if higher is better)
+COMPARED = [
+    ("scan", "ports_per_s", True),
+    ("scan", "elapsed_s", False),
+    ("scan", "false_negatives", False),
+    ("scan", "unexpected_open", False),
+    ("scan", "filtered_missed", False),
+    ("scan", "srtt_over_min_ms", False),
+    ("sweep", "wall_s", False),
+    ("sweep", "false_negatives", False),
+    ("resources", "peak_fds", False),
+    ("resources", "peak_threads", False),
+]
+
+def print_report(report, baseline=None):
+    print("\n" + "=" * 60)
+    print(f"{'metric':<32}{'value':>12}{'baseline':>16}")
+    print("-" * 60)
+    for section, key, higher_is_better in COMPARED:
+        value = (report.get(section) or {}).get(key)
+        if value is None:
+            continue
+        line = f"{section + '.' + key:<32}{value:>12}"
+        old = ((baseline or {}).get(section) or {}).get(key)
+        if old is not None:
+            better = value >= old if higher_is_better else value <= old
+            color = GREEN if better else RED
+            line += f"{color}{old:>16}{ENDC}"
+        print(line)
+    print("=" * 60)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Network Scanner against local stand-in targets")
+    parser.add_argument("--hosts", type=int, default=4, help="stand-in hosts from 127.0.0.10 up (default 4)")
+    parser.add_argument("--ports", default="10000-30000", help="port spec scanned on each host (default 10000-30000)")
+    parser.add_argument("--open", type=int, default=20, help="open ports planted per host (default 20)")
+    parser.add_argument("--filtered", type=int, default=5, help="filtered ports planted per host (default 5)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for choosing the planted ports (default 1)")
+    parser.add_argument("--concurrency", type=int, default=_scan_engine.DEFAULT_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=_scan_engine.DEFAULT_TIMEOUT)
+    parser.add_argument("--min-timeout", type=float, default=_scan_engine.MIN_TIMEOUT)
+    parser.add_argument("--retries", type=int, default=_scan_engine.DEFAULT_RETRIES)
+    parser.add_argument("--sweep", default="127.0.0.0/24", help="network to sweep; every address must answer ('' to skip)")
+    parser.add_argument("--sweep-method", choices=_ping.METHODS, default="auto")
+    parser.add_argument("--sweep-timeout", type=float, default=_ping.DEFAULT_TIMEOUT)
+    parser.add_argument("--label", default="", help="free-form label stored in the report")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    plan = plan_targets(args)
+    with StandInTargets(plan) as targets:
+        bound = targets.bound
+        skipped = sum(len(o) + len(f) for _, o, f in plan) - sum(len(o) + len(f) for _, o, f in bound)
+        if skipped:
+            print(f"{YELLOW}WARNING: {skipped} planted port(s) could not be bound and were left out{ENDC}")
+
+        sampler = ResourceSampler()
+        sampler.start()
+        try:
+            totals, hosts = asyncio.run(run_scans(args, bound))
+            sweep = run_sweep(args) if args.sweep else None
+        finally:
+            sampler.stop()
+
+    report = build_report(args, totals, hosts, sweep, sampler, sum(len(o) for _, o, _ in bound))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    status = 0
+    if report["scan"]["srtt_over_min_ms"] > RTT_SLACK_MS:
+        print(f"{RED}Smoothed RTT is {report['scan']['srtt_over_min_ms']} ms above the fastest answer "
+              f"(allowed {RTT_SLACK_MS} ms): probes are being timed behind the event loop{ENDC}")
+        status = 1
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())